@@ -1,6 +1,7 @@
 import argparse
 import sys
 import os
+from quit.cache import POLICIES
 from quit.conf import Feature, QuitStoreConfiguration
 from quit.exceptions import InvalidConfigurationError
 import rdflib.plugins.sparql
@@ -136,6 +137,12 @@ def initialize(args):
             namespace=args['namespace'],
             oauthclientid=args['oauth_clientid'],
             oauthclientsecret=args['oauth_clientsecret'],
+            blobcache=args['blobcache'],
+            blobcachesize=int(args['blobcache_size']) * 1024 * 1024,
+            syncworkers=int(args['sync_workers']),
+            cachebudgets=dict(
+                (name, size * 1024 * 1024) for name, size in args['cache_budget'].items()),
+            cachepolicy=args['cache_policy'],
         )
     except InvalidConfigurationError as e:
         logger.error(e)
@@ -153,7 +160,8 @@ class FeaturesAction(argparse.Action):
     CHOICES = {
         'provenance': Feature.Provenance,
         'persistence': Feature.Persistence,
-        'garbagecollection': Feature.GarbageCollection
+        'garbagecollection': Feature.GarbageCollection,
+        'versionindex': Feature.VersionIndex
     }
 
     def __call__(self, parser, namespace, values, option_string=None):
@@ -170,6 +178,29 @@ class FeaturesAction(argparse.Action):
             setattr(namespace, self.dest, flags)
 
 
+class CacheBudgetAction(argparse.Action):
+    """Actions that are executed for the budgets passed with the `--cache-budget` option."""
+    CHOICES = ('blobs', 'commits', 'graphconfigs', 'entities', 'snapshots', 'queries', 'results')
+
+    @classmethod
+    def parse(cls, values):
+        """Parse a list of "name=MiB" strings into a dict."""
+        budgets = {}
+        for value in values:
+            name, _, size = value.partition('=')
+            if name not in cls.CHOICES or not size.isdigit():
+                raise ValueError("invalid cache budget: {0!r} (use name=MiB with name in {1})"
+                                 .format(value, ', '.join(cls.CHOICES)))
+            budgets[name] = int(size)
+        return budgets
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        try:
+            setattr(namespace, self.dest, self.parse(values))
+        except ValueError as e:
+            raise argparse.ArgumentError(self, str(e))
+
+
 def getDefaults():
     return {
         'port': 5000,
@@ -185,10 +216,22 @@ def getDefaults():
         'verbose': 0,
         'flask_debug': False,
         'defaultgraph_union': False,
-        'features': 0
+        'features': 0,
+        'blobcache': None,
+        'blobcache_size': 1024,
+        'sync_workers': 1,
+        'cache_budget': {},
+        'cache_policy': 'lru'
     }
 
 
+def _parsePositiveInt(name, value):
+    """Parse a positive integer of the environment, raise a ValueError naming it otherwise."""
+    if not value.strip().isdigit() or int(value) < 1:
+        raise ValueError("invalid {0}: {1!r} (choose a positive integer)".format(name, value))
+    return int(value)
+
+
 def parseEnv():
     """Parse command line arguments.
 
@@ -224,6 +267,28 @@ def parseEnv():
     if 'QUIT_OAUTH_SECRET' in os.environ:
         env['oauth_clientsecret'] = os.environ['QUIT_OAUTH_SECRET']
 
+    if 'QUIT_BLOBCACHE' in os.environ:
+        env['blobcache'] = os.environ['QUIT_BLOBCACHE']
+
+    if 'QUIT_BLOBCACHE_SIZE' in os.environ:
+        env['blobcache_size'] = _parsePositiveInt(
+            'blob cache size', os.environ['QUIT_BLOBCACHE_SIZE'])
+
+    if 'QUIT_SYNC_WORKERS' in os.environ:
+        env['sync_workers'] = _parsePositiveInt(
+            'number of sync workers', os.environ['QUIT_SYNC_WORKERS'])
+
+    if 'QUIT_CACHE_BUDGET' in os.environ:
+        env['cache_budget'] = CacheBudgetAction.parse(
+            os.environ['QUIT_CACHE_BUDGET'].replace(',', ' ').split())
+
+    if 'QUIT_CACHE_POLICY' in os.environ:
+        policy = os.environ['QUIT_CACHE_POLICY']
+        if policy not in POLICIES:
+            raise ValueError("invalid cache policy: {0!r} (choose from {1})".format(
+                policy, ', '.join(repr(name) for name in POLICIES)))
+        env['cache_policy'] = policy
+
     return env
 
 
@@ -236,12 +301,26 @@ def parseArgs(args):
     basepathhelp = "Base path (aka. application root) (WSGI only)."
     featurehelp = """This option enables additional features of the QuitStore:
                 "provenance" - Store provenance information for each revision.
-                "persistance" - Store all internal data as rdf graph."""
+                "persistance" - Store all internal data as rdf graph.
+                "versionindex" - Keep all versions of the graphs in a single versioned index."""
     confighelp = """Path of config file (turtle). Defaults to ./config.ttl."""
     loghelp = """Path to the log file."""
     targethelp = 'The directory of the local store repository.'
     namespacehelp = """A base namespace that will be applied when dealing with relative URIs in
                     SPARQL UPDATE queries."""
+    blobcachehelp = """A directory to keep parsed graph files across restarts. Disabled by
+                    default."""
+    blobcachesizehelp = """The maximal size of the blob cache directory in MiB. Defaults to
+                    1024."""
+    cachebudgethelp = """Memory budgets in MiB of the internal caches as name=MiB pairs, e.g.
+                    "blobs=512 commits=16". Caches are "blobs", "commits", "graphconfigs",
+                    "entities", "snapshots", "queries" and "results". Caches without budget keep
+                    50 entries, the queries 500 entries, the entities have a budget of 512 MiB and
+                    the results have a budget of 64 MiB."""
+    cachepolicyhelp = """The eviction policy of the internal caches: "lru" (default), "lfu" or
+                    "size" (least uses per byte)."""
+    syncworkershelp = """The number of worker processes which compute the provenance of the history
+                    on startup. Defaults to 1, i.e. no worker processes."""
 
     parser = argparse.ArgumentParser()
     parser.add_argument('-p', '--port', type=int)
@@ -257,6 +336,14 @@ def parseArgs(args):
     parser.add_argument('-v', '--verbose', action='count', default=0)
     parser.add_argument('--flask-debug', action='store_true')
     parser.add_argument('--defaultgraph-union', action='store_true')
+    parser.add_argument('--blobcache', type=str, help=blobcachehelp)
+    parser.add_argument('--blobcache-size', type=int, dest='blobcache_size',
+                        help=blobcachesizehelp)
+    parser.add_argument('--sync-workers', type=int, dest='sync_workers', help=syncworkershelp)
+    parser.add_argument('--cache-budget', nargs='*', action=CacheBudgetAction,
+                        dest='cache_budget', help=cachebudgethelp)
+    parser.add_argument('--cache-policy', type=str, choices=list(POLICIES),
+                        dest='cache_policy', help=cachepolicyhelp)
     parser.add_argument('-f', '--features', nargs='*', action=FeaturesAction,
                         default=Feature.Unknown,
                         help=featurehelp)
@@ -1,12 +1,175 @@
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+
 from collections import OrderedDict
-from sortedcontainers import SortedSet
+from heapq import heapify, heappop, heappush
+from itertools import count
+from rdflib import Graph
+from rdflib.query import Result
+from quit import codec, ntriples
+from quit.graphs import NTriplesStore
+from quit.terms import TERMS
+
+logger = logging.getLogger('quit.cache')
+
+# the capacity of a blob cache without configured size
+BLOB_CACHE_CAPACITY = 1024 * 1024 * 1024
+
+# measured averages per triple of an rdflib Memory store resp. a NTriplesStore, including the terms
+TRIPLE_SIZE = 1900
+NTRIPLE_SIZE = 750
+
+
+def estimateSize(value):
+    """Estimate the memory used by a cached value in bytes.
+
+    Graphs are estimated by their number of triples, containers by their items, query results by
+    their rows resp. their graph, everything else by sys.getsizeof. The graph of a FileReference is
+    only counted once, if the FileReference is cached together with it.
+    """
+    if isinstance(value, Graph):
+        if isinstance(value.store, NTriplesStore):
+            return sys.getsizeof(value) + len(value) * NTRIPLE_SIZE
+        return sys.getsizeof(value) + len(value) * TRIPLE_SIZE
+    if isinstance(value, FileReference):
+        return sys.getsizeof(value)
+    if isinstance(value, Result):
+        # the terms of the rows are shared with the graphs
+        if value.type == 'SELECT':
+            return sys.getsizeof(value) + sum(sys.getsizeof(row) for row in value.bindings)
+        if value.type in ('CONSTRUCT', 'DESCRIBE'):
+            return sys.getsizeof(value) + estimateSize(value.graph)
+        return sys.getsizeof(value)
+    if isinstance(value, (tuple, list, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimateSize(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class LRUPolicy:
+    """Evict the least recently used entry."""
+
+    def __init__(self):
+        self._order = OrderedDict()
+
+    def add(self, key, size):
+        self._order[key] = size
+
+    def touch(self, key):
+        self._order.move_to_end(key)
+
+    def remove(self, key):
+        self._order.pop(key, None)
+
+    def victim(self):
+        return next(iter(self._order))
+
+
+class LFUPolicy:
+    """Evict the least frequently used entry, ties are broken by the least recent use."""
+
+    def __init__(self):
+        self._heap = []
+        self._current = {}
+        self._uses = {}
+        self._tick = count()
+
+    def priority(self, uses, size):
+        return uses
+
+    def _push(self, key):
+        uses, size = self._uses[key]
+        entry = (self.priority(uses, size), next(self._tick), key)
+        self._current[key] = entry
+        heappush(self._heap, entry)
+        if len(self._heap) > 2 * len(self._current) + 16:
+            self._heap = list(self._current.values())
+            heapify(self._heap)
+
+    def add(self, key, size):
+        self._uses[key] = (1, max(size, 1))
+        self._push(key)
+
+    def touch(self, key):
+        uses, size = self._uses[key]
+        self._uses[key] = (uses + 1, size)
+        self._push(key)
+
+    def remove(self, key):
+        self._uses.pop(key, None)
+        self._current.pop(key, None)
+
+    def victim(self):
+        while self._current.get(self._heap[0][2]) is not self._heap[0]:
+            heappop(self._heap)
+        return self._heap[0][2]
+
+
+class SizePolicy(LFUPolicy):
+    """Evict the entry with the least uses per byte (Greedy-Dual-Size-Frequency).
+
+    The priorities of new uses are inflated by the priority of the last victim, thus entries which
+    were used often a long time ago are evicted eventually.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._inflation = 0
+
+    def priority(self, uses, size):
+        return self._inflation + uses / size
+
+    def victim(self):
+        key = super().victim()
+        self._inflation = self._heap[0][0]
+        return key
+
+
+POLICIES = {'lru': LRUPolicy, 'lfu': LFUPolicy, 'size': SizePolicy}
+
+
+class _Flight:
+    """A load in progress, other threads wait for its result."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
 
 
 class Cache:
+    """A cache bounded by the number of entries and optionally by the estimated size of the entries.
+
+    The cache can be used from multiple threads. Values should be added with load, concurrent
+    misses on the same key then wait for a single load instead of loading the value again.
 
-    def __init__(self, capacity=50):
+    Args:
+        capacity: the maximal number of entries or None
+        budget: the maximal estimated size of all entries in bytes or None
+        policy: the name of an eviction policy in POLICIES or a policy instance
+        sizeof: a function to estimate the size of a value, defaults to estimateSize
+        evicted: a function called with key and value of each entry evicted by the policy
+    """
+
+    def __init__(self, capacity=50, budget=None, policy='lru', sizeof=estimateSize,
+                 evicted=None):
         self.stack = OrderedDict()
         self.capacity = capacity
+        self.budget = budget
+        self.policy = POLICIES[policy]() if isinstance(policy, str) else policy
+        self.sizeof = sizeof
+        self.evicted = evicted
+        self.sizes = {}
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+        self._flights = {}
 
     def get(self, key):
         """Get a value from the cache.
@@ -14,29 +177,114 @@ class Cache:
         Raises:
             KeyError if no value was found for the given key
         """
-        value = self.stack.pop(key)
-        self.stack[key] = value
-        return value
+        with self._lock:
+            try:
+                value = self.stack[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            self.hits += 1
+            self.policy.touch(key)
+            return value
+
+    def peek(self, key, default=None):
+        """Get a value from the cache without counting a hit or miss and without using it."""
+        with self._lock:
+            return self.stack.get(key, default)
+
+    def load(self, key, loader):
+        """Get a value from the cache or load and add it on a miss.
+
+        If the key is already loaded by another thread, wait for its result instead.
+
+        Args:
+            key: the key of the value
+            loader: a function without arguments returning the value
+        Returns:
+            The cached or loaded value
+        Raises:
+            Any exception raised by the loader, also in the waiting threads
+        """
+        with self._lock:
+            try:
+                return self.get(key)
+            except KeyError:
+                pass
+            flight = self._flights.get(key, None)
+            loading = flight is None
+            if loading:
+                flight = self._flights[key] = _Flight()
+
+        if not loading:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
 
-    def set(self, key, value):
         try:
-            self.stack.pop(key)
-        except KeyError:
-            if len(self.stack) >= self.capacity:
-                self.stack.popitem(last=False)
-        self.stack[key] = value
+            flight.value = loader()
+            self.set(key, flight.value)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def set(self, key, value):
+        """Add a value, values larger than the budget are not cached."""
+        size = self.sizeof(value) if self.budget is not None else 0
+        evicted = []
+
+        with self._lock:
+            self.remove(key)
+            if self.budget is not None and size > self.budget:
+                return
+            while self.stack and (
+                (self.capacity is not None and len(self.stack) >= self.capacity) or
+                (self.budget is not None and self.total + size > self.budget)
+            ):
+                victim = self.policy.victim()
+                evicted.append((victim, self.remove(victim)))
+                self.evictions += 1
+
+            self.stack[key] = value
+            self.sizes[key] = size
+            self.total += size
+            self.policy.add(key, size)
+
+        if self.evicted is not None:
+            for victim, victimValue in evicted:
+                self.evicted(victim, victimValue)
 
     def remove(self, key):
-        try:
-            return self.stack.pop(key)
-        except KeyError:
-            return
+        with self._lock:
+            try:
+                value = self.stack.pop(key)
+            except KeyError:
+                return
+            self.total -= self.sizes.pop(key)
+            self.policy.remove(key)
+            return value
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            for key in list(self.stack):
+                self.remove(key)
 
     def __contains__(self, key):
-        return key in self.stack
+        with self._lock:
+            if key in self.stack:
+                return True
+            self.misses += 1
+            return False
 
     def __iter__(self):
-        return (c for c in self.stack)
+        with self._lock:
+            return iter(list(self.stack))
 
     @property
     def size(self):
@@ -45,52 +293,216 @@ class Cache:
         """
         return len(self.stack)
 
+    @property
+    def statistics(self):
+        """Get a dict of the counters and the current usage of the cache."""
+        return {
+            'entries': len(self.stack),
+            'bytes': self.total,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitrate': self.hits / (self.hits + self.misses) if self.hits or self.misses else 0.0,
+            'evictions': self.evictions
+        }
+
+
+class BlobCache:
+    """A size capped directory of parsed graph blobs, keyed by the blob oid.
+
+    Every entry holds the triples of a blob encoded with quit.codec and the N-Triples lines of the
+    triples in the same order. Entries are memory mapped when they are read. If the directory grows
+    beyond capacity bytes the least recently used entries are deleted.
+
+    Args:
+        path: the directory of the cache
+        capacity: the maximal size of the directory in bytes, defaults to BLOB_CACHE_CAPACITY
+    """
+
+    _HEADER = struct.Struct('<4sQ')
+    _MAGIC = b'QBC2'
+
+    def __init__(self, path, capacity=None):
+        self.path = path
+        self.capacity = capacity if capacity is not None else BLOB_CACHE_CAPACITY
+        self.stack = OrderedDict()
+        self.total = 0
+        self._lock = threading.RLock()
+
+        os.makedirs(path, exist_ok=True)
+        entries = []
+        for dirpath, dirnames, filenames in os.walk(path):
+            for filename in filenames:
+                if filename.startswith('tmp'):
+                    continue
+                stat = os.stat(os.path.join(dirpath, filename))
+                key = os.path.basename(dirpath) + filename
+                entries.append((stat.st_mtime, key, stat.st_size))
+        for _, key, size in sorted(entries):
+            self.stack[key] = size
+            self.total += size
+        self.cleanup()
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key[2:])
+
+    def get(self, key):
+        """Get the triples and the lines of a cached blob.
+
+        Returns:
+            A tuple (triples, lines) of lists of the same length, the terms are interned
+        Raises:
+            KeyError if the blob is not cached
+        """
+        key = str(key)
+        with self._lock:
+            self.stack.move_to_end(key)
+        filename = self._file(key)
+
+        try:
+            with open(filename, 'rb') as f:
+                # the map is released with the last view on it
+                buffer = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            magic, length = self._HEADER.unpack_from(buffer, 0)
+            if magic != self._MAGIC:
+                raise ValueError("Unsupported cache entry {!r}".format(magic))
+            start = self._HEADER.size
+            arity, terms, ids = codec.loads(buffer[start:start + length])
+            terms = [TERMS.intern(term) for term in terms]
+            triples = [
+                (terms[ids[i]], terms[ids[i + 1]], terms[ids[i + 2]])
+                for i in range(0, len(ids), arity)
+            ]
+            lines = str(buffer[start + length:], 'utf-8')
+            lines = lines.split('\n') if lines else []
+            if len(lines) != len(triples):
+                raise ValueError("{} lines for {} triples".format(len(lines), len(triples)))
+            os.utime(filename)
+        except (OSError, ValueError, struct.error) as e:
+            logger.debug("Drop unreadable cache entry {}: {}".format(filename, e))
+            self.remove(key)
+            raise KeyError(key)
+
+        return triples, lines
+
+    def set(self, key, triples, lines):
+        """Store the triples of a blob and their lines in the same order, enforce the capacity."""
+        key = str(key)
+        record = codec.dumps(triples, 3)
+        data = (
+            self._HEADER.pack(self._MAGIC, len(record)) + record +
+            '\n'.join(lines).encode('utf-8'))
+
+        directory = os.path.dirname(self._file(key))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix='tmp', dir=directory)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self._file(key))
+        except OSError as e:
+            logger.warning("Could not write cache entry {}: {}".format(key, e))
+            return
+
+        with self._lock:
+            self.total += len(data) - self.stack.pop(key, 0)
+            self.stack[key] = len(data)
+            self.cleanup()
+
+    def remove(self, key):
+        key = str(key)
+        with self._lock:
+            try:
+                self.total -= self.stack.pop(key)
+            except KeyError:
+                return
+            self._unlink(key)
+
+    def _unlink(self, key):
+        try:
+            os.remove(self._file(key))
+        except OSError:
+            pass
+
+    def cleanup(self):
+        """Delete least recently used entries until the cache is within its capacity."""
+        with self._lock:
+            while self.stack and self.total > self.capacity:
+                key, size = self.stack.popitem(last=False)
+                self.total -= size
+                self._unlink(key)
+
+    def __contains__(self, key):
+        return str(key) in self.stack
+
+    @property
+    def size(self):
+        """Return the number of cached blobs."""
+        return len(self.stack)
+
 
 class FileReference:
     """A class that manages n-triple files.
-    This class stores inforamtation about the location of a n-triple file and is
-    able to add and delete triples to that file.
+
+    The triples of the file are kept once in a graph backed by a NTriplesStore, which also keeps
+    their sorted N-Triples lines. Thus the graph can be queried and modified and the content of the
+    file is available without parsing or sorting it again.
     """
 
-    def __init__(self, path, content):
+    def __init__(self, path, content, identifier=None):
         """Initialize a new FileReference instance.
+
         Args:
-            filelocation: A string of the filepath.
-            filecontentinmem: Boolean to decide if local filesystem should be used to
-                or if file content should be kept in memory too . (Defaults false)
-        Raises:
-            ValueError: If no file at the filelocation, or in the given directory + filelocation.
+            path: A string of the filepath.
+            content: The N-Triples content of the file as string, as bytes-like object, e.g. a
+                blob, or as iterable of lines.
+            identifier: The identifier of the graph of the file.
         """
-
-        if isinstance(content, str):
-            new = []
-            for line in content.splitlines():
-                new.append(' '.join(line.split()))
-            content = new
+        if not isinstance(content, (str, bytes, bytearray, memoryview)):
+            content = "\n".join(content)
 
         self._path = path
-        self._content = SortedSet(content)
-        self._modified = False
+        self._graph = Graph(store=NTriplesStore(), identifier=identifier)
+        self._graph.store.load(ntriples.parse(content))
 
     @property
     def path(self):
         return self._path
 
+    @property
+    def graph(self):
+        """The graph of the triples of the file."""
+        return self._graph
+
     @property
     def content(self):
-        return "\n".join(self._content) + "\n"
+        return self._graph.store.content
 
-    def add(self, data):
+    def copy(self, identifier=None):
+        """Get a new FileReference with the same path and triples.
+
+        Args:
+            identifier: The identifier of the new graph, defaults to the identifier of this graph.
+        """
+        fileReference = FileReference(self._path, '')
+        fileReference._graph = Graph(
+            store=self._graph.store.copy(), identifier=identifier or self._graph.identifier)
+        return fileReference
+
+    def __iter__(self):
+        """Iterate over the sorted lines of the file content."""
+        return iter(self._graph.store.lines)
+
+    def __len__(self):
+        return len(self._graph)
+
+    def add(self, triple):
         """Add a triple to the file content."""
-        self._content.add(data)
+        self._graph.add(triple)
 
-    def extend(self, data):
+    def extend(self, triples):
         """Add triples to the file content."""
-        self._content.extend(data)
+        self._graph.addN((s, p, o, self._graph) for s, p, o in triples)
 
-    def remove(self, data):
-        """Remove trple from the file content."""
-        try:
-            self._content.remove(data)
-        except KeyError:
-            pass
+    def remove(self, triple):
+        """Remove a triple from the file content."""
+        self._graph.remove(triple)
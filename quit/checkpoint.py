@@ -0,0 +1,112 @@
+import logging
+import pygit2
+
+from pygit2 import GIT_FILEMODE_BLOB, GIT_OBJ_COMMIT
+from rdflib import Literal
+from quit import codec
+from quit.git import Revision
+
+logger = logging.getLogger('quit.checkpoint')
+
+
+class Checkpoint(object):
+    """A snapshot of the synchronized quad store, kept under a QuitStore owned git reference.
+
+    The snapshot is a commit (without parents) whose tree contains three blobs:
+    "commits" holds the raw ids of all synchronized commits, "quads" holds all quads of the
+    store and "contexts" the (identifier, key) pairs of the virtual contexts of the store, both
+    encoded with quit.codec. The features the store was built with are recorded in the commit
+    message, a checkpoint built with other features is ignored.
+    """
+
+    reference = 'refs/quit/provenance'
+    signature = pygit2.Signature('QuitStore', 'quit@quit.aksw.org')
+
+    def __init__(self, repository, reference=None):
+        """Initialize the checkpoint for a quit.git.Repository."""
+        self.repository = repository
+        if reference is not None:
+            self.reference = reference
+
+    def _commit(self):
+        try:
+            reference = self.repository._repository.lookup_reference(self.reference)
+        except (KeyError, ValueError):
+            return None
+        target = self.repository._repository.get(reference.target)
+        if target is None or target.type != GIT_OBJ_COMMIT:
+            return None
+        return target
+
+    def load(self, features):
+        """Load the checkpoint if it was built with the given features.
+
+        Returns:
+            A triple (commits, quads, contexts) of the set of synchronized commit ids, an iterator
+            over the stored quads and an iterator over the (identifier, key) pairs of the virtual
+            contexts or None if there is no usable checkpoint.
+        """
+        commit = self._commit()
+        if commit is None:
+            return None
+
+        properties = Revision(self.repository, commit).properties
+        if properties.get('Features', None) != str(features):
+            logger.info("Checkpoint {} was built with other features, ignore it.".format(
+                commit.id))
+            return None
+
+        try:
+            data = self.repository._repository[commit.tree['commits'].id].data
+            commits = set(
+                pygit2.Oid(raw=data[i:i + 20]).hex for i in range(0, len(data), 20))
+            # the records are decoded and validated once, the rows are iterated afterwards
+            quads = codec.rows(self.repository._repository[commit.tree['quads'].id].data)
+            contexts = codec.rows(self.repository._repository[commit.tree['contexts'].id].data)
+        except (KeyError, ValueError) as e:
+            logger.warning("Checkpoint {} is damaged and ignored: {}".format(commit.id, e))
+            return None
+
+        logger.info("Load checkpoint {} with {} commits.".format(commit.id, len(commits)))
+        return commits, quads, ((identifier, str(key)) for identifier, key in contexts)
+
+    def save(self, features, commits, quads, contexts=()):
+        """Write a new checkpoint and point the reference to it.
+
+        Args:
+            features: the features the store was built with
+            commits: an iterable of synchronized commit ids
+            quads: an iterable of (s, p, o, context identifier) quads
+            contexts: an iterable of (identifier, key) pairs of virtual contexts
+        Returns:
+            The oid of the checkpoint commit
+        """
+        repository = self.repository._repository
+
+        commits = b''.join(pygit2.Oid(hex=cid).raw for cid in sorted(commits))
+
+        builder = repository.TreeBuilder()
+        builder.insert('commits', repository.create_blob(commits), GIT_FILEMODE_BLOB)
+        builder.insert(
+            'quads', repository.create_blob(codec.dumps(quads, 4)), GIT_FILEMODE_BLOB)
+        contexts = ((identifier, Literal(key)) for identifier, key in contexts)
+        builder.insert(
+            'contexts', repository.create_blob(codec.dumps(contexts, 2)), GIT_FILEMODE_BLOB)
+        tree = builder.write()
+
+        message = 'Checkpoint of the QuitStore\n\nFeatures: {}\n'.format(features)
+        oid = repository.create_commit(
+            None, self.signature, self.signature, message, tree, [])
+        repository.create_reference(self.reference, oid, force=True)
+        self.repository.refs.invalidate()
+
+        logger.debug("Saved checkpoint {}.".format(oid))
+        return oid
+
+    def remove(self):
+        """Delete the checkpoint reference."""
+        try:
+            self.repository._repository.lookup_reference(self.reference).delete()
+            self.repository.refs.invalidate()
+        except (KeyError, ValueError):
+            pass
@@ -0,0 +1,139 @@
+import struct
+import sys
+
+from array import array
+from rdflib import BNode, Literal, URIRef
+
+__all__ = ('dumps', 'loads', 'rows')
+
+MAGIC = b'QUIT'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sBBII')
+_LENGTH = struct.Struct('<I')
+
+_KINDS = {URIRef: b'U', BNode: b'B', Literal: b'L'}
+
+
+def _pack(value):
+    if value is None:
+        return _LENGTH.pack(0)
+    data = str(value).encode('utf-8')
+    return _LENGTH.pack(len(data)) + data
+
+
+def _unpack(buffer, offset):
+    (length,) = _LENGTH.unpack_from(buffer, offset)
+    offset += _LENGTH.size
+    return bytes(buffer[offset:offset + length]).decode('utf-8'), offset + length
+
+
+def _dump_term(term):
+    if isinstance(term, Literal):
+        return b'L' + _pack(term) + _pack(term.language) + _pack(term.datatype)
+    for cls, kind in _KINDS.items():
+        if isinstance(term, cls):
+            return kind + _pack(term)
+    raise ValueError("Can not encode term {!r}".format(term))
+
+
+def _load_term(buffer, offset):
+    kind = bytes(buffer[offset:offset + 1])
+    value, offset = _unpack(buffer, offset + 1)
+    if kind == b'U':
+        return URIRef(value), offset
+    if kind == b'B':
+        return BNode(value), offset
+    if kind == b'L':
+        language, offset = _unpack(buffer, offset)
+        datatype, offset = _unpack(buffer, offset)
+        return Literal(
+            value, lang=language or None, datatype=URIRef(datatype) if datatype else None
+        ), offset
+    raise ValueError("Unknown term kind {!r} at offset {}".format(kind, offset))
+
+
+def dumps(tuples, arity):
+    """Encode tuples of RDF terms (e.g. triples or quads) into a compact binary record.
+
+    Each distinct term is written once to a term table, the tuples are stored as a flat array of
+    little endian uint32 term ids, which is aligned to four bytes so it can be used directly from a
+    memory mapped file.
+
+    Args:
+        tuples: An iterable of tuples of rdflib terms, each of length arity
+        arity: The number of terms per tuple
+    Returns:
+        The encoded bytes
+    """
+    ids = {}
+    terms = []
+    index = array('I')
+
+    for row in tuples:
+        for term in row:
+            try:
+                index.append(ids[term])
+            except KeyError:
+                ids[term] = len(terms)
+                index.append(len(terms))
+                terms.append(_dump_term(term))
+
+    if sys.byteorder == 'big':
+        index.byteswap()
+
+    out = [_HEADER.pack(MAGIC, VERSION, arity, len(terms), len(index) // arity if arity else 0)]
+    out.extend(terms)
+    size = sum(len(x) for x in out)
+    out.append(b'\0' * (-size % 4))
+    out.append(index.tobytes())
+    return b''.join(out)
+
+
+def loads(buffer):
+    """Decode a record written by dumps.
+
+    Args:
+        buffer: A bytes-like object, e.g. bytes, a memoryview or an mmap
+    Returns:
+        A triple (arity, terms, ids) where terms is the list of decoded terms and ids is a flat
+        sequence of term ids
+    Raises:
+        ValueError if the buffer does not contain a valid record
+    """
+    try:
+        magic, version, arity, nterms, nrows = _HEADER.unpack_from(buffer, 0)
+    except struct.error:
+        raise ValueError("Buffer is too short for a record")
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Unsupported record {!r} version {}".format(magic, version))
+
+    offset = _HEADER.size
+    terms = []
+    for _ in range(nterms):
+        term, offset = _load_term(buffer, offset)
+        terms.append(term)
+
+    offset += -offset % 4
+    end = offset + nrows * arity * 4
+    if len(buffer) < end:
+        raise ValueError("Buffer is too short for {} rows".format(nrows))
+
+    if sys.byteorder == 'big':
+        ids = array('I', bytes(buffer[offset:end]))
+        ids.byteswap()
+    else:
+        ids = memoryview(buffer)[offset:end].cast('I')
+    return arity, terms, ids
+
+
+def rows(buffer):
+    """Decode a record written by dumps and get an iterator over its tuples of terms.
+
+    The record is decoded and validated before this function returns, not by the iterator.
+
+    Raises:
+        ValueError if the buffer does not contain a valid record
+    """
+    arity, terms, ids = loads(buffer)
+    return (tuple(terms[x] for x in ids[i:i + arity]) for i in range(0, len(ids), arity))
@@ -1,11 +1,13 @@
 import logging
 
 import os
-from pygit2 import Repository, GIT_OBJ_BLOB, GIT_OBJ_TREE
+import re
+from pygit2 import Repository
 from os import walk
-from os.path import join, isfile, relpath
+from os.path import basename, isfile, relpath
 from quit.exceptions import MissingConfigurationError, InvalidConfigurationError
 from quit.exceptions import UnknownConfigurationError
+from quit.git import Trees
 from quit.helpers import isAbsoluteUri
 from rdflib import Graph, ConjunctiveGraph, Literal, Namespace, URIRef, BNode
 from rdflib.plugins.parsers import notation3
@@ -17,6 +19,8 @@ from uritools import urisplit
 
 logger = logging.getLogger('quit.conf')
 
+_PREFIX = re.compile(r'^\s*@prefix\s+([^\s:]*):\s*<([^>]*)>\s*\.', re.MULTILINE)
+
 
 class Feature:
     """Represents the fetures passed by the `--feature` parameter."""
@@ -24,7 +28,8 @@ class Feature:
     Provenance = 1 << 0
     Persistence = 1 << 1
     GarbageCollection = 1 << 2
-    All = Provenance | Persistence | GarbageCollection
+    VersionIndex = 1 << 3
+    All = Provenance | Persistence | GarbageCollection | VersionIndex
 
 
 class QuitStoreConfiguration():
@@ -41,7 +46,12 @@ class QuitStoreConfiguration():
         targetdir=None,
         namespace=None,
         oauthclientid=None,
-        oauthclientsecret=None
+        oauthclientsecret=None,
+        blobcache=None,
+        blobcachesize=None,
+        syncworkers=1,
+        cachebudgets=None,
+        cachepolicy='lru'
     ):
         """Initialize store configuration.
 
@@ -59,6 +69,11 @@ class QuitStoreConfiguration():
         self.namespace = None
         self.oauthclientid = oauthclientid
         self.oauthclientsecret = oauthclientsecret
+        self.blobcache = blobcache
+        self.blobcachesize = blobcachesize
+        self.syncworkers = syncworkers
+        self.cachebudgets = cachebudgets or {}
+        self.cachepolicy = cachepolicy
 
         self.nsMngrSysconf = NamespaceManager(self.sysconf)
         self.nsMngrSysconf.bind('', self.quit, override=False)
@@ -166,34 +181,155 @@ class QuitGraphConfiguration():
 
     quit = Namespace('http://quit.aksw.org/vocab/')
 
-    def __init__(self, repository):
+    def __init__(self, repository, trees=None):
         """Init graph configuration.
 
         This method checks if the config file is given and reads the config file.
         If the config file is missing, it will be generated after analyzing the
-        file structure.
+        file structure. The files of a revision are enumerated with trees, a quit.git.Trees
+        instance which can be shared to reuse the enumeration of unchanged trees.
         """
         logger = logging.getLogger('quit.conf.QuitConfiguration')
         logger.debug('Initializing configuration object.')
 
         self.repository = repository
+        self.trees = trees if trees is not None else Trees(repository)
         self.configfile = None
+        self.configblob = None
         self.mode = None
-        self.graphconf = None
+        self._graphconf = None
+        self._additions = []
+        # graph uri -> file and file -> {'graph': graph uri, ...}, kept consistent by addgraph and
+        # removegraph, to look up both directions in constant time
         self.graphs = {}
         self.files = {}
+        self._shared = False
+        self._graphconfShared = False
+
+    def __copy__(self):
+        """Copy the configuration, the copy can be modified without changing this configuration.
+
+        The copy shares the mappings and the configuration graph with this configuration until one
+        of both is modified (copy-on-write), thus copying is cheap.
+        """
+        other = QuitGraphConfiguration(self.repository, self.trees)
+        other.configfile = self.configfile
+        other.configblob = self.configblob
+        other.mode = self.mode
+        other.graphs = self.graphs
+        other.files = self.files
+        other._graphconf = self._graphconf
+        other._additions = list(self._additions)
+        other._shared = self._shared = True
+        other._graphconfShared = self._graphconfShared = True
+        return other
+
+    @property
+    def graphconf(self):
+        """The configuration graph, including the graphs added by addgraph."""
+        self._applyadditions()
+        return self._graphconf
+
+    def _applyadditions(self):
+        if self._additions:
+            self._owngraphconf()
+            self._graphconf.addN((s, p, o, self._graphconf) for s, p, o in self._additions)
+            self._additions = []
+            self.configblob = None
+
+    def _own(self):
+        """Copy the mappings shared with other copies before they are modified."""
+        if self._shared:
+            self.graphs = dict(self.graphs)
+            self.files = dict(self.files)
+            self._shared = False
+
+    def _owngraphconf(self):
+        """Copy the configuration graph shared with other copies before it is modified."""
+        if self._graphconfShared and self._graphconf is not None:
+            graphconf = self._graphconf
+            self._initgraphconf()
+            for prefix, namespace in graphconf.namespaces():
+                self._graphconf.bind(prefix, namespace, override=True, replace=True)
+            self._graphconf += graphconf
+        self._graphconfShared = False
+
+    def _initgraphconf(self):
+        self._graphconf = Graph()
+        self.nsMngrGraphconf = NamespaceManager(self._graphconf)
+        self.nsMngrGraphconf.bind('', self.quit, override=False)
+
+    def serialize(self):
+        """Serialize the configuration graph to Turtle, i.e. the content of a config.ttl file.
+
+        If the configuration was read from a config.ttl blob and graphs were only added since,
+        only the added graphs are serialized and appended to the content of the blob, using the
+        prefixes declared in it. Thus the cost is proportional to the number of added graphs
+        instead of the size of the configuration.
+        """
+        if self.configblob is None:
+            return self.graphconf.serialize(format='turtle')
+
+        content = self.repository[self.configblob].data.decode('utf-8')
+        if not self._additions:
+            return content
+
+        declared = set(_PREFIX.findall(content))
+        additions = Graph()
+        for prefix, namespace in declared:
+            additions.bind(prefix, namespace, override=True, replace=True)
+        additions.addN((s, p, o, additions) for s, p, o in self._additions)
+
+        # Turtle allows prefix declarations anywhere, only the new ones are repeated
+        lines = []
+        for line in additions.serialize(format='turtle').splitlines():
+            match = _PREFIX.match(line)
+            if match is None or match.groups() not in declared:
+                lines.append(line)
+        if content and not content.endswith('\n'):
+            content += '\n'
+        return content + '\n'.join(lines).strip('\n') + '\n'
+
+    @staticmethod
+    def signature(blobs):
+        """Get a key of the blobs a graph configuration depends on.
+
+        Revisions with the same signature have the same graph configuration, thus it only changes
+        if a config.ttl or *.graph blob changes or if N-Triples files are added or removed.
 
-    def initgraphconfig(self, rev):
+        Args
+        ----
+            blobs: the triple returned by get_blobs_from_repository
+
+        Returns
+        -------
+            A hashable tuple
+
+        """
+        graph_files, config_files, rdf_files = blobs
+        return (
+            tuple(sorted(config_files)),
+            frozenset(graph_files.items()),
+            frozenset(rdf_files) if config_files else frozenset()
+        )
+
+    def initgraphconfig(self, rev, blobs=None):
         """Initialize graph settings.
 
         Public method to initalize graph settings. This method will be run only once.
+
+        Args
+        ----
+            rev: the revision to read the configuration from
+            blobs: the result of get_blobs_from_repository(rev) if it is already known
+
         """
-        if self.graphconf is None:
-            self.graphconf = Graph()
-            self.nsMngrGraphconf = NamespaceManager(self.graphconf)
-            self.nsMngrGraphconf.bind('', self.quit, override=False)
+        if self._graphconf is None:
+            self._initgraphconf()
 
-        graph_files, config_files, rdf_files = self.get_blobs_from_repository(rev)
+        if blobs is None:
+            blobs = self.get_blobs_from_repository(rev)
+        graph_files, config_files, rdf_files = blobs
 
         if len(graph_files) == 0 and len(config_files) == 0:
             self.mode = 'graphfiles'
@@ -238,6 +374,7 @@ class QuitGraphConfiguration():
             raise InvalidConfigurationError(
                 "Configfile could not be parsed {} {}".format(configfileId, e)
             )
+        self.configblob = configfileId
         nsQuit = 'http://quit.aksw.org/vocab/'
         query = 'SELECT DISTINCT ?graphuri ?filename ?format WHERE { '
         query += '  ?graph a <' + nsQuit + 'Graph> . '
@@ -262,8 +399,7 @@ class QuitGraphConfiguration():
 
             # we store which named graph is serialized in which file
             self.graphs[graphuri] = filename
-            self.files[filename] = {
-                'serialization': format, 'graph': graphuri, 'oid': known_blobs[filename]}
+            self.files[filename] = {'serialization': format, 'graph': graphuri, 'oid': filename}
 
     def __get_uri_from_graphfile_blob(self, oid):
         """Search for a graph uri in graph file and return it.
@@ -291,26 +427,40 @@ class QuitGraphConfiguration():
 
     def addgraph(self, graphuri, file, format=None):
         graphuri_obj = URIRef(graphuri)
-        if graphuri_obj in self.graphs.keys():
+        if graphuri_obj in self.graphs:
             return
 
-        self.graphconf.add((self.quit[quote(graphuri)], RDF.type, self.quit.Graph))
-        self.graphconf.add((self.quit[quote(graphuri)], self.quit.graphUri, URIRef(graphuri)))
-        self.graphconf.add((self.quit[quote(graphuri)], self.quit.graphFile, Literal(file)))
+        self._own()
+        triples = [
+            (self.quit[quote(graphuri)], RDF.type, self.quit.Graph),
+            (self.quit[quote(graphuri)], self.quit.graphUri, URIRef(graphuri)),
+            (self.quit[quote(graphuri)], self.quit.graphFile, Literal(file))
+        ]
         self.graphs[graphuri_obj] = file
 
         if format is not None:
-            self.graphconf.add((self.quit[quote(graphuri)], self.quit.hasFormat, Literal(format)))
+            triples.append((self.quit[quote(graphuri)], self.quit.hasFormat, Literal(format)))
             self.files[file] = {'serialization': format, 'graph': graphuri_obj, 'oid': file}
         else:
             self.files[file] = {'graph': graphuri_obj, 'oid': file}
 
+        if self.configblob is not None or self._additions:
+            # keep the additions apart to append them to the content of the config file
+            self._additions.extend(triples)
+        else:
+            self._owngraphconf()
+            self._graphconf.addN((s, p, o, self._graphconf) for s, p, o in triples)
+
     def removegraph(self, graphuri):
-        self.graphconf.remove((self.quit[quote(graphuri)], None, None))
+        self._own()
+        self._applyadditions()
+        self._owngraphconf()
+        self.configblob = None
+        self._graphconf.remove((self.quit[quote(graphuri)], None, None))
 
         if not isinstance(graphuri, URIRef):
             graphuri = URIRef(graphuri)
-        if graphuri in self.graphs.keys():
+        if graphuri in self.graphs:
             filename = self.graphs[graphuri]
             del self.files[filename]
             del self.graphs[graphuri]
@@ -352,10 +502,7 @@ class QuitGraphConfiguration():
         if isinstance(graphuri, str):
             graphuri = URIRef(graphuri)
 
-        if graphuri in self.graphs.keys():
-            return self.graphs[graphuri]
-
-        return
+        return self.graphs.get(graphuri)
 
     def getgraphurifilemap(self):
         """Get the dictionary of graphuris and their files.
@@ -379,7 +526,7 @@ class QuitGraphConfiguration():
             A string containing the RDF serialization of file
 
         """
-        if file in self.files.keys():
+        if file in self.files:
             return self.files[file]['serialization']
 
         return
@@ -410,20 +557,17 @@ class QuitGraphConfiguration():
             dict: containing names rdf files plus format and oid.
 
         """
-        def find_blobs(tree, prefix=''):
+        def find_blobs(tree):
             # Collect graph files, rdf files and config files
-            for entry in tree:
-                if entry.type == GIT_OBJ_BLOB:
-                    format = guess_format(entry.name)
-                    if format is None and entry.name.endswith('.graph'):
-                        graph_file_blobs[join(prefix, entry.name)] = entry.id
-                    elif format is not None and format == 'nt':
-                        rdf_file_blobs[join(prefix, entry.name)] = (entry.id, format)
-                    elif format is not None and entry.name == 'config.ttl':
-                        config_files.append(str(entry.id))
-                elif entry.type == GIT_OBJ_TREE:
-                    tree_obj = self.repository[entry.id]
-                    find_blobs(tree_obj, join(prefix, entry.name))
+            for path, oid, mode in self.trees.entries(tree):
+                name = basename(path)
+                format = guess_format(name)
+                if format is None and name.endswith('.graph'):
+                    graph_file_blobs[path] = oid
+                elif format is not None and format == 'nt':
+                    rdf_file_blobs[path] = (oid, format)
+                elif format is not None and name == 'config.ttl':
+                    config_files.append(str(oid))
 
         config_files = []
         graph_files = {}
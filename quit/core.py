@@ -1,7 +1,9 @@
 import pygit2
 
 import logging
+import multiprocessing
 
+from collections import OrderedDict
 from copy import copy
 
 from pygit2 import GIT_MERGE_ANALYSIS_UP_TO_DATE
@@ -10,19 +12,43 @@ from pygit2 import GIT_MERGE_ANALYSIS_NORMAL
 from pygit2 import GIT_SORT_REVERSE, GIT_RESET_HARD, GIT_STATUS_CURRENT
 
 from rdflib import Graph, ConjunctiveGraph, BNode, Literal, URIRef
+from rdflib.plugins import sparql
+from rdflib.plugins.sparql.sparql import Query
 import re
 
+from quit import codec, ntriples
 from quit.conf import Feature, QuitGraphConfiguration
-from quit.helpers import applyChangeset
+from quit.git import Repository
+from quit.helpers import applyChangeset, algebra_key, is_deterministic_query, query_graphs
 from quit.namespace import RDFS, FOAF, XSD, PROV, QUIT, is_a
-from quit.graphs import RewriteGraph, InMemoryAggregatedGraph
-from quit.utils import graphdiff, git_timestamp, iri_to_name
-from quit.cache import Cache, FileReference
+from quit.graphs import RewriteGraph, InMemoryAggregatedGraph, InMemoryCopyOnEditAggregatedGraph
+from quit.graphs import NTriplesStore, VirtualContextStore
+from quit.utils import graphdiff, git_timestamp, iri_to_name, linediff
+from quit.cache import BlobCache, Cache, FileReference
+from quit.index import VersionedIndex
+from quit.terms import TERMS
+from quit.checkpoint import Checkpoint
 
 import subprocess
 
 logger = logging.getLogger('quit.core')
 
+# the cost of copying and diffing a line of a cached blob relative to the cost of parsing a line
+DELTA_LINE_COST = 0.1
+
+# the number of translated queries and updates kept, clients typically repeat a few query shapes
+QUERY_CACHE_SIZE = 500
+
+# the default memory budget of the query results in bytes
+RESULT_CACHE_BUDGET = 64 * 1024 * 1024
+
+# the default memory budget of the blob graphs of the quit:graph-<oid> contexts in bytes, patterns
+# on the union of all graphs read all of them
+ENTITY_CACHE_BUDGET = 512 * 1024 * 1024
+
+# the query forms whose results are cached
+CACHED_QUERIES = ('SelectQuery', 'AskQuery', 'ConstructQuery')
+
 
 class Queryable:
     """A class that represents a querable graph-like object."""
@@ -68,7 +94,7 @@ class Store(Queryable):
 
 class MemoryStore(Store):
     def __init__(self, additional_bindings=list()):
-        store = ConjunctiveGraph(identifier='default')
+        store = ConjunctiveGraph(store=VirtualContextStore(), identifier='default')
         nsBindings = [('quit', QUIT), ('foaf', FOAF), ('prov', PROV)]
 
         for prefix, namespace in nsBindings + additional_bindings:
@@ -78,14 +104,58 @@ class MemoryStore(Store):
 
 
 class VirtualGraph(Queryable):
-    def __init__(self, store):
+    """A queryable dataset of a commit.
+
+    Args:
+        store: the InMemoryAggregatedGraph of the dataset
+        blobs: a dict of the graph IRIs of the commit to the oids of their blobs
+        results: a Cache of query results shared by the datasets of all commits
+    """
+
+    def __init__(self, store, blobs=None, results=None):
         if not isinstance(store, InMemoryAggregatedGraph):
             raise Exception()
         self.store = store
+        self.blobs = blobs
+        self.results = results
 
     def query(self, querystring):
         return self.store.query(querystring)
 
+    def cachedQuery(self, query):
+        """Evaluate a translated query or get its result from the result cache.
+
+        The result is keyed by the query and the blobs of the graphs the query reads, thus it is
+        shared by all commits which did not change these graphs.
+
+        Returns:
+            A tuple (result, hit) where hit is True if the result was taken from the cache
+        """
+        if self.results is None or self.blobs is None or not isinstance(query, Query) or \
+                query.algebra.name not in CACHED_QUERIES or not is_deterministic_query(query):
+            return self.query(query), False
+
+        graphs = query_graphs(query, sparql.SPARQL_DEFAULT_GRAPH_UNION)
+        if graphs is None:
+            graphs = self.blobs.keys()
+        key = (
+            algebra_key(query.algebra), sparql.SPARQL_DEFAULT_GRAPH_UNION,
+            frozenset((graph, self.blobs.get(graph, None)) for graph in graphs)
+        )
+
+        evaluated = []
+
+        def evaluate():
+            evaluated.append(True)
+            result = self.query(query)
+            if result.type == 'SELECT':
+                # the rows must not reference the evaluation context and its dataset
+                result.bindings = [dict(row) for row in result.bindings]
+            return result
+
+        result = self.results.load(key, evaluate)
+        return result, not evaluated
+
     def update(self, querystring):
         return self.store.update(querystring)
 
@@ -99,15 +169,109 @@ class Quit(object):
         self.config = config
         self.repository = repository
         self.store = store
-        self._commits = Cache()
-        self._blobs = Cache()
-        self._graphconfigs = Cache()
+        self._commits = self._createCache('commits')
+        self._blobs = self._createCache('blobs', evicted=self._dropSnapshots)
+        self._graphconfigs = self._createCache('graphconfigs')
+        self._entities = self._createCache('entities', budget=ENTITY_CACHE_BUDGET)
+        self._snapshots = self._createCache('snapshots')
+        # translated SPARQL queries and updates by their normalized text, see parse_query_type
+        self.queries = self._createCache('queries', capacity=QUERY_CACHE_SIZE)
+        self._results = self._createCache('results', budget=RESULT_CACHE_BUDGET)
+        self._blobcache = None
+        if config is not None and config.blobcache:
+            self._blobcache = BlobCache(config.blobcache, config.blobcachesize)
+        self.index = None
+        if config is not None and config.features and config.hasFeature(Feature.VersionIndex):
+            self.index = VersionedIndex()
+        self._synced = set()
+        self._globalDefaultBranch = None
+        self.checkpoint = Checkpoint(repository)
+        if store is not None:
+            store.store.store.resolver = self.getBlobGraph
+
+    def _createCache(self, name, evicted=None, capacity=50, budget=None):
+        """Create an internal cache with the budget and eviction policy of the configuration.
+
+        A budget of the configuration replaces the capacity resp. the given default budget.
+        """
+        policy = 'lru'
+        if self.config is not None:
+            budget = self.config.cachebudgets.get(name, budget)
+            policy = self.config.cachepolicy
+        if budget is None:
+            return Cache(capacity=capacity, policy=policy, evicted=evicted)
+        return Cache(capacity=None, budget=budget, policy=policy, evicted=evicted)
+
+    def _dropSnapshots(self, blob, value):
+        """Remove the snapshots using an evicted blob, so they don't keep its graph in memory."""
+        for commitid in list(self._snapshots):
+            # peek does not use the snapshots, thus their order and statistics are kept
+            snapshot = self._snapshots.peek(commitid)
+            if snapshot is None:
+                continue
+            instance, blobs = snapshot
+            if blob in blobs:
+                self._snapshots.remove(commitid)
+
+    def cacheStatistics(self):
+        """Get the statistics of the internal caches as dict of cache names to dicts."""
+        return {
+            'commits': self._commits.statistics,
+            'blobs': self._blobs.statistics,
+            'graphconfigs': self._graphconfigs.statistics,
+            'entities': self._entities.statistics,
+            'snapshots': self._snapshots.statistics,
+            'queries': self.queries.statistics,
+            'results': self._results.statistics
+        }
 
     def _exists(self, cid):
-        uri = QUIT['commit-' + cid]
-        for _ in self.store.store.quads((uri, None, None, QUIT.default)):
-            return True
-        return False
+        return cid in self._synced
+
+    @property
+    def _checkpointFeatures(self):
+        """Get the features which influence the content of the store or 0 if it is not used."""
+        if self.config is None:
+            return 0
+        return self.config.features & (Feature.Provenance | Feature.Persistence)
+
+    def loadCheckpoint(self):
+        """Restore the store from the checkpoint of the repository if it is usable.
+
+        Returns:
+            True if the checkpoint was loaded, else False
+        """
+        features = self._checkpointFeatures
+        if not features:
+            return False
+
+        checkpoint = self.checkpoint.load(features)
+        if checkpoint is None:
+            return False
+
+        commits, quads, contexts = checkpoint
+        self.store.store.addN(quads)
+        for identifier, key in contexts:
+            self.store.store.store.addVirtualContext(identifier, key)
+        self._synced.update(commits)
+        return True
+
+    def saveCheckpoint(self):
+        """Write the current store and the synchronized commits to the checkpoint."""
+        features = self._checkpointFeatures
+        if not features:
+            return
+
+        store = self.store.store.store
+        quads = (
+            (s, p, o, c.identifier) for (s, p, o), contexts
+            in store.triples((None, None, None), virtual=False) for c in contexts
+        )
+        try:
+            self.checkpoint.save(features, self._synced, quads, store.virtualContexts())
+        except Exception as e:
+            logger.warning('Checkpoint could not be saved.')
+            logger.debug(e)
 
     def getDefaultBranch(self):
         """Get the default branch for the Git repository which should be used in the application.
@@ -124,21 +288,30 @@ class Quit(object):
         repository_current_head = self.repository.current_head
         if repository_current_head:
             return repository_current_head
-        try:
-            git_config_default_branch = pygit2.Config.get_global_config()['init.defaultBranch']
-            if git_config_default_branch:
-                return git_config_default_branch
-        except KeyError:
-            pass
-        return "master"
+        if self._globalDefaultBranch is None:
+            self._globalDefaultBranch = "master"
+            try:
+                git_config_default_branch = pygit2.Config.get_global_config()['init.defaultBranch']
+                if git_config_default_branch:
+                    self._globalDefaultBranch = git_config_default_branch
+            except KeyError:
+                pass
+        return self._globalDefaultBranch
 
     def rebuild(self):
-        for context in self.store.contexts():
-            self.store.remove((None, None, None), context)
+        """Drop the store and the checkpoint and replay the complete history."""
+        for context in list(self.store.store.contexts()):
+            self.store.store.remove((None, None, None, context))
+        self._synced = set()
+        self.checkpoint.remove()
         self.syncAll()
 
     def syncAll(self):
-        """Synchronize store with repository data."""
+        """Synchronize store with repository data.
+
+        If the store is empty it is restored from the checkpoint first, thus only commits which
+        were not synchronized, yet are replayed. Afterwards the checkpoint is updated.
+        """
         def traverse(commit, seen):
             commits = []
             merges = []
@@ -163,59 +336,206 @@ class Quit(object):
             return commits
 
         seen = set()
+        synced = 0
+
+        if not self._synced:
+            self.loadCheckpoint()
 
+        pending = []
         for name in self.repository.tags_or_branches:
             initial_commit = self.repository.revision(name)
-            commits = traverse(initial_commit, seen)
+            pending.extend(reversed(traverse(initial_commit, seen)))
 
-            while commits:
-                commit = commits.pop()
+        workers = self.config.syncworkers if self.config is not None else 1
+        if (
+            workers and workers > 1 and len(pending) > 1 and
+            self.config.hasFeature(Feature.Provenance)
+        ):
+            synced = self._syncParallel(pending, workers)
+        else:
+            for commit in pending:
                 self.syncSingle(commit)
+                synced += 1
 
-    def syncSingle(self, commit):
+        if synced:
+            self.saveCheckpoint()
+
+    def _syncParallel(self, commits, workers):
+        """Synchronize commits and compute their deltas in a pool of worker processes.
+
+        The deltas are computed in parallel, the results are added to the store in the given
+        (topological) order.
+
+        Returns:
+            The number of synchronized commits
+        """
+        chunksize = max(1, min(64, len(commits) // (workers * 4)))
+        blobcache = self._blobcache.path if self._blobcache is not None else None
+        blobcachesize = self._blobcache.capacity if self._blobcache is not None else None
+        logger.info("Synchronize {} commits with {} workers.".format(len(commits), workers))
+
+        try:
+            pool = multiprocessing.Pool(
+                workers, initializer=_initSyncWorker,
+                initargs=(self.repository.path, blobcache, blobcachesize))
+        except OSError as e:
+            logger.warning("Could not start sync workers, synchronize serially: {}".format(e))
+            for commit in commits:
+                self.syncSingle(commit)
+            return len(commits)
+
+        with pool:
+            ids = (commit.id for commit in commits)
+            for commit, (commitid, delta) in zip(
+                    commits, pool.imap(_syncWorkerDelta, ids, chunksize)):
+                self.syncSingle(commit, _decodeDelta(delta))
+        return len(commits)
+
+    def syncSingle(self, commit, delta=None):
         if not self._exists(commit.id):
-            self.changeset(commit)
+            self.changeset(commit, delta)
+            self._synced.add(commit.id)
+        if self.index is not None:
+            self.indexCommit(commit)
+
+    def indexCommit(self, commit):
+        """Add the versions of all graphs of a commit to the versioned index."""
+        graphconfig = self.getGraphConfig(commit.id)
+
+        for name, oid in self.getFilesForCommit(commit):
+            identifier = QUIT["graph-{}".format(oid)]
+            if identifier not in self.index:
+                self.index.addVersion(
+                    identifier, URIRef(graphconfig.getgraphuriforfile(name)),
+                    self._parseBlobGraph(oid).triples((None, None, None)))
 
     def instance(self, reference, force=False):
         """Create and return dataset for a given commit id.
 
+        Unless force is set, the dataset is a read-only snapshot shared by all requests on the
+        same commit and it must not be modified. With force, the dataset is built for the caller
+        only and its graphs are overlays over the cached graphs, thus it can be modified without
+        affecting the cache. Its changes are available by instance.store.changes().
+
         Args:
             reference: commit id or reference of the commit to retrieve
             force: force to get the dataset from the git repository instead of the internal cache
         Returns:
             Instance of VirtualGraph representing the respective dataset
         """
+        if not reference:
+            dataset = InMemoryCopyOnEditAggregatedGraph if force else InMemoryAggregatedGraph
+            return VirtualGraph(dataset(graphs=[], identifier='default')), None
+
+        commit = self.repository.revision(reference)
+
+        if force:
+            instance, blobs = self._buildInstance(commit, True)
+        else:
+            instance, blobs = self._snapshots.load(
+                commit.id, lambda: self._buildInstance(commit, False)
+            )
+        return instance, commit.id
+
+    def _buildInstance(self, commit, force):
+        """Build the dataset of a commit.
+
+        The graphs of the dataset are loaded when they are accessed the first time, thus queries
+        on single graphs do not parse the other graphs.
+
+        Returns:
+            A tuple (VirtualGraph, blobs) where blobs is the set of (name, oid) tuples of the
+            commit's graphs
+        """
         default_graphs = []
-        commitid = None
-
-        if reference:
-            commit = self.repository.revision(reference)
-            commitid = commit.id
-
-            for blob in self.getFilesForCommit(commit):
-                try:
-                    (name, oid) = blob
-                    (f, context) = self.getFileReferenceAndContext(blob, commit)
-                    internal_identifier = context.identifier + '-' + str(oid)
-
-                    if force or not self.config.hasFeature(Feature.Persistence):
-                        g = context
-                    else:
-                        g = RewriteGraph(
-                            self.store.store.store,
-                            internal_identifier,
-                            context.identifier
-                        )
+        loaders = []
+        blobs = set()
+        oids = {}
+
+        store = None
+        if not force and self.index is not None:
+            self.indexCommit(commit)
+            store = self.index
+        elif not force and self.config.hasFeature(Feature.Persistence):
+            store = self.store.store.store
+
+        for blob in self.getFilesForCommit(commit):
+            try:
+                (name, oid) = blob
+                graphUri = self.getGraphConfig(commit.id).getgraphuriforfile(name)
+
+                if store is None:
+                    loaders.append((
+                        URIRef(graphUri), lambda blob=blob: self._loadContext(blob, commit)
+                    ))
+                else:
+                    g = RewriteGraph(
+                        store,
+                        QUIT["graph-{}".format(oid)],
+                        URIRef(graphUri)
+                    )
                     default_graphs.append(g)
-                except KeyError:
-                    pass
+                blobs.add(blob)
+                oids[URIRef(graphUri)] = oid
+            except KeyError:
+                pass
+
+        dataset = InMemoryCopyOnEditAggregatedGraph if force else InMemoryAggregatedGraph
+        instance = dataset(graphs=default_graphs, loaders=loaders, identifier='default')
+
+        # modifiable datasets of force do not share their results
+        return VirtualGraph(instance, oids, None if force else self._results), blobs
+
+    def delta(self, commit):
+        """Compute the changes of all graphs of a commit compared to its first parent.
+
+        Only the graph files added, modified or deleted by the commit and the files whose graph
+        changed in the graph configuration are loaded and compared.
+
+        Returns:
+            An OrderedDict of graph identifiers to lists of ('additions'|'removals', triples)
+        """
+        parent = next(iter(commit.parents or []), None)
+
+        paths = set(path for path, oid, parent_oid in commit.changes(deleted=True))
+        if parent is not None:
+            config = self.getGraphConfig(commit.id)
+            parentConfig = self.getGraphConfig(parent.id)
+            if config is not parentConfig:
+                for path in set(config.getfiles()) | set(parentConfig.getfiles()):
+                    if config.getgraphuriforfile(path) != parentConfig.getgraphuriforfile(path):
+                        paths.add(path)
+
+        first, firstReferences = self._changedGraphs(parent, paths) if parent else (None, None)
+        second, secondReferences = self._changedGraphs(commit, paths)
+        return graphdiff(first, second, firstReferences, secondReferences)
+
+    def _changedGraphs(self, commit, paths):
+        """Get a dataset of the graph files of a commit in paths and their FileReferences.
 
-        instance = InMemoryAggregatedGraph(
-            graphs=default_graphs, identifier='default')
+        Returns:
+            A tuple (InMemoryAggregatedGraph, dict of graph identifiers to FileReferences)
+        """
+        graphs = []
+        references = {}
+        for blob in self.getFilesForCommit(commit):
+            if blob[0] not in paths:
+                continue
+            try:
+                f, context = self.getFileReferenceAndContext(blob, commit)
+            except KeyError:
+                continue
+            graphs.append(context)
+            references[context.identifier] = f
+        return InMemoryAggregatedGraph(graphs=graphs), references
 
-        return VirtualGraph(instance), commitid
+    def changeset(self, commit, delta=None):
+        """Add the provenance and persistence data of a commit to the store.
 
-    def changeset(self, commit):
+        Args:
+            commit: the quit.git.Revision to add
+            delta: the precomputed result of delta(commit), it is computed if not given
+        """
 
         if (
             not self.config.hasFeature(Feature.Persistence)
@@ -234,8 +554,6 @@ class Quit(object):
             g.add((role_committer_uri, is_a, PROV['Role']))
 
         # Create the commit
-        i1, commitid = self.instance(commit.id, True)
-
         commit_uri = QUIT['commit-' + commit.id]
 
         if self.config.hasFeature(Feature.Provenance):
@@ -304,11 +622,8 @@ class Quit(object):
                 g.add((commit_uri, PROV["wasInformedBy"], parent_uri))
 
             # Diff
-            parent = next(iter(commit.parents or []), None)
-
-            i2, commitid = self.instance(parent.id, True) if parent else (None, None)
-
-            delta = graphdiff(i2.store if i2 else None, i1.store)
+            if delta is None:
+                delta = self.delta(commit)
 
             for index, (iri, changesets) in enumerate(delta.items()):
                 update_uri = QUIT['update-{}-{}'.format(commit.id, index)]
@@ -317,68 +632,49 @@ class Quit(object):
                 for (op, triples) in changesets:
                     op_uri = QUIT[op + '-' + commit.id]
                     g.add((update_uri, QUIT[op], op_uri))
-                    g.addN((s, p, o, op_uri) for s, p, o in triples)
+                    g.addN((s, p, o, op_uri) for s, p, o in map(TERMS.triple, triples))
 
         # Entities
-        if commit.id not in self._graphconfigs:
-            self.updateGraphConfig(commit.id)
+        graphconfig = self.getGraphConfig(commit.id)
 
-        map = self._graphconfigs.get(commit.id).getgraphurifilemap()
+        for name, oid, parent_oid in commit.changes():
+            graphUri = graphconfig.getgraphuriforfile(name)
+            if graphUri is None:
+                continue
 
-        for entity in commit.node().entries(recursive=True):
-            # todo check if file was changed
-            if entity.is_file:
+            graphUri = URIRef(graphUri)
+            private_uri = QUIT["graph-{}".format(oid)]
 
-                if entity.name not in map.values():
-                    continue
-
-                graphUri = self._graphconfigs.get(commit.id).getgraphuriforfile(entity.name)
-                blob = (entity.name, entity.oid)
-
-                try:
-                    f, context = self.getFileReferenceAndContext(blob, commit)
-                except KeyError:
-                    graph = Graph(identifier=graphUri)
-                    graph.parse(data=entity.content, format='nt')
-
-                    self._blobs.set(
-                        blob, (FileReference(entity.name, entity.content), graph)
-                    )
-
-                private_uri = QUIT["graph-{}".format(entity.oid)]
-
-                if (
-                    self.config.hasFeature(Feature.Provenance) or
-                    self.config.hasFeature(Feature.Persistence)
-                ):
-                    g.add((private_uri, is_a, PROV['Entity']))
-                    g.add(
-                        (private_uri, PROV['specializationOf'], context.identifier))
-                    g.add(
-                        (private_uri, PROV['wasGeneratedBy'], commit_uri))
-                    g.add((private_uri, PROV['generatedAtTime'], Literal(
-                        git_timestamp(commit.author.time, commit.author.offset),
-                        datatype=XSD.dateTime)))
-
-                    q_usage = BNode()
-                    g.add((private_uri, PROV['qualifiedGeneration'], q_usage))
-                    g.add((q_usage, is_a, PROV['Generation']))
-                    g.add((q_usage, PROV['activity'], commit_uri))
-
-                    prev = next(entity.history(), None)
-                    if prev:
-                        prev_uri = QUIT["graph-{}-{}".format(prev.oid, index)]
-                        g.add((private_uri, PROV['wasDerivedFrom'], prev_uri))
-                        g.add((commit_uri, PROV['used'], prev_uri))
-
-                        q_derivation = BNode()
-                        g.add((private_uri, PROV['qualifiedDerivation'], q_derivation))
-                        g.add((q_derivation, is_a, PROV['Derivation']))
-                        g.add((q_derivation, PROV['entity'], prev_uri))
-                        g.add((q_derivation, PROV['hadActivity'], commit_uri))
-                if self.config.hasFeature(Feature.Persistence):
-                    g.addN((s, p, o, private_uri) for s, p, o
-                           in context.triples((None, None, None)))
+            if (
+                self.config.hasFeature(Feature.Provenance) or
+                self.config.hasFeature(Feature.Persistence)
+            ):
+                g.add((private_uri, is_a, PROV['Entity']))
+                g.add(
+                    (private_uri, PROV['specializationOf'], graphUri))
+                g.add(
+                    (private_uri, PROV['wasGeneratedBy'], commit_uri))
+                g.add((private_uri, PROV['generatedAtTime'], Literal(
+                    git_timestamp(commit.author.time, commit.author.offset),
+                    datatype=XSD.dateTime)))
+
+                q_usage = BNode()
+                g.add((private_uri, PROV['qualifiedGeneration'], q_usage))
+                g.add((q_usage, is_a, PROV['Generation']))
+                g.add((q_usage, PROV['activity'], commit_uri))
+
+                if parent_oid:
+                    prev_uri = QUIT["graph-{}".format(parent_oid)]
+                    g.add((private_uri, PROV['wasDerivedFrom'], prev_uri))
+                    g.add((commit_uri, PROV['used'], prev_uri))
+
+                    q_derivation = BNode()
+                    g.add((private_uri, PROV['qualifiedDerivation'], q_derivation))
+                    g.add((q_derivation, is_a, PROV['Derivation']))
+                    g.add((q_derivation, PROV['entity'], prev_uri))
+                    g.add((q_derivation, PROV['hadActivity'], commit_uri))
+            if self.config.hasFeature(Feature.Persistence):
+                g.store.addVirtualContext(private_uri, str(oid))
 
     def getFilesForCommit(self, commit):
         """Get all entry, oid tupples for a commit.
@@ -389,50 +685,171 @@ class Quit(object):
         if commit is None:
             return set()
 
-        if commit.id not in self._commits:
-            if commit.id not in self._graphconfigs:
-                self.updateGraphConfig(commit.id)
+        def load():
+            files = self.getGraphConfig(commit.id).getfiles()
+            return set((path, oid) for path, oid, mode in commit.files() if path in files)
 
-            uriFileMap = self._graphconfigs.get(commit.id).getgraphurifilemap()
-            blobs = set()
+        return self._commits.load(commit.id, load)
 
-            for entity in commit.node().entries(recursive=True):
-                if entity.is_file:
-                    if entity.name not in uriFileMap.values():
-                        continue
-                    blob = (entity.name, entity.oid)
-                    blobs.add(blob)
-            self._commits.set(commit.id, blobs)
-            return blobs
-        return self._commits.get(commit.id)
+    def getFileReferences(self, commit):
+        """Get a dict of graph identifiers to the FileReferences of all graphs of a commit."""
+        references = {}
+        for blob in self.getFilesForCommit(commit):
+            try:
+                f, context = self.getFileReferenceAndContext(blob, commit)
+                references[context.identifier] = f
+            except KeyError:
+                pass
+        return references
+
+    def _loadContext(self, blob, commit):
+        """Get the Context of a blob of a commit or None if it can not be loaded."""
+        try:
+            return self.getFileReferenceAndContext(blob, commit)[1]
+        except KeyError:
+            return None
 
     def getFileReferenceAndContext(self, blob, commit):
         """Get the FileReference and Context for a given blob (name, oid) of a commit.
 
         On Cache miss this method also updates teh commits cache.
         """
-        if commit.id not in self._graphconfigs:
-            self.updateGraphConfig(commit.id)
-
-        if blob not in self._blobs:
+        def load():
             (name, oid) = blob
-            content = commit.node(path=name).content
-            graphUri = self._graphconfigs.get(commit.id).getgraphuriforfile(name)
-            graph = Graph(identifier=URIRef(graphUri))
-            graph.parse(data=content, format='nt')
-            quitWorkingData = (FileReference(name, content), graph)
-            self._blobs.set(blob, quitWorkingData)
-            return quitWorkingData
-        return self._blobs.get(blob)
+            graphUri = self.getGraphConfig(commit.id).getgraphuriforfile(name)
+            return self._loadBlob(name, oid, graphUri)
+
+        return self._blobs.load(blob, load)
+
+    def _loadBlob(self, name, oid, graphUri):
+        """Parse the content of a blob into a FileReference and a Graph.
+
+        The blob is materialized from another cached version of the file if possible. Else, if a
+        blob cache is configured, the parsed blob is taken from or added to it.
+
+        Args:
+            name: the path of the blob
+            oid: the oid of the blob
+            graphUri: the identifier of the resulting graph
+        Returns:
+            A tuple (FileReference, Graph) where the Graph is the graph of the FileReference
+        """
+        content = memoryview(self.repository._repository[oid])
+        fileReference = self._materializeBlob(name, oid, graphUri, content)
+        if fileReference is not None:
+            return fileReference, fileReference.graph
+
+        fileReference = FileReference(name, '', URIRef(graphUri))
+        graph = fileReference.graph
+        if self._loadCachedBlob(graph, oid) is not None:
+            return fileReference, graph
+
+        graph.store.load(ntriples.parse(content))
+
+        if self._blobcache is not None:
+            rows = list(graph.store.rows())
+            self._blobcache.set(oid, [row[0] for row in rows], [row[1] for row in rows])
+        return fileReference, graph
+
+    def _materializeBlob(self, name, oid, graphUri, content):
+        """Materialize a blob from a cached version of the same file and the delta of their lines.
+
+        The cached version with the most similar estimated number of lines is copied, then the
+        lines only in the cached version are removed and the lines only in the blob are parsed and
+        added. This is only done if it is cheaper than parsing the blob according to
+        DELTA_LINE_COST, the blob is only decoded and split if there is such a version. Files with
+        blank nodes are always parsed, since the blank nodes of their lines are not the same.
+
+        Args:
+            name: the path of the blob
+            oid: the oid of the blob
+            graphUri: the identifier of the resulting graph
+            content: the content of the blob as bytes-like object
+        Returns:
+            A FileReference or None if the blob has to be parsed
+        """
+        base = None
+        for blob in self._blobs:
+            if blob[0] != name or blob[1] == oid:
+                continue
+            cached = self._blobs.peek(blob)
+            if cached is None:
+                continue
+            estimate = _estimateLines(cached[0], len(content))
+            if base is None or abs(len(cached[0]) - estimate) < abs(len(base) - size):
+                base, size = cached[0], estimate
+
+        def cheaper(changes, size):
+            return DELTA_LINE_COST * len(base) + changes < size
+
+        if base is None or not cheaper(abs(len(base) - size), size):
+            return None
+
+        content = str(content, 'utf-8')
+        if '_:' in content:
+            return None
+        lines = [line for line in content.split('\n') if line]
+        lines.sort()
+        removals, additions = linediff(base, lines)
+        if (
+            not cheaper(len(removals) + len(additions), len(lines)) or
+            any('_:' in line for line in removals)
+        ):
+            return None
+
+        fileReference = base.copy(URIRef(graphUri))
+        store = fileReference.graph.store
+        for triple, line in ntriples.parse('\n'.join(removals)):
+            store.remove(triple)
+        store.load(ntriples.parse('\n'.join(additions)))
+
+        logger.debug("Materialized {} of {} from {} removals and {} additions".format(
+            oid, name, len(removals), len(additions)))
+        return fileReference
+
+    def _loadCachedBlob(self, graph, oid):
+        """Add the triples of a blob from the blob cache to a graph.
+
+        Returns:
+            The lines of the blob or None if the blob is not cached
+        """
+        if self._blobcache is None:
+            return None
+        try:
+            triples, lines = self._blobcache.get(oid)
+        except KeyError:
+            return None
+        graph.store.load(zip(triples, lines))
+        return lines
+
+    def getBlobGraph(self, oid):
+        """Get the graph of a blob, it is used to resolve the virtual graph-<oid> contexts.
+
+        The graph is taken from the blob cache or parsed from the repository and kept in memory
+        until it is evicted from the entities cache.
+
+        Args:
+            oid: the oid of the blob
+        Returns:
+            A Graph containing the triples of the blob
+        """
+        key = str(oid)
+        return self._entities.load(key, lambda: self._parseBlobGraph(key))
+
+    def _parseBlobGraph(self, oid):
+        """Get a new graph of a blob from the blob cache or the repository."""
+        key = str(oid)
+        graph = Graph(store=NTriplesStore(), identifier=QUIT["graph-{}".format(key)])
+        if self._loadCachedBlob(graph, key) is None:
+            graph.store.load(ntriples.parse(memoryview(self.repository._repository[key])))
+        return graph
 
     def applyQueryOnCommit(self, parsedQuery, parent_commit_ref, target_ref, query=None,
                            default_graph=[], named_graph=[]):
         """Apply an update query on the graph and the git repository."""
-        graph, commitid = self.instance(parent_commit_ref)
+        # the update only changes the overlays of the dataset, not the cached graphs
+        graph, commitid = self.instance(parent_commit_ref, True)
         resultingChanges, exception = graph.update(parsedQuery)
-        if exception:
-            # TODO need to revert or invalidate the graph at this point.
-            pass
         oid = self.commit(graph, resultingChanges, 'New Commit from QuitStore', parent_commit_ref,
                           target_ref, query=query, default_graph=default_graph,
                           named_graph=named_graph)
@@ -479,10 +896,7 @@ class Quit(object):
                 pass
         index = self.repository.index(parent_commit_id)
 
-        if parent_commit_id not in self._graphconfigs:
-            self.updateGraphConfig(parent_commit_id)
-
-        graphconfig = self._graphconfigs.get(parent_commit_id)
+        graphconfig = self.getGraphConfig(parent_commit_id)
         known_files = graphconfig.getfiles().keys()
 
         blobs_new = self._applyKnownGraphs(delta, blobs, parent_commit, index)
@@ -500,10 +914,10 @@ class Quit(object):
 
             # Update Cache and add new contexts to store
             blob = fileReference.path, index.stash[fileReference.path][0]
-            self._blobs.set(blob, (fileReference, graph.store.get_context(identifier)))
+            self._blobs.set(blob, (fileReference, fileReference.graph))
             blobs_new.add(blob)
-        if graphconfig.mode == 'configuration':
-            index.add('config.ttl', new_config.graphconf.serialize(format='turtle'))
+        if graphconfig.mode == 'configuration' and new_contexts:
+            index.add('config.ttl', new_config.serialize())
 
         message = self._build_message(message, query, delta, default_graph, named_graph, **kwargs)
         author = self.repository._repository.default_signature
@@ -548,11 +962,28 @@ class Quit(object):
         return "\n".join(out)
 
     def _applyKnownGraphs(self, delta, blobs, parent_commit, index):
+        """Apply the delta to the blobs of the parent commit.
+
+        Only the blobs of changed graphs are loaded and written, the index keeps all other blobs.
+        The delta is applied to copies of the cached FileReferences, since the cached graphs are
+        shared with snapshots, result cache entries and concurrent queries of the parent commit.
+
+        Returns:
+            The set of (name, oid) tuples of the graph files of the new commit
+        """
         blobs_new = set()
         for blob in blobs:
             (fileName, oid) = blob
             try:
+                identifier = URIRef(
+                    self.getGraphConfig(parent_commit.id).getgraphuriforfile(fileName))
+                if not any(entry['delta'].get(identifier) for entry in delta):
+                    blobs_new.add(blob)
+                    continue
+
                 file_reference, context = self.getFileReferenceAndContext(blob, parent_commit)
+                file_reference = file_reference.copy()
+                context = file_reference.graph
                 for entry in delta:
                     changeset = entry['delta'].get(context.identifier, None)
 
@@ -562,7 +993,6 @@ class Quit(object):
 
                 index.add(file_reference.path, file_reference.content)
 
-                self._blobs.remove(blob)
                 blob = fileName, index.stash[file_reference.path][0]
                 self._blobs.set(blob, (file_reference, context))
                 blobs_new.add(blob)
@@ -588,7 +1018,7 @@ class Quit(object):
                         ] + [0]
                         fileName = '{}_{}.nt'.format(iri_to_name(identifier), max(n)+1)
 
-                    new_contexts[identifier] = FileReference(fileName, '')
+                    new_contexts[identifier] = FileReference(fileName, '', identifier)
 
                 fileReference = new_contexts[identifier]
                 applyChangeset(fileReference, changeset, identifier)
@@ -618,8 +1048,65 @@ class Quit(object):
             logger.debug('Git garbage collection failed to spawn.')
             logger.debug(e)
 
+    def getGraphConfig(self, commitId):
+        """Get the graph configuration for a given commit id, it is loaded on a cache miss."""
+        return self._graphconfigs.load(commitId, lambda: self._loadGraphConfig(commitId))
+
     def updateGraphConfig(self, commitId):
         """Update the graph configuration for a given commit id."""
-        graphconf = QuitGraphConfiguration(self.repository._repository)
-        graphconf.initgraphconfig(commitId)
-        self._graphconfigs.set(commitId, graphconf)
+        self._graphconfigs.set(commitId, self._loadGraphConfig(commitId))
+
+    def _loadGraphConfig(self, commitId):
+        """Load the graph configuration of a commit.
+
+        The configuration is shared with all commits with the same config.ttl or *.graph blobs
+        and N-Triples files (cf. QuitGraphConfiguration.signature), it must not be modified.
+        """
+        graphconf = QuitGraphConfiguration(self.repository._repository, self.repository.trees)
+        blobs = graphconf.get_blobs_from_repository(commitId)
+
+        def load():
+            graphconf.initgraphconfig(commitId, blobs)
+            return graphconf
+
+        return self._graphconfigs.load(('signature', graphconf.signature(blobs)), load)
+
+
+_syncWorker = None
+
+
+def _estimateLines(fileReference, size):
+    """Estimate the number of lines of a file of size bytes by the lines of a version of it.
+
+    The average length of the lines is taken from a sample of the lines of the given version.
+    """
+    lines = fileReference.graph.store.lines
+    if not lines:
+        return size // 64
+    step = max(1, len(lines) // 32)
+    sample = [len(lines[i]) + 1 for i in range(0, len(lines), step)]
+    return size * len(sample) // sum(sample)
+
+
+def _initSyncWorker(path, blobcache, blobcachesize):
+    """Initialize a sync worker process with its own repository and caches."""
+    global _syncWorker
+    _syncWorker = Quit(None, Repository(path), None)
+    if blobcache:
+        _syncWorker._blobcache = BlobCache(blobcache, blobcachesize)
+
+
+def _syncWorkerDelta(commitid):
+    """Compute the delta of a commit in a sync worker, the triples are encoded with quit.codec."""
+    commit = _syncWorker.repository.revision(commitid)
+    delta = _syncWorker.delta(commit)
+    return commitid, [
+        (iri, [(op, codec.dumps(triples, 3)) for op, triples in changesets])
+        for iri, changesets in delta.items()
+    ]
+
+
+def _decodeDelta(delta):
+    return OrderedDict(
+        (iri, [(op, codec.rows(data)) for op, data in changesets]) for iri, changesets in delta
+    )
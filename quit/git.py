@@ -1,10 +1,14 @@
+import functools
 import os
 import pygit2
 import re
 import logging
+import threading
+import time
 
 from pygit2._pygit2 import GitError, Oid
 from os.path import expanduser, join
+from quit.cache import Cache
 from quit.exceptions import RepositoryNotFound, RevisionNotFound, NodeNotFound, RemoteNotFound
 from quit.exceptions import QuitGitRefNotFound, QuitGitRepoError, QuitGitPushError
 from quit.namespace import QUIT
@@ -18,6 +22,179 @@ logger = logging.getLogger('quit.git')
 role_author = QUIT['author']
 role_committer = QUIT['committer']
 
+# the maximal number of (path, oid, mode) records memoized by Trees, about 20 MiB
+TREE_RECORDS = 100000
+
+
+class References(object):
+    """An in-process table of the references of a repository.
+
+    The table maps the name of each reference to the oid it resolves to. It is rebuilt after quit
+    changed a reference (cf. invalidate) and if the modification time of HEAD, packed-refs or one
+    of the directories of loose references changed, since git replaces loose references by
+    renaming a lock file. Thus reading a reference only has to stat a few files.
+
+    As the resolution of modification times is coarse, a table built shortly after a change is
+    not trusted and rebuilt on the next access.
+    """
+
+    RACY_NS = 1000000000
+
+    KINDS = (('refs/heads/', 'branch'), ('refs/tags/', 'tag'), ('refs/remotes/', 'remote'))
+
+    def __init__(self, repository):
+        self._repository = repository
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._directories = []
+        self._table = {}
+        self._head = (None, None)
+
+    @staticmethod
+    def kind(name):
+        """Get the kind of a reference name, i.e. 'branch', 'tag', 'remote' or 'other'."""
+        for prefix, kind in References.KINDS:
+            if name.startswith(prefix):
+                return kind
+        return 'other'
+
+    def invalidate(self):
+        """Force a rebuild of the table on the next access."""
+        with self._lock:
+            self._stamp = None
+
+    def _mtime(self, path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _currentStamp(self):
+        path = self._repository.path
+        return tuple(
+            self._mtime(x) for x in
+            [join(path, 'HEAD'), join(path, 'packed-refs')] + self._directories
+        )
+
+    def _build(self):
+        path = self._repository.path
+        self._directories = [
+            directory for directory, _, _ in os.walk(join(path, 'refs'))
+        ]
+        start = time.time_ns()
+        stamp = self._currentStamp()
+
+        table = {}
+        for reference in self._repository.references.iterator():
+            try:
+                table[reference.name] = reference.resolve().target
+            except (KeyError, GitError):
+                pass
+
+        head = (None, None)
+        try:
+            reference = self._repository.lookup_reference('HEAD')
+            name = reference.target if reference.type == pygit2.GIT_REF_SYMBOLIC else 'HEAD'
+            head = (name, reference.resolve().target)
+        except (KeyError, GitError):
+            pass
+
+        self._table = table
+        self._head = head
+        self._stamp = stamp
+        if any(x is not None and x >= start - self.RACY_NS for x in stamp):
+            self._stamp = None
+        logger.debug("Reference table built with {} references.".format(len(table)))
+
+    def _current(self):
+        with self._lock:
+            if self._stamp is None or self._stamp != self._currentStamp():
+                self._build()
+            return self._table, self._head
+
+    def get(self, name):
+        """Get the oid a reference (or HEAD) resolves to or None if it does not exist."""
+        table, head = self._current()
+        if name == 'HEAD':
+            return head[1]
+        return table.get(name)
+
+    def find(self, name):
+        """Find the oid of a short reference name in the order git uses to disambiguate it.
+
+        Returns:
+            The Oid or None if no reference matches.
+        """
+        table, head = self._current()
+        if name == 'HEAD':
+            return head[1]
+        for template in ['%s', 'refs/%s', 'refs/tags/%s', 'refs/heads/%s', 'refs/remotes/%s',
+                         'refs/remotes/%s/HEAD']:
+            oid = table.get(template % name)
+            if oid is not None:
+                return oid
+        return None
+
+    @property
+    def head(self):
+        """Get the name of the reference HEAD points to, 'HEAD' if it is detached or None if it
+        is unborn."""
+        table, head = self._current()
+        return head[0] if head[1] is not None else None
+
+    def names(self, *kinds):
+        """Get a sorted list of the reference names of the given kinds or all references."""
+        table, head = self._current()
+        return sorted(x for x in table if not kinds or self.kind(x) in kinds)
+
+
+class Trees(object):
+    """Enumerate the blobs of git trees as (path, oid, mode) records.
+
+    The records of each tree are memoized by the oid of the tree, thus subtrees which did not
+    change between commits are not walked again. The memoized listings are bounded by the total
+    number of their records, since a listing holds the records of all blobs below its tree.
+
+    Args:
+        repository: the pygit2 repository
+        budget: the maximal number of records of all memoized listings
+    """
+
+    def __init__(self, repository, budget=TREE_RECORDS):
+        self._repository = repository
+        self._entries = Cache(capacity=None, budget=budget, sizeof=len)
+
+    def entries(self, tree):
+        """Get a tuple of (path, oid, mode) records of all blobs of a pygit2 tree and its subtrees.
+
+        Submodules are skipped, paths are relative to the tree and separated by "/".
+        """
+        return self._entries.load(tree.id, lambda: self._walk(tree))
+
+    def _walk(self, tree):
+        records = []
+        for entry in tree:
+            if entry.type == pygit2.GIT_OBJ_BLOB:
+                records.append((entry.name, entry.id, entry.filemode))
+            elif entry.type == pygit2.GIT_OBJ_TREE:
+                prefix = entry.name + '/'
+                records.extend(
+                    (prefix + path, oid, mode)
+                    for path, oid, mode in self.entries(self._repository[entry.id])
+                )
+        return tuple(records)
+
+
+def _changesReferences(method):
+    """Invalidate the reference table after a Repository method which changes references."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.refs.invalidate()
+    return wrapper
+
 
 class Repository(object):
     """The Quit class for wrapping a git repository.
@@ -43,6 +220,8 @@ class Repository(object):
         self.path = path
         self.callback = callback if callback else QuitRemoteCallbacks()
         self._repository = self.init_repository(path, origin, create)
+        self.refs = References(self._repository)
+        self.trees = Trees(self._repository)
         self.log_repository(self._repository)
         if garbageCollection:
             self.init_garbageCollection(path)
@@ -127,15 +306,10 @@ class Repository(object):
         Return:
         Oid
         """
-        try:
-            for template in ['refs/heads/%s', 'refs/tags/%s', '%s']:
-                try:
-                    reference = self._repository.lookup_reference(template % name)
-                    return reference.resolve().target
-                except KeyError:
-                    pass
-        except ValueError:
-            pass
+        for template in ['refs/heads/%s', 'refs/tags/%s', '%s']:
+            oid = self.refs.get(template % name)
+            if oid is not None:
+                return oid
         try:
             revison = self._repository.get(name)
             if revison:
@@ -145,8 +319,12 @@ class Repository(object):
         raise RevisionNotFound(name)
 
     def revision(self, id='HEAD'):
+        oid = self.refs.find(id) if not re.match('^[0-9a-f]{40}$', id) else None
         try:
-            commit = self._repository.revparse_single(id)
+            if oid is not None:
+                commit = self._repository[oid]
+            else:
+                commit = self._repository.revparse_single(id)
         except KeyError:
             raise RevisionNotFound(id)
 
@@ -178,26 +356,25 @@ class Repository(object):
 
     @property
     def current_head(self):
-        if not self._repository.head_is_unborn:
-            return re.sub("refs/heads/", "", self._repository.head.name)
+        head = self.refs.head
+        if head is not None:
+            return re.sub("refs/heads/", "", head)
         return None
 
     @property
     def branches(self):
         """Get a list of all branch names."""
-        return [x[len('refs/heads/'):] for x in self._repository.listall_references()
-                if x.startswith('refs/heads/')]
+        return [x[len('refs/heads/'):] for x in self.refs.names('branch')]
 
     @property
     def tags(self):
         """Get a list of all tag names."""
-        return [x[len('refs/tags/'):] for x in self._repository.listall_references()
-                if x.startswith('refs/tags/')]
+        return [x[len('refs/tags/'):] for x in self.refs.names('tag')]
 
     @property
     def references(self):
         """Get a list of all references."""
-        return self._repository.listall_references()
+        return self.refs.names()
 
     @property
     def remotes(self):
@@ -207,10 +384,7 @@ class Repository(object):
     @property
     def tags_or_branches(self):
         """Get a list of all tag and head references."""
-        return [
-            x for x in self._repository.listall_references()
-            if x.startswith('refs/tags/') or x.startswith('refs/heads/')
-        ]
+        return self.refs.names('tag', 'branch')
 
     def index(self, revision=None):
         index = Index(self)
@@ -235,6 +409,7 @@ class Repository(object):
             return (remote_name, remote_branch, remote_ref)
         return (None, None, None)
 
+    @_changesReferences
     def fetch(self, remote_name=None, remote_branch=None):
         """Fetch changes from a remote.
 
@@ -353,6 +528,7 @@ class Repository(object):
                 return
         raise RemoteNotFound("There is no remote \"{}\".".format(remote_name))
 
+    @_changesReferences
     def merge(self, target=None, branch=None, method=None):
         """Merge a branch into another (target) branch.
 
@@ -425,6 +601,7 @@ class Repository(object):
 
         raise AssertionError('Unknown merge analysis result')
 
+    @_changesReferences
     def branch(self, oldbranch=None, newbranch=None):
         """Create a new branch from an existing branch."""
         logger.debug("Branching: {} from {} -> {}".format(newbranch, oldbranch,
@@ -447,6 +624,19 @@ class Repository(object):
             logger.error(e)
             raise e
 
+    @_changesReferences
+    def delete_branch(self, name):
+        """Delete a branch.
+
+        Returns:
+            True if the branch was deleted, False if it does not exist.
+        """
+        branch = self._repository.branches.get(re.sub("^refs/heads/", "", name))
+        if branch is None:
+            return False
+        branch.delete()
+        return True
+
     def revert(self, reference='', target='', branch=''):
         """Revert a commit."""
         raise Exception('Not yet supported')
@@ -540,6 +730,37 @@ class Revision(object):
     def node(self, path=None):
         return Node(self._repository, self._commit, path)
 
+    def files(self):
+        """Get a tuple of (path, oid, mode) records of all files of the commit (cf. Trees)."""
+        return self._repository.trees.entries(self._commit.tree)
+
+    def changes(self, deleted=False):
+        """Get the files which were added or modified compared to the first parent.
+
+        The changes are computed with a tree to tree diff, the content of the blobs is not read.
+
+        Args:
+            deleted: whether deleted files are included, with None as oid
+        Returns:
+            A list of tuples (path, oid, parent oid) where parent oid is the oid of the file in the
+            first parent or None if the file did not exist there.
+        """
+        blobs = (pygit2.GIT_FILEMODE_BLOB, pygit2.GIT_FILEMODE_BLOB_EXECUTABLE)
+
+        parents = self._commit.parents
+        if not parents:
+            return [(path, oid, None) for path, oid, mode in self.files() if mode in blobs]
+
+        diff = parents[0].tree.diff_to_tree(self._commit.tree)
+        changes = []
+        for delta in diff.deltas:
+            parent = delta.old_file.id if delta.old_file.mode in blobs else None
+            if delta.new_file.mode in blobs:
+                changes.append((delta.new_file.path, delta.new_file.id, parent))
+            elif deleted and parent is not None:
+                changes.append((delta.old_file.path, None, parent))
+        return changes
+
 
 class Node(object):
 
@@ -705,9 +926,12 @@ class Index(object):
                             "{}, {}".format(branch, e))
                 pass
 
-        return self.repository._repository.create_commit(
-            ref, author, commiter, message, oid, parents
-        )
+        try:
+            return self.repository._repository.create_commit(
+                ref, author, commiter, message, oid, parents
+            )
+        finally:
+            self.repository.refs.invalidate()
 
 
 class IndexHeap(object):
@@ -1,9 +1,354 @@
 import functools
 import logging
+import threading
+from collections import OrderedDict
 from itertools import chain
-from rdflib import Graph, ConjunctiveGraph, URIRef
-from rdflib.graph import ModificationException
+from rdflib import BNode, Graph, ConjunctiveGraph, URIRef
+from rdflib.term import Node
+from rdflib.graph import ModificationException, ReadOnlyGraphAggregate
 from rdflib.graph import Path
+from rdflib.plugins.stores.memory import Memory
+from rdflib.store import Store
+from sortedcontainers import SortedList
+from quit import ntriples
+from quit.statistics import GraphStatistics
+from quit.terms import TERMS
+
+
+def _indexAdd(index, term, triple):
+    # a term with a single triple is mapped to the triple itself, saving a set per term
+    entry = index.get(term)
+    if entry is None:
+        index[term] = triple
+    elif isinstance(entry, set):
+        entry.add(triple)
+    else:
+        index[term] = {entry, triple}
+
+
+def _indexRemove(index, term, triple):
+    entry = index[term]
+    if isinstance(entry, set):
+        entry.discard(triple)
+        if len(entry) == 1:
+            index[term] = next(iter(entry))
+    else:
+        del index[term]
+
+
+def _indexGet(index, term):
+    entry = index.get(term, ())
+    return entry if isinstance(entry, set) or not entry else (entry,)
+
+
+def _mayContain(graph, triple_pattern):
+    """Check the presence filter of a graph, graphs without filter may contain any triple."""
+    mayContain = getattr(graph.store, 'mayContain', None)
+    return mayContain is None or mayContain(triple_pattern)
+
+
+class NTriplesStore(Store):
+    """A store for a single graph, which keeps each triple together with its N-Triples line.
+
+    The lines are kept sorted, thus the canonical N-Triples serialization of the graph is available
+    at any time without serializing or sorting all triples again. Triple patterns are answered with
+    an index per position, which is built when a pattern binds this position the first time. The
+    terms are interned in the process-wide term dictionary, which also
+    provides their N-Triples forms.
+
+    The labels of blank nodes are taken from the loaded lines and used for the lines of added
+    triples, thus the lines of a file keep their labels when it is changed.
+
+    A dataset of many graphs asks mayContain before sending a pattern to the graph. It is answered
+    by the set of terms of each position, which is much smaller than an index. The statistics used
+    to plan the evaluation of queries are collected when they are needed the first time after the
+    graph was loaded or changed.
+    """
+
+    context_aware = False
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = False
+
+    def __init__(self, configuration=None, identifier=None):
+        super().__init__(configuration, identifier)
+        self._triples = {}
+        self._lines = SortedList()
+        self._indexes = [None, None, None]
+        self._terms = [None, None, None]
+        self._statistics = None
+        self._labels = {}
+        self._labelled = set()
+        self._namespaces = {}
+        self._prefixes = {}
+
+    @property
+    def lines(self):
+        """The sorted N-Triples lines of all triples, without line breaks."""
+        return self._lines
+
+    @property
+    def content(self):
+        """The sorted N-Triples serialization of all triples."""
+        return "\n".join(self._lines) + "\n"
+
+    def rows(self):
+        """Iterate over tuples (triple, line) of all triples, like the rows taken by load."""
+        return iter(list(self._triples.items()))
+
+    @property
+    def statistics(self):
+        """The GraphStatistics of all triples."""
+        statistics = self._statistics
+        if statistics is None:
+            statistics = self._statistics = GraphStatistics(self._triples)
+        return statistics
+
+    def add(self, triple, context, quoted=False):
+        if triple in self._triples:
+            return
+        triple = TERMS.triple(triple)
+        line = self._line(triple)
+        self._triples[triple] = line
+        self._lines.add(line)
+        self._statistics = None
+        for index, terms, term in zip(self._indexes, self._terms, triple):
+            if index is not None:
+                _indexAdd(index, term, triple)
+            if terms is not None:
+                terms.add(term)
+        super().add(triple, context, quoted)
+
+    def addN(self, quads):
+        for s, p, o, c in quads:
+            self.add((s, p, o), c)
+
+    def copy(self):
+        """Get a new store with the same triples, its indexes are built again on demand."""
+        store = NTriplesStore()
+        store._triples = dict(self._triples)
+        store._lines.update(self._lines)
+        store._statistics = self._statistics
+        store._labels = dict(self._labels)
+        store._labelled = set(self._labelled)
+        store._namespaces = dict(self._namespaces)
+        store._prefixes = dict(self._prefixes)
+        return store
+
+    def load(self, rows):
+        """Add triples of interned terms together with their lines, e.g. from quit.ntriples.parse.
+
+        The lines are sorted at once and no events are dispatched.
+
+        Args:
+            rows: an iterable of tuples (triple, line)
+        """
+        triples = self._triples
+        lines = []
+        for triple, line in rows:
+            size = len(triples)
+            triples.setdefault(triple, line)
+            if len(triples) == size:
+                continue
+            lines.append(line)
+            if '_:' in line:
+                for bnode, label in ntriples.labels(triple, line):
+                    self._label(bnode, label)
+            for index, terms, term in zip(self._indexes, self._terms, triple):
+                if index is not None:
+                    _indexAdd(index, term, triple)
+                if terms is not None:
+                    terms.add(term)
+        self._lines.update(lines)
+        if lines:
+            self._statistics = None
+
+    def _label(self, bnode, label):
+        if bnode not in self._labels and label not in self._labelled:
+            self._labels[bnode] = label
+            self._labelled.add(label)
+
+    def _line(self, triple):
+        """Get the line of a triple, blank nodes are written with their labels in this graph."""
+        if not any(isinstance(term, BNode) for term in triple):
+            return TERMS.line(triple)
+        for term in triple:
+            if isinstance(term, BNode) and term not in self._labels:
+                # a new blank node must not get the label of another blank node of the graph
+                label = TERMS.ntriples(term)
+                suffix = 0
+                while label in self._labelled:
+                    suffix += 1
+                    label = '{}x{}'.format(TERMS.ntriples(term), suffix)
+                self._label(term, label)
+        return ntriples.serialize_triple(triple, self._labels)
+
+    def remove(self, triple_pattern, context=None):
+        # the term sets keep the terms of removed triples, which only makes them less selective
+        for triple, contexts in list(self.triples(triple_pattern)):
+            self._lines.remove(self._triples.pop(triple))
+            self._statistics = None
+            for index, term in zip(self._indexes, triple):
+                if index is not None:
+                    _indexRemove(index, term, triple)
+        super().remove(triple_pattern, context)
+
+    def _index(self, position):
+        index = self._indexes[position]
+        if index is None:
+            index = {}
+            for triple in self._triples:
+                _indexAdd(index, triple[position], triple)
+            self._indexes[position] = index
+            self._terms[position] = None
+        return index
+
+    def mayContain(self, triple_pattern):
+        """Check whether the store may contain triples matching a pattern.
+
+        Returns:
+            False if no triple matches the pattern, True if triples may match the pattern
+        """
+        for position, term in enumerate(triple_pattern):
+            if term is None or isinstance(term, Path):
+                continue
+            terms = self._indexes[position]
+            if terms is None:
+                terms = self._terms[position]
+            if terms is None:
+                terms = self._terms[position] = set(triple[position] for triple in self._triples)
+            if term not in terms:
+                return False
+        return True
+
+    def triples(self, triple_pattern, context=None):
+        s, p, o = triple_pattern
+        if s is not None and p is not None and o is not None:
+            if triple_pattern in self._triples:
+                yield triple_pattern, iter(())
+            return
+
+        candidates = [
+            _indexGet(self._index(position), term) for position, term in enumerate(triple_pattern)
+            if term is not None
+        ]
+        if not candidates:
+            for triple in list(self._triples):
+                yield triple, iter(())
+            return
+        for triple in list(min(candidates, key=len)):
+            if (s is None or triple[0] == s) and (p is None or triple[1] == p) and \
+                    (o is None or triple[2] == o):
+                yield triple, iter(())
+
+    def contexts(self, triple=None):
+        return iter(())
+
+    def __len__(self, context=None):
+        return len(self._triples)
+
+    def bind(self, prefix, namespace):
+        self._prefixes[namespace] = prefix
+        self._namespaces[prefix] = namespace
+
+    def namespace(self, prefix):
+        return self._namespaces.get(prefix, None)
+
+    def prefix(self, namespace):
+        return self._prefixes.get(namespace, None)
+
+    def namespaces(self):
+        return iter(list(self._namespaces.items()))
+
+
+class VirtualContextStore(Memory):
+    """A Memory store with additional read-only contexts whose triples are resolved on access.
+
+    A virtual context is registered with a key. Its triples are not kept in the store, but are
+    taken from the graph returned by resolver(key) whenever the context is read. Patterns without
+    context, e.g. of the union of all graphs, also match the triples of the virtual contexts whose
+    presence filter (see NTriplesStore.mayContain) does not rule out a match.
+    """
+
+    def __init__(self, configuration=None, identifier=None, resolver=None):
+        super().__init__(configuration, identifier)
+        self.resolver = resolver
+        self._virtual = {}
+
+    def addVirtualContext(self, identifier, key):
+        self._virtual[identifier] = key
+
+    def removeVirtualContext(self, identifier):
+        self._virtual.pop(identifier, None)
+
+    def virtualContexts(self):
+        """Get a list of (identifier, key) tuples of all virtual contexts."""
+        return list(self._virtual.items())
+
+    def _resolve(self, identifier):
+        return self.resolver(self._virtual[identifier])
+
+    def add(self, triple, context, quoted=False):
+        if getattr(context, 'identifier', context) in self._virtual:
+            raise ModificationException()
+        super().add(triple, context, quoted)
+
+    def remove(self, triple_pattern, context=None):
+        identifier = getattr(context, 'identifier', context)
+        if identifier in self._virtual:
+            if triple_pattern != (None, None, None):
+                raise ModificationException()
+            del self._virtual[identifier]
+            return
+        super().remove(triple_pattern, context)
+        if context is None and triple_pattern == (None, None, None):
+            self._virtual.clear()
+
+    def triples(self, triple_pattern, context=None, virtual=True):
+        """A generator over all the triples matching.
+
+        If no context is given the virtual contexts are included unless virtual is False.
+        """
+        identifier = getattr(context, 'identifier', context)
+        if identifier in self._virtual:
+            for triple in self._resolve(identifier).triples(triple_pattern):
+                yield triple, iter([context])
+            return
+
+        if context is not None or not virtual or not self._virtual:
+            yield from super().triples(triple_pattern, context)
+            return
+
+        found = OrderedDict()
+        for triple, contexts in super().triples(triple_pattern, None):
+            found[triple] = list(contexts)
+        for identifier in list(self._virtual):
+            resolved = self._resolve(identifier)
+            if not _mayContain(resolved, triple_pattern):
+                continue
+            graph = Graph(store=self, identifier=identifier)
+            for triple in resolved.triples(triple_pattern):
+                found.setdefault(triple, []).append(graph)
+        for triple, contexts in found.items():
+            yield triple, iter(contexts)
+
+    def contexts(self, triple=None):
+        yield from super().contexts(triple)
+        for identifier in list(self._virtual):
+            if triple is None or triple == (None, None, None):
+                yield Graph(store=self, identifier=identifier)
+                continue
+            resolved = self._resolve(identifier)
+            if _mayContain(resolved, triple) and triple in resolved:
+                yield Graph(store=self, identifier=identifier)
+
+    def __len__(self, context=None):
+        identifier = getattr(context, 'identifier', context)
+        if identifier in self._virtual:
+            return len(self._resolve(identifier))
+        if context is None and self._virtual:
+            return sum(1 for _ in self.triples((None, None, None)))
+        return super().__len__(context)
 
 
 class RewriteGraph(Graph):
@@ -42,73 +387,188 @@ class RewriteGraph(Graph):
         return len(self.__graph)
 
 
-def _copyIfNotExists(store, self, other):
-    if other and self not in store.contexts(None):
-        store.addN((s, p, o, self) for s, p, o in other.triples((None, None, None)))
+class OverlayStore(Store):
+    """A store for a single graph, which records changes on top of a read-only base graph.
 
+    Added triples which are not in the base graph are kept in a set of additions, removed triples
+    of the base graph in a set of removals. The base graph is never modified, thus the cost of a
+    change only depends on its size and not on the size of the base graph.
 
-class CopyOnEditGraph(Graph):
-    def __init__(self, template, store='default', identifier=None, namespace_manager=None):
-        super().__init__(store, identifier, namespace_manager)
+    Args:
+        base: the Graph the changes are recorded on
+    """
 
-        assert not template or isinstance(
-            template, Graph), "template must be graph"
-        assert not template or template.identifier == identifier, "identifier must match"
+    context_aware = False
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = False
 
-        self._template = template
-        self._store = store
+    def __init__(self, base, configuration=None, identifier=None):
+        super().__init__(configuration, identifier)
+        self.base = base
+        self.additions = set()
+        self.removals = set()
+        self._namespaces = {}
+        self._prefixes = {}
 
-    def add(self, triple_or_quad):
-        _copyIfNotExists(self._store, self, self._template)
-        super().add(triple_or_quad)
+    def add(self, triple, context, quoted=False):
+        if triple in self.removals:
+            self.removals.discard(triple)
+        elif triple not in self.additions and triple not in self.base:
+            self.additions.add(triple)
+        super().add(triple, context, quoted)
 
-    def addN(self, triple_or_quad):
-        _copyIfNotExists(self._store, self, self._template)
-        super().addN(triple_or_quad)
+    def addN(self, quads):
+        for s, p, o, c in quads:
+            self.add((s, p, o), c)
 
-    def remove(self, triple_or_quad):
-        _copyIfNotExists(self._store, self, self._template)
-        super().remove(triple_or_quad)
+    def remove(self, triple_pattern, context=None):
+        for triple, contexts in list(self.triples(triple_pattern)):
+            if triple in self.additions:
+                self.additions.discard(triple)
+            else:
+                self.removals.add(triple)
+        super().remove(triple_pattern, context)
+
+    def triples(self, triple_pattern, context=None):
+        s, p, o = triple_pattern
+        if s is not None and p is not None and o is not None:
+            if triple_pattern in self.additions or (
+                    triple_pattern not in self.removals and triple_pattern in self.base):
+                yield triple_pattern, iter(())
+            return
+
+        removals = self.removals
+        for triple in self.base.triples(triple_pattern):
+            if triple not in removals:
+                yield triple, iter(())
+        for triple in list(self.additions):
+            if (s is None or triple[0] == s) and (p is None or triple[1] == p) and \
+                    (o is None or triple[2] == o):
+                yield triple, iter(())
+
+    def mayContain(self, triple_pattern):
+        return bool(self.additions) or _mayContain(self.base, triple_pattern)
 
-    def triples(self, triple):
-        if self not in self._store.contexts(None):
-            return self._template.triples(triple) if self._template else (_ for _ in ())
-        else:
-            return super().triples(triple)
+    @property
+    def statistics(self):
+        """The statistics of the base graph as estimate for the changed graph or None."""
+        return getattr(self.base.store, 'statistics', None)
+
+    def contexts(self, triple=None):
+        return iter(())
+
+    def __len__(self, context=None):
+        return len(self.base) - len(self.removals) + len(self.additions)
+
+    def bind(self, prefix, namespace):
+        self._prefixes[namespace] = prefix
+        self._namespaces[prefix] = namespace
+
+    def namespace(self, prefix):
+        return self._namespaces.get(prefix, None) or self.base.store.namespace(prefix)
+
+    def prefix(self, namespace):
+        return self._prefixes.get(namespace, None) or self.base.store.prefix(namespace)
+
+    def namespaces(self):
+        namespaces = dict(self.base.store.namespaces())
+        namespaces.update(self._namespaces)
+        return iter(list(namespaces.items()))
+
+
+class OverlayGraph(Graph):
+    """A graph whose changes are kept apart from the read-only graph it is based on.
+
+    Args:
+        base: the Graph to read the unchanged triples from, it has to stay unmodified as long as
+            the overlay is used
+    """
+
+    def __init__(self, base):
+        super().__init__(store=OverlayStore(base), identifier=base.identifier)
 
     @property
-    def store(self):
-        if self not in self._store.contexts(None):
-            return self._template.store
-        else:
-            return super().store
+    def additions(self):
+        """The set of triples added to the base graph."""
+        return self.store.additions
 
-    def unwrap(self):
-        return Graph(store=self.store, identifier=self.identifier)
+    @property
+    def removals(self):
+        """The set of triples removed from the base graph."""
+        return self.store.removals
 
-    def __isub__(self, other):
-        """Subtract all triples in Graph other from Graph.
+    def changes(self):
+        """Get the changes to the base graph.
 
-        BNode IDs are not changed.
+        Returns:
+            A list of ('removals'|'additions', triples) tuples, which is empty without changes
         """
-        for triple in other:
-            self.remove(triple)
-        return self
-
-    def __len__(self):
-        if self not in self._store.contexts(None):
-            return self._template.__len__()
-        else:
-            return super().__len__()
+        changes = []
+        if self.removals:
+            changes.append(('removals', list(self.removals)))
+        if self.additions:
+            changes.append(('additions', list(self.additions)))
+        return changes
 
 
 class InMemoryAggregatedGraph(ConjunctiveGraph):
-    def __init__(self, store='default', identifier=None, graphs=[]):
+    """A dataset of graphs, which are kept in memory by their own stores.
+
+    Graphs can also be given by their identifier and a function to load them, they are loaded when
+    they are accessed by their identifier or when all graphs of the dataset are needed.
+
+    The graphs are indexed by their identifiers. Triple patterns without a graph are only sent to
+    the graphs whose presence filter (see NTriplesStore.mayContain) does not rule out a match.
+
+    Args:
+        store: the store of graphs which are added to the dataset later
+        identifier: the identifier of the dataset
+        graphs: a list of Graphs
+        loaders: an iterable of tuples (identifier, loader), where loader is a function without
+            arguments returning the Graph or None if the graph does not exist
+    """
+
+    def __init__(self, store='default', identifier=None, graphs=[], loaders=()):
         super().__init__(store=store, identifier=None)
 
         if not (isinstance(graphs, list) and all(isinstance(g, Graph) for g in graphs)):
             raise Exception("graphs argument must be a list of Graphs!!")
-        self._contexts = graphs
+        self._graphs = []
+        self._identifiers = {}
+        for graph in graphs:
+            if graph.identifier not in self._identifiers:
+                self._identifiers[graph.identifier] = graph
+                self._graphs.append(graph)
+        self._loaders = OrderedDict(loaders)
+        self._loading = threading.Lock()
+
+    @property
+    def _contexts(self):
+        # other threads remove loaders while the pending ones are loaded
+        with self._loading:
+            pending = list(self._loaders)
+        for identifier in pending:
+            self._load(identifier)
+        return self._graphs
+
+    def _load(self, identifier):
+        """Load a graph given by a loader and add it to the graphs of the dataset.
+
+        The loader runs without the lock, thus other graphs are loaded meanwhile. Concurrent loads
+        of the same graph may both run the loader, the first loaded graph is kept.
+        """
+        with self._loading:
+            loader = self._loaders.get(identifier, None)
+        if loader is None:
+            return
+        graph = loader()
+        with self._loading:
+            if graph is not None and graph.identifier not in self._identifiers:
+                self._identifiers[graph.identifier] = graph
+                # readers may iterate the current list
+                self._graphs = self._graphs + [graph]
+            self._loaders.pop(identifier, None)
 
     def __repr__(self):
         return "<{}: {}|{} graphs>".format(
@@ -125,23 +585,28 @@ class InMemoryAggregatedGraph(ConjunctiveGraph):
         else:
             return self.get_context(c.identifier)
 
-    def contexts(self, triple=None):
+    def _members(self):
+        """Get the list of all graphs, which must not be modified."""
+        graphs = self._contexts
 
-        def collect():
-            if triple is None or triple == (None, None, None):
-                contexts = (context for context in self._contexts)
-            else:
-                contexts = (context for context in self._contexts
-                            if triple in context)
+        # graphs added to the store of the dataset take precedence
+        added = list(self.store.contexts())
+        if not added:
+            return graphs
+        seen = set(graph.identifier for graph in added)
+        return added + [graph for graph in graphs if graph.identifier not in seen]
 
-            seen = set()
-            for element in chain(self.store.contexts(triple), contexts):
-                k = element.identifier
-                if k not in seen:
-                    seen.add(k)
-                    yield element
+    def _candidates(self, triple_pattern):
+        """Get the graphs which may contain triples matching a pattern."""
+        graphs = self._members()
+        if len(graphs) > 1 and triple_pattern != (None, None, None):
+            graphs = [graph for graph in graphs if _mayContain(graph, triple_pattern)]
+        return graphs
 
-        return list(collect())
+    def contexts(self, triple=None):
+        if triple is None or triple == (None, None, None):
+            return list(self._members())
+        return [graph for graph in self._candidates(triple) if triple in graph]
 
     graphs = contexts
 
@@ -153,29 +618,26 @@ class InMemoryAggregatedGraph(ConjunctiveGraph):
             for s, o in p.eval(self, s, o):
                 yield s, p, o
         else:
-            for graph in self.contexts():
-                if context is None or graph.identifier == context.identifier:
-                    for s, p, o in graph.triples((s, p, o)):
-                        yield s, p, o
+            graphs = [context] if context is not None else self._candidates((s, p, o))
+            for graph in graphs:
+                yield from graph.triples((s, p, o))
 
     def quads(self, triple_or_quad=None):
         s, p, o, c = self._spoc(triple_or_quad)
         context = self._graph(c)
 
-        for graph in self.graphs():
-            if context is None or graph.identifier == context.identifier:
-                for s1, p1, o1 in graph.triples((s, p, o)):
-                    yield (s1, p1, o1, graph)
+        graphs = [context] if context is not None else self._candidates((s, p, o))
+        for graph in graphs:
+            for s1, p1, o1 in graph.triples((s, p, o)):
+                yield (s1, p1, o1, graph)
 
     def __contains__(self, triple_or_quad):
         (_, _, _, context) = self._spoc(triple_or_quad)
         context = self._graph(context)
 
-        for graph in self.graphs():
-            if context is None or graph.identifier == context.identifier:
-                if triple_or_quad[:3] in graph:
-                    return True
-        return False
+        triple = tuple(triple_or_quad[:3])
+        graphs = [context] if context is not None else self._candidates(triple)
+        return any(triple in graph for graph in graphs)
 
     def __len__(self):
         return functools.reduce(lambda a, b: a + len(b), self.contexts(None), 0)
@@ -188,10 +650,10 @@ class InMemoryAggregatedGraph(ConjunctiveGraph):
         Returns:
             Graph if found, else None
         """
-        if isinstance(identifier, URIRef):
-            return next((x for x in self._contexts if x.identifier == identifier), None)
-        else:
-            return next((x for x in self._contexts if str(x.identifier) == identifier), None)
+        if isinstance(identifier, str) and not isinstance(identifier, Node):
+            identifier = URIRef(identifier)
+        self._load(identifier)
+        return self._identifiers.get(identifier, None)
 
     def get_context(self, identifier, quoted=False):
         """Return the requested context/Graph.
@@ -213,35 +675,81 @@ class InMemoryAggregatedGraph(ConjunctiveGraph):
 
 
 class InMemoryCopyOnEditAggregatedGraph(InMemoryAggregatedGraph):
+    """A dataset of overlays on graphs, thus it can be changed without modifying the graphs.
 
-    def add(self, triple_or_quad):
-        s, p, o, c = self._spoc(triple_or_quad, default=True)
+    Changes of existing graphs are recorded by OverlayGraphs, new graphs are added to the store of
+    the dataset. The arguments are the same as of InMemoryAggregatedGraph.
+    """
 
-        _copyIfNotExists(self.store, c, self._get_context(self.identifier))
+    def __init__(self, store='default', identifier=None, graphs=[], loaders=()):
+        super().__init__(
+            store=store, identifier=identifier, graphs=[OverlayGraph(g) for g in graphs],
+            loaders=[(key, functools.partial(_loadOverlay, loader)) for key, loader in loaders])
 
-        self.store.add((s, p, o), context=c, quoted=False)
+    def add(self, triple_or_quad):
+        s, p, o, c = self._spoc(triple_or_quad, default=True)
+        self.get_context(c).add((s, p, o))
 
     def addN(self, quads):
-        def do(g):
-            c = self._graph(g)
-
-            _copyIfNotExists(self.store, c, self._get_context(self.identifier))
-
-            return g
-
-        self.store.addN((s, p, o, do(c)) for s, p, o, c in quads)
+        for s, p, o, c in quads:
+            self.get_context(c).add((s, p, o))
 
     def remove(self, triple_or_quad):
         s, p, o, c = self._spoc(triple_or_quad)
+        for graph in ([self.get_context(c)] if c is not None else self.contexts()):
+            graph.remove((s, p, o))
 
-        _copyIfNotExists(self.store, c, self._get_context(self.identifier))
+    def remove_context(self, context):
+        self.remove((None, None, None, context))
 
-        self.store.remove((s, p, o), context=c)
+    def changes(self):
+        """Get the changes of all graphs of the dataset.
 
-    def get_context(self, identifier, quoted=False):
-        if isinstance(identifier, Graph):
-            identifier = identifier.identifier
-        return CopyOnEditGraph(
-            store=self.store, identifier=identifier, namespace_manager=self,
-            template=self._get_context(identifier)
-        )
+        Only the graphs which were loaded or added can have changes, thus the pending loaders are
+        not run.
+
+        Returns:
+            An OrderedDict of graph identifiers to lists of ('removals'|'additions', triples),
+            like the delta of an update
+        """
+        added = list(self.store.contexts())
+        seen = set(graph.identifier for graph in added)
+        changes = OrderedDict()
+        for graph in added + [graph for graph in self._graphs if graph.identifier not in seen]:
+            if isinstance(graph, OverlayGraph):
+                changeset = graph.changes()
+            else:
+                changeset = [('additions', list(graph))] if len(graph) else []
+            if changeset:
+                changes[graph.identifier] = changeset
+        return changes
+
+
+def _loadOverlay(loader):
+    graph = loader()
+    return OverlayGraph(graph) if graph is not None else None
+
+
+def graphStatistics(graph):
+    """Get the statistics of the graphs a graph or dataset consists of.
+
+    Args:
+        graph: a Graph, an InMemoryAggregatedGraph or a ReadOnlyGraphAggregate
+    Returns:
+        A list of GraphStatistics or None if the statistics of a graph are unknown
+    """
+    if isinstance(graph, InMemoryAggregatedGraph):
+        graphs = graph._members()
+    elif isinstance(graph, ReadOnlyGraphAggregate):
+        graphs = graph.graphs
+    else:
+        statistics = getattr(graph.store, 'statistics', None)
+        return [statistics] if statistics is not None else None
+
+    result = []
+    for member in graphs:
+        statistics = graphStatistics(member)
+        if statistics is None:
+            return None
+        result.extend(statistics)
+    return result
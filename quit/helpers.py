@@ -1,13 +1,15 @@
 #!/usr/bin/env python3
 import logging
 import os
+import re
+from collections import OrderedDict
 from pyparsing import ParseException
 from quit.exceptions import UnSupportedQuery, SparqlProtocolError, NonAbsoluteBaseError
 from rdflib.term import URIRef
 from rdflib.plugins.sparql.parserutils import CompValue, plist
 from rdflib.plugins.sparql.parser import parseQuery, parseUpdate
+from rdflib.plugins.sparql.sparql import Query
 from quit.tools.algebra import translateQuery, translateUpdate
-from rdflib.plugins.serializers.nt import _nt_row as _nt
 from rdflib.plugins.sparql import parser, algebra
 from rdflib.plugins import sparql
 from uritools import urisplit
@@ -15,6 +17,17 @@ from werkzeug.http import parse_options_header
 
 logger = logging.getLogger('quit.helpers')
 
+# strings, IRIs and escaped characters are kept, comments and whitespace are collapsed
+_QUERY_KEPT = '|'.join([
+    r'"""(?:[^"\\]|\\.|"(?!""))*"""',
+    r"'''(?:[^'\\]|\\.|'(?!''))*'''",
+    r'"(?:[^"\\\n]|\\.)*"',
+    r"'(?:[^'\\\n]|\\.)*'",
+    r'<[^<>"{}|^`\\\s]*>',
+    r'\\.'
+])
+_QUERY_TOKENS = re.compile('(' + _QUERY_KEPT + r')|(?:#[^\n]*|\s+)+')
+
 
 class QueryAnalyzer:
     """A class that provides methods for received sparql query strings.
@@ -111,15 +124,10 @@ def applyChangeset(f, changeset, identifier):
     """Update the FileReference (graph uri) of a file with help of the changeset."""
     for (op, triples) in changeset:
         if op == 'additions':
-            for triple in triples:
-                # the internal _nt serializer appends '\n'
-                line = _nt(triple).rstrip()
-                f.add(line)
+            f.extend(triples)
         elif op == 'removals':
             for triple in triples:
-                # the internal _nt serializer appends '\n'
-                line = _nt(triple).rstrip()
-                f.remove(line)
+                f.remove(triple)
 
 
 def isAbsoluteUri(uri):
@@ -206,44 +214,187 @@ def configure_update_dataset(parsed_update, default_graphs, named_graphs):
     return parsed_update
 
 
-def parse_query_type(query, base=None, default_graph=[], named_graph=[]):
-    """Parse a query and add default and named graph uri if possible."""
-    try:
-        parsed_query = parseQuery(query)
-        parsed_query = configure_query_dataset(parsed_query, default_graph, named_graph)
-        translated_query = translateQuery(parsed_query, base=base)
-    except ParseException:
-        raise UnSupportedQuery()
-    except SparqlProtocolError as e:
-        raise e
+def normalize_query(query):
+    """Normalize the text of a query, so that equal queries are equal strings.
 
-    if base is not None and not isAbsoluteUri(base):
-        raise NonAbsoluteBaseError()
+    Comments and whitespace outside of strings and IRIs are replaced by a single space.
+    """
+    return _QUERY_TOKENS.sub(lambda match: match.group(1) or ' ', query).strip()
 
-    if not is_valid_query_base(parsed_query):
-        raise NonAbsoluteBaseError()
 
-    return translated_query.algebra.name, translated_query
+def copy_algebra(value):
+    """Copy a translated query or update algebra, but share its terms.
 
+    The evaluation temporarily stores its context in the expressions of the algebra, thus each
+    evaluation needs its own copy of a cached algebra.
+    """
+    if isinstance(value, CompValue):
+        copied = value.__class__.__new__(value.__class__)
+        copied.__dict__.update(value.__dict__)
+        for k, v in OrderedDict.items(value):
+            OrderedDict.__setitem__(copied, k, copy_algebra(v))
+        return copied
+    if type(value) in (list, plist, tuple, set):
+        return type(value)(copy_algebra(v) for v in value)
+    if type(value) is dict:
+        return dict((k, copy_algebra(v)) for k, v in value.items())
+    return value
+
+
+def algebra_key(value):
+    """Get a hashable key of a translated algebra, which is equal for equal algebras."""
+    if isinstance(value, CompValue):
+        return value.name, tuple((k, algebra_key(v)) for k, v in OrderedDict.items(value))
+    if isinstance(value, (list, tuple)):
+        return tuple(algebra_key(v) for v in value)
+    if isinstance(value, set):
+        return frozenset(algebra_key(v) for v in value)
+    if isinstance(value, dict):
+        return tuple((k, algebra_key(v)) for k, v in value.items())
+    return value
+
+
+def _cacheKey(type, query, base, default_graph, named_graph):
+    return (type, normalize_query(query), base, tuple(default_graph or ()),
+            tuple(named_graph or ()))
+
+
+def parse_query_type(query, base=None, default_graph=[], named_graph=[], cache=None):
+    """Parse a query and add default and named graph uri if possible.
 
-def parse_update_type(query, base=None, default_graph=[], named_graph=[]):
-    """Parse an update and add default and named graph uri if possible."""
-    try:
-        parsed_update = parseUpdate(query)
-        parsed_update = configure_update_dataset(parsed_update, default_graph, named_graph)
-        translated_update = translateUpdate(parsed_update, base=base)
-    except ParseException:
-        raise UnSupportedQuery()
-    except SparqlProtocolError as e:
-        raise e
+    Args:
+        query: the query string
+        base: the base IRI of the query
+        default_graph: a list of uri strings for default graphs
+        named_graph: a list of uri strings for named graphs
+        cache: a Cache of translated queries, repeated queries are copied from it instead of
+            parsed again
+    Returns:
+        A tuple (name of the query form, the translated Query)
+    """
+    def translate():
+        try:
+            parsed_query = parseQuery(query)
+            parsed_query = configure_query_dataset(parsed_query, default_graph, named_graph)
+            translated_query = translateQuery(parsed_query, base=base)
+        except ParseException:
+            raise UnSupportedQuery()
+        except SparqlProtocolError as e:
+            raise e
+
+        if base is not None and not isAbsoluteUri(base):
+            raise NonAbsoluteBaseError()
+
+        if not is_valid_query_base(parsed_query):
+            raise NonAbsoluteBaseError()
+
+        return translated_query.algebra.name, translated_query
+
+    if cache is None:
+        return translate()
+    key = _cacheKey('query', query, base, default_graph, named_graph)
+    queryType, translated_query = cache.load(key, translate)
+    return queryType, Query(translated_query.prologue, copy_algebra(translated_query.algebra))
+
+
+def parse_update_type(query, base=None, default_graph=[], named_graph=[], cache=None):
+    """Parse an update and add default and named graph uri if possible.
+
+    Args:
+        query: the update string
+        base: the base IRI of the update
+        default_graph: a list of uri strings for using-graph-uri
+        named_graph: a list of uri strings for using-named-graph-uri
+        cache: a Cache of translated updates, repeated updates are copied from it instead of
+            parsed again
+    Returns:
+        A tuple (name of the first operation, list of the translated operations)
+    """
+    def translate():
+        try:
+            parsed_update = parseUpdate(query)
+            parsed_update = configure_update_dataset(parsed_update, default_graph, named_graph)
+            translated_update = translateUpdate(parsed_update, base=base)
+        except ParseException:
+            raise UnSupportedQuery()
+        except SparqlProtocolError as e:
+            raise e
+
+        if base is not None and not isAbsoluteUri(base):
+            raise NonAbsoluteBaseError()
+
+        if not is_valid_update_base(parsed_update):
+            raise NonAbsoluteBaseError()
+
+        return parsed_update.request[0].name, translated_update
+
+    if cache is None:
+        return translate()
+    key = _cacheKey('update', query, base, default_graph, named_graph)
+    updateType, translated_update = cache.load(key, translate)
+    return updateType, copy_algebra(translated_update)
+
+
+# algebra nodes whose results differ between evaluations of the same query on the same data
+_NONDETERMINISTIC = frozenset([
+    'Builtin_NOW', 'Builtin_RAND', 'Builtin_UUID', 'Builtin_STRUUID', 'Builtin_BNODE',
+    'ServiceGraphPattern'
+])
+
+
+# nodes of GRAPH resp. of triple patterns, the patterns of EXISTS are only translated on evaluation
+_GRAPHS = {'Graph': 'p', 'GraphGraphPattern': 'graph'}
+_PATTERNS = frozenset(['BGP', 'TriplesBlock'])
 
-    if base is not None and not isAbsoluteUri(base):
-        raise NonAbsoluteBaseError()
 
-    if not is_valid_update_base(parsed_update):
-        raise NonAbsoluteBaseError()
+def _algebraNodes(value, named=False):
+    """Iterate the nodes of an algebra as tuples (node, named), named is True within GRAPH."""
+    if isinstance(value, CompValue):
+        yield value, named
+        for k, v in OrderedDict.items(value):
+            yield from _algebraNodes(v, named or _GRAPHS.get(value.name) == k)
+    elif isinstance(value, (list, tuple, set)):
+        for v in value:
+            yield from _algebraNodes(v, named)
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from _algebraNodes(v, named)
 
-    return parsed_update.request[0].name, translated_update
+
+def is_deterministic_query(query):
+    """Check if a translated query always has the same result on the same data.
+
+    Queries using NOW(), RAND(), UUID(), STRUUID(), BNODE() or SERVICE are not deterministic.
+    """
+    return not any(node.name in _NONDETERMINISTIC for node, _ in _algebraNodes(query.algebra))
+
+
+def query_graphs(query, union=False):
+    """Find the graphs a translated query reads.
+
+    Args:
+        query: the translated Query
+        union: True if the default graph is the union of all graphs, else it is an empty graph
+    Returns:
+        The set of graph IRIs read by the query or None if the query may read any graph
+    """
+    defaults = [
+        OrderedDict.get(clause, 'default') for clause in query.algebra.datasetClause or []
+        if OrderedDict.get(clause, 'default') is not None
+    ]
+    graphs = set()
+    for node, named in _algebraNodes(query.algebra):
+        if node.name in _GRAPHS:
+            term = OrderedDict.get(node, 'term')
+            if not isinstance(term, URIRef):
+                return None
+            graphs.add(term)
+        elif node.name in _PATTERNS and not named:
+            if defaults:
+                graphs.update(defaults)
+            elif union:
+                return None
+    return graphs
 
 
 def is_valid_query_base(parsed_query):
@@ -0,0 +1,167 @@
+import logging
+
+from bisect import bisect_right
+from rdflib import Graph
+from rdflib.graph import ModificationException
+from rdflib.store import Store
+
+logger = logging.getLogger('quit.index')
+
+
+class _Chain(object):
+    """The versions of one graph.
+
+    Each distinct triple is kept once together with a sorted list of half-open intervals
+    [start, end, start, end, ...] of the version numbers containing it. Versions are numbered in
+    the order they are added, thus a triple which is kept by consecutive versions only extends its
+    last interval and the memory grows with the number of changes instead of the number of versions.
+    """
+
+    __slots__ = ('validity', 'subjects', 'predicates', 'objects', 'versions', 'sizes')
+
+    def __init__(self):
+        self.validity = {}
+        self.subjects = {}
+        self.predicates = {}
+        self.objects = {}
+        self.versions = []
+        self.sizes = []
+
+    def add(self, identifier, triples):
+        number = len(self.versions)
+        self.versions.append(identifier)
+        size = 0
+
+        for triple in triples:
+            intervals = self.validity.get(triple)
+            if intervals is None:
+                self.validity[triple] = [number, number + 1]
+                for index, term in zip((self.subjects, self.predicates, self.objects), triple):
+                    index.setdefault(term, set()).add(triple)
+            elif intervals[-1] == number:
+                intervals[-1] = number + 1
+            elif intervals[-1] < number:
+                intervals.extend((number, number + 1))
+            else:
+                continue
+            size += 1
+
+        self.sizes.append(size)
+        return number
+
+    def match(self, pattern):
+        """Iterate all triples of all versions matching the pattern."""
+        s, p, o = pattern
+        if s is not None and p is not None and o is not None:
+            return [pattern] if pattern in self.validity else []
+
+        candidates = [
+            index.get(term, ()) for index, term
+            in ((self.subjects, s), (self.predicates, p), (self.objects, o)) if term is not None
+        ]
+        if not candidates:
+            return self.validity.keys()
+        return (
+            triple for triple in min(candidates, key=len)
+            if (s is None or triple[0] == s) and
+               (p is None or triple[1] == p) and
+               (o is None or triple[2] == o)
+        )
+
+    def numbers(self, triple):
+        """Iterate the numbers of all versions containing a triple."""
+        intervals = self.validity.get(triple, ())
+        for i in range(0, len(intervals), 2):
+            yield from range(intervals[i], intervals[i + 1])
+
+    def valid(self, triple, number):
+        return bisect_right(self.validity.get(triple, ()), number) % 2 == 1
+
+
+class VersionedIndex(Store):
+    """A read-only store keeping the versions of graphs in a single index.
+
+    Every version of a graph (e.g. a blob) is a context of the store. The versions of a graph
+    share a chain, in which each distinct triple is stored once with the intervals of versions
+    containing it (cf. _Chain).
+    """
+
+    context_aware = True
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = False
+
+    def __init__(self, configuration=None, identifier=None):
+        super().__init__(configuration, identifier)
+        self._chains = {}
+        self._versions = {}
+
+    def addVersion(self, identifier, chain, triples):
+        """Add a version of a graph.
+
+        Args:
+            identifier: the identifier of the context of the version
+            chain: the identifier of the graph the version belongs to
+            triples: an iterable of all triples of the version
+        """
+        if identifier in self._versions:
+            return
+        if chain not in self._chains:
+            self._chains[chain] = _Chain()
+        number = self._chains[chain].add(identifier, triples)
+        self._versions[identifier] = (self._chains[chain], number)
+        logger.debug("Indexed {} as version {} of {}.".format(identifier, number, chain))
+
+    def __contains__(self, identifier):
+        return identifier in self._versions
+
+    @property
+    def size(self):
+        """Get the number of distinct triples and the number of intervals of the index."""
+        triples = intervals = 0
+        for chain in self._chains.values():
+            triples += len(chain.validity)
+            intervals += sum(len(x) for x in chain.validity.values()) // 2
+        return triples, intervals
+
+    def add(self, triple, context, quoted=False):
+        raise ModificationException()
+
+    def addN(self, quads):
+        raise ModificationException()
+
+    def remove(self, triple_pattern, context=None):
+        raise ModificationException()
+
+    def triples(self, triple_pattern, context=None):
+        identifier = getattr(context, 'identifier', context)
+        if identifier is not None:
+            if identifier not in self._versions:
+                return
+            chain, number = self._versions[identifier]
+            for triple in chain.match(triple_pattern):
+                if chain.valid(triple, number):
+                    yield triple, iter([context])
+            return
+
+        for chain in self._chains.values():
+            for triple in chain.match(triple_pattern):
+                contexts = [
+                    Graph(store=self, identifier=chain.versions[number])
+                    for number in chain.numbers(triple)
+                ]
+                yield triple, iter(contexts)
+
+    def contexts(self, triple=None):
+        for identifier, (chain, number) in self._versions.items():
+            if triple is None or chain.valid(triple, number):
+                yield Graph(store=self, identifier=identifier)
+
+    def __len__(self, context=None):
+        identifier = getattr(context, 'identifier', context)
+        if identifier is not None:
+            if identifier not in self._versions:
+                return 0
+            chain, number = self._versions[identifier]
+            return chain.sizes[number]
+        return sum(len(chain.validity) for chain in self._chains.values())
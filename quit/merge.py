@@ -3,7 +3,7 @@ import pygit2
 import rdflib
 import logging
 from quit.exceptions import QuitMergeConflict, QuitBlobMergeConflict
-from rdflib.plugins.serializers.nt import _nt_row as _nt
+from quit.terms import TERMS
 
 logger = logging.getLogger('quit.merge')
 
@@ -240,9 +240,9 @@ class Merger(object):
             conflicts = set()
             for triple in graph.triples((None, None, None)):
                 if triple[0] in conflictingNodes or triple[2] in conflictingNodes:
-                    conflicts.add(_nt(triple).rstrip())
+                    conflicts.add(TERMS.line(triple))
                 else:
-                    ok.add(_nt(triple).rstrip())
+                    ok.add(TERMS.line(triple))
             return ok, conflicts
 
         graphAddA = rdflib.ConjunctiveGraph()
@@ -0,0 +1,156 @@
+import itertools
+import re
+
+from rdflib import BNode, Literal, URIRef
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser, unquote
+from quit.terms import TERMS
+
+__all__ = ('parse', 'labels', 'serialize_triple')
+
+_IRI = r'<[^:<>"\s\\]+:[^<>"\s\\]*>'
+_BNODE = r'_:[A-Za-z0-9_:](?:[-A-Za-z0-9_:.]*[-A-Za-z0-9_:])?'
+_LITERAL = (
+    r'"(?:[^"\\\n\r]|\\[tbnrf"\'\\]|\\u[0-9A-Fa-f]{4}|\\U[0-9A-Fa-f]{8})*"'
+    r'(?:@[a-zA-Z]+(?:-[a-zA-Z0-9]+)*|\^\^' + _IRI + ')?'
+)
+
+# a line as written by the N-Triples serializer, other lines are handled by the rdflib parser
+_LINE = re.compile(
+    '({bnode}|{iri}) ({iri}) ({bnode}|{iri}|{literal}) \\.\\Z'.format(
+        iri=_IRI, bnode=_BNODE, literal=_LITERAL))
+
+
+class _Sink:
+    """Collect the triples of the rdflib parser."""
+
+    def __init__(self):
+        self.triples = []
+
+    def triple(self, s, p, o):
+        self.triples.append((s, p, o))
+
+
+def _term(token, bnodes):
+    """Create the term of a token matched by _LINE."""
+    first = token[0]
+    if first == '<':
+        return URIRef(token[1:-1])
+    if first == '_':
+        label = token[2:]
+        bnode = bnodes.get(label)
+        if bnode is None:
+            # like the rdflib parser every document gets its own blank nodes
+            bnode = bnodes[label] = BNode()
+        return bnode
+
+    end = token.rindex('"')
+    value = token[1:end]
+    if '\\' in value:
+        value = unquote(value)
+    language = datatype = None
+    if end + 1 < len(token):
+        if token[end + 1] == '@':
+            language = token[end + 2:]
+        else:
+            datatype = URIRef(token[end + 4:-1])
+    return Literal(value, lang=language, datatype=datatype)
+
+
+def labels(triple, line):
+    """Get the blank node labels of a triple from its canonical line.
+
+    Returns:
+        A list of tuples (blank node, label) where label is the N-Triples form, e.g. "_:b1"
+    """
+    tokens = _LINE.match(line)
+    if tokens is None:
+        return []
+    return [
+        (term, token) for term, token in zip(triple, tokens.groups())
+        if token[0] == '_' and isinstance(term, BNode)
+    ]
+
+
+def serialize_triple(triple, forms=None):
+    """Get the canonical line of a triple, without line break.
+
+    Args:
+        triple: a triple of RDF terms
+        forms: a dict of blank nodes to their labels, other blank nodes are written by their id
+    """
+    if not forms:
+        return TERMS.line(triple)
+    return "{} {} {} .".format(*(
+        forms.get(term) or TERMS.ntriples(term) if isinstance(term, BNode) else
+        TERMS.ntriples(term) for term in triple))
+
+
+def parse(data, bnodes=None):
+    """Parse N-Triples data into triples of interned terms and their canonical lines.
+
+    Lines in the canonical form of the N-Triples serializer, e.g. the lines of the graph files
+    written by QuitStore, are split and their terms are looked up in the term dictionary by their
+    N-Triples form, thus most terms are not parsed at all. All other lines are parsed strictly by
+    the rdflib N-Triples parser, the resulting terms are the same in both cases. The labels of blank
+    nodes are kept in the lines, thus the lines of a file are stable although each document gets
+    its own blank nodes.
+
+    Args:
+        data: the N-Triples document as str or as bytes-like object in UTF-8, e.g. a blob
+        bnodes: a dict of blank node labels to blank nodes, shared by the documents which should
+            use the same blank nodes
+    Yields:
+        Tuples (triple, line) where line is the canonical N-Triples line without line break
+    Raises:
+        rdflib.plugins.parsers.ntriples.ParseError if a line is not valid N-Triples
+    """
+    if not isinstance(data, str):
+        data = str(data, 'utf-8')
+    if bnodes is None:
+        bnodes = {}
+
+    lookup = TERMS.lookup
+    match = _LINE.match
+    parser = None
+    forms = {}
+
+    def serialize(triple):
+        if len(forms) < len(bnodes):
+            # labels are only added to bnodes, thus only the new ones have to be added to forms
+            for label, bnode in itertools.islice(bnodes.items(), len(forms), None):
+                forms[bnode] = '_:' + label
+        return serialize_triple(triple, forms)
+
+    for line in data.split('\n'):
+        if line.endswith('\r'):
+            line = line[:-1]
+        if not line or line.startswith('#'):
+            continue
+
+        tokens = match(line)
+        if tokens is not None:
+            triple = []
+            canonical = True
+            for token in tokens.groups():
+                if token[0] == '_':
+                    triple.append(TERMS.intern(_term(token, bnodes)))
+                    continue
+                term = lookup(token)
+                if term is None:
+                    term = TERMS.intern(_term(token, bnodes))
+                    canonical = canonical and TERMS.ntriples(term) == token
+                triple.append(term)
+            triple = tuple(triple)
+            yield triple, line if canonical else serialize(triple)
+            continue
+
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        if parser is None:
+            sink = _Sink()
+            parser = W3CNTriplesParser(sink, bnode_context=bnodes)
+        parser.parsestring(line)
+        for triple in sink.triples:
+            triple = TERMS.triple(triple)
+            yield triple, serialize(triple)
+        sink.triples.clear()
@@ -0,0 +1,142 @@
+from collections import Counter
+from heapq import nlargest
+
+from rdflib import BNode, Variable
+from rdflib.namespace import RDF
+from rdflib.paths import Path
+
+__all__ = ('GraphStatistics', 'BOUND', 'planPatterns')
+
+# the number of rdf:type classes whose counts are kept
+CLASSES = 20
+
+# a position of a pattern, which is bound to a value only known during evaluation
+BOUND = object()
+
+
+class GraphStatistics:
+    """Statistics of the triples of a graph, which are used to estimate the size of patterns.
+
+    Args:
+        triples: an iterable of the triples of the graph
+    """
+
+    def __init__(self, triples=()):
+        byPredicate = {}
+        for triple in triples:
+            entry = byPredicate.get(triple[1])
+            if entry is None:
+                byPredicate[triple[1]] = [triple]
+            else:
+                entry.append(triple)
+
+        subjects = set()
+        objects = set()
+        predicates = {}
+        size = 0
+        for p, entry in byPredicate.items():
+            s = set(triple[0] for triple in entry)
+            o = set(triple[2] for triple in entry)
+            predicates[p] = (len(entry), len(s), len(o))
+            subjects.update(s)
+            objects.update(o)
+            size += len(entry)
+        classes = Counter(triple[2] for triple in byPredicate.get(RDF.type, ()))
+
+        self.triples = size
+        self.subjects = len(subjects)
+        self.objects = len(objects)
+        # predicate -> (triples, distinct subjects, distinct objects)
+        self.predicates = predicates
+        # the triples of the most frequent classes, the remaining classes share the other triples
+        self.classes = dict(nlargest(CLASSES, classes.items(), key=lambda item: item[1]))
+        self._otherClasses = len(classes) - len(self.classes)
+        self._otherTypes = sum(classes.values()) - sum(self.classes.values())
+
+    def _classSize(self, rdfClass):
+        count = self.classes.get(rdfClass)
+        if count is not None:
+            return count
+        if not self._otherClasses:
+            return 0
+        return self._otherTypes / self._otherClasses
+
+    def estimate(self, s, p, o):
+        """Estimate the number of triples matching a pattern.
+
+        Args:
+            s, p, o: the terms of the pattern, None for an unbound position or BOUND for a position
+                which is bound to an unknown value
+        Returns:
+            The estimated number of matching triples as float
+        """
+        if not self.triples:
+            return 0.0
+        if p is None or p is BOUND or isinstance(p, Path):
+            count, subjects, objects = self.triples, self.subjects, self.objects
+            if p is BOUND:
+                count = count / len(self.predicates)
+        else:
+            entry = self.predicates.get(p)
+            if entry is None:
+                return 0.0
+            count, subjects, objects = entry
+            if p == RDF.type and o is not None and o is not BOUND:
+                count = self._classSize(o)
+                return count / subjects if s is not None else float(count)
+
+        if s is not None and o is not None:
+            return count / subjects / objects
+        if s is not None:
+            return count / subjects
+        if o is not None:
+            return count / objects
+        return float(count)
+
+
+def _isVariable(term):
+    return isinstance(term, (Variable, BNode))
+
+
+def _resolve(term, bound):
+    if _isVariable(term):
+        return BOUND if term in bound else None
+    return term
+
+
+def planPatterns(patterns, statistics, bound=()):
+    """Order the triple patterns of a basic graph pattern by their estimated size.
+
+    The pattern with the fewest estimated matches is evaluated first, every further pattern is
+    chosen among the patterns sharing a variable with the patterns before, given the variables
+    bound by them. Patterns of equal estimates keep their order.
+
+    Args:
+        patterns: a list of triple patterns
+        statistics: a list of GraphStatistics of the graphs the patterns are matched against
+        bound: the variables which are bound before the patterns are evaluated
+    Returns:
+        A tuple (patterns, size) of the ordered list of patterns and the estimated number of
+        solutions
+    """
+    remaining = list(patterns)
+    bound = set(bound)
+    plan = []
+    size = 1.0
+    while remaining:
+        candidates = [
+            pattern for pattern in remaining
+            if any(_isVariable(term) and term in bound for term in pattern)
+        ] or remaining
+        best = None
+        for pattern in candidates:
+            terms = [_resolve(term, bound) for term in pattern]
+            estimate = sum(graph.estimate(*terms) for graph in statistics)
+            if best is None or estimate < best[0]:
+                best = (estimate, pattern)
+        estimate, pattern = best
+        plan.append(pattern)
+        remaining.remove(pattern)
+        bound.update(term for term in pattern if _isVariable(term))
+        size *= estimate
+    return plan, size
@@ -0,0 +1,132 @@
+import itertools
+import logging
+import sys
+import threading
+
+from rdflib import Literal
+from rdflib.plugins.serializers.nt import _quoteLiteral
+
+__all__ = ('TermDictionary', 'TERMS')
+
+logger = logging.getLogger('quit.terms')
+
+# references to an interned term held by the dictionary itself, the loop in collect and the
+# argument of sys.getrefcount
+_OWN_REFERENCES = 4
+
+
+def _ntriples(term):
+    if isinstance(term, Literal):
+        return _quoteLiteral(term)
+    return term.n3()
+
+
+class TermDictionary:
+    """A dictionary interning RDF terms to integer ids and their N-Triples forms.
+
+    Equal terms of different parsed blobs are replaced by a single term object, thus the terms are
+    kept once in memory and their N-Triples forms are only computed once. Terms which are not
+    referenced outside of the dictionary anymore are dropped by collect, which runs automatically
+    whenever the dictionary doubled its size since the last run.
+
+    Args:
+        threshold: the minimal number of terms before collect runs automatically
+    """
+
+    def __init__(self, threshold=100000):
+        self._entries = {}
+        self._ids = {}
+        self._forms = {}
+        self._counter = itertools.count()
+        self._threshold = threshold
+        self._lock = threading.Lock()
+
+    def _entry(self, term):
+        entry = self._entries.get(term)
+        if entry is not None:
+            return entry
+        form = _ntriples(term)
+        with self._lock:
+            # the hash of some terms is expensive, thus the term is only hashed once more
+            entry = (term, next(self._counter), form)
+            current = self._entries.setdefault(term, entry)
+            if current is not entry:
+                return current
+            self._ids[entry[1]] = entry
+            self._forms[entry[2]] = entry
+            if len(self._entries) >= self._threshold:
+                self._collect()
+            return entry
+
+    def intern(self, term):
+        """Get the single instance of a term."""
+        return self._entry(term)[0]
+
+    def id(self, term):
+        """Get the integer id of a term.
+
+        Ids are not reused, but they are only valid as long as the term itself is referenced.
+        """
+        return self._entry(term)[1]
+
+    def term(self, id):
+        """Get the term of an id.
+
+        Raises:
+            KeyError if the id is unknown or its term was collected
+        """
+        return self._ids[id][0]
+
+    def ntriples(self, term):
+        """Get the N-Triples form of a term."""
+        return self._entry(term)[2]
+
+    def lookup(self, form):
+        """Get the interned term of a N-Triples form or None if no term has this form."""
+        entry = self._forms.get(form)
+        return entry[0] if entry is not None else None
+
+    def triple(self, triple):
+        """Get a triple of the single instances of its terms."""
+        s, p, o = triple
+        return self._entry(s)[0], self._entry(p)[0], self._entry(o)[0]
+
+    def line(self, triple):
+        """Get the N-Triples line of a triple, without line break."""
+        s, p, o = triple
+        return "{} {} {} .".format(self._entry(s)[2], self._entry(p)[2], self._entry(o)[2])
+
+    def collect(self):
+        """Drop all terms which are not referenced outside of the dictionary.
+
+        Returns:
+            The number of dropped terms
+        """
+        with self._lock:
+            return self._collect()
+
+    def _collect(self):
+        size = len(self._entries)
+        for entry in list(self._entries.values()):
+            term = entry[0]
+            if sys.getrefcount(term) <= _OWN_REFERENCES:
+                del self._entries[term]
+                del self._ids[entry[1]]
+                if self._forms.get(entry[2]) is entry:
+                    del self._forms[entry[2]]
+            term = entry = None
+
+        dropped = size - len(self._entries)
+        self._threshold = max(self._threshold, 2 * len(self._entries))
+        logger.debug("Collected {} of {} terms".format(dropped, size))
+        return dropped
+
+    def __contains__(self, term):
+        return term in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# the dictionary shared by all graphs of the process
+TERMS = TermDictionary()
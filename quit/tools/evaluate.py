@@ -17,6 +17,7 @@ also return a dict of list of dicts
 import collections
 
 from rdflib import Variable, Graph, BNode, URIRef, Literal
+from rdflib.graph import ReadOnlyGraphAggregate
 from six import iteritems, itervalues
 
 from rdflib.plugins.sparql import CUSTOM_EVALS
@@ -29,6 +30,8 @@ from rdflib.plugins.sparql.evalutils import (
 from rdflib.plugins.sparql.aggregates import Aggregator
 from rdflib.plugins.sparql.algebra import Join, ToMultiSet, Values
 
+from quit.graphs import graphStatistics
+from quit.statistics import planPatterns
 from quit.web import service
 from quit.exceptions import UnSupportedQuery, UnSupportedQueryType, FromNamedError
 
@@ -73,6 +76,29 @@ def evalBGP(ctx, bgp):
             yield x
 
 
+def _planBGP(ctx, bgp):
+    """
+    Order the triple patterns of a BGP by the statistics of the graph of the
+    ctx, see quit.statistics.planPatterns
+
+    The plans are kept in the BGP per graph and bound variables, they are
+    None if the graph has no statistics
+    """
+    bound = frozenset(
+        n for t in bgp.triples for n in t
+        if isinstance(n, (Variable, BNode)) and ctx[n] is not None)
+    key = (id(ctx.graph), bound)
+
+    plans = bgp.plans
+    if plans is None:
+        plans = bgp['plans'] = {}
+    if key not in plans:
+        statistics = graphStatistics(ctx.graph)
+        plans[key] = None if statistics is None else \
+            planPatterns(bgp.triples, statistics, bound)
+    return plans[key]
+
+
 def evalExtend(ctx, extend):
     # TODO: Deal with dict returned from evalPart from GROUP BY
 
@@ -101,17 +127,74 @@ def evalLazyJoin(ctx, join):
             yield b.merge(a) # merge, as some bindings may have been forgotten
 
 
+def _hashJoin(a, b, variables):
+    """
+    Join the solutions of a with the solutions in b, which are indexed by
+    the values of the shared variables instead of comparing all pairs
+    """
+    index = collections.defaultdict(list)
+    unbound = []
+    for y in b:
+        key = tuple(y.get(v) for v in variables)
+        if None in key:
+            unbound.append(y)
+        else:
+            index[key].append(y)
+
+    for x in a:
+        key = tuple(x.get(v) for v in variables)
+        candidates = b if None in key else index.get(key, []) + unbound
+        for y in candidates:
+            if x.compatible(y):
+                yield x.merge(y)
+
+
+def _estimate(ctx, part):
+    """
+    Estimate the number of solutions of a part or None if it is unknown
+    """
+    if part.name == 'BGP':
+        plan = _planBGP(ctx, part)
+        return plan[1] if plan is not None else None
+    elif part.name == 'Filter':
+        return _estimate(ctx, part.p)
+    elif part.name == 'Graph' and ctx.dataset is not None and ctx[part.term] is not None:
+        return _estimate(ctx.pushGraph(ctx.dataset.get_context(ctx[part.term])), part.p)
+    return None
+
+
+def _preferLazyJoin(ctx, join):
+    """
+    A lazy join evaluates the second part once per solution of the first
+    part, it is only worth it if the first part is expected to be smaller
+    """
+    p1 = _estimate(ctx, join.p1)
+    if p1 is None:
+        return True
+    p2 = _estimate(ctx, join.p2)
+    return p2 is None or p1 <= p2
+
+
 def evalJoin(ctx, join):
 
     # TODO: Deal with dict returned from evalPart from GROUP BY
     # only ever for join.p1
 
-    if join.lazy:
+    if join.p1._vars is None or join.p2._vars is None:
+        variables = None
+    else:
+        variables = tuple(join.p1._vars & join.p2._vars)
+
+    if join.lazy and (variables is None or _preferLazyJoin(ctx, join)):
         return evalLazyJoin(ctx, join)
+    elif join.lazy:
+        a = evalPart(ctx, join.p1)
+        b = list(evalPart(ctx, join.p2))
+        return _hashJoin(a, b, variables)
     else:
         a = evalPart(ctx, join.p1)
         b = set(evalPart(ctx, join.p2))
-        return _join(a, b)
+        return _join(a, b) if variables is None else _hashJoin(a, b, variables)
 
 
 def evalUnion(ctx, union):
@@ -220,9 +303,13 @@ def evalPart(ctx, part):
             pass  # the given custome-function did not handle this part
 
     if part.name == 'BGP':
-        # Reorder triples patterns by number of bound nodes in the current ctx
-        # Do patterns with more bound nodes first
-        triples = sorted(part.triples, key=lambda t: len([n for n in t if ctx[n] is None]))
+        plan = _planBGP(ctx, part) if len(part.triples) > 1 else None
+        if plan is not None:
+            triples = plan[0]
+        else:
+            # Reorder triples patterns by number of bound nodes in the current ctx
+            # Do patterns with more bound nodes first
+            triples = sorted(part.triples, key=lambda t: len([n for n in t if ctx[n] is None]))
 
         return evalBGP(ctx, triples)
     elif part.name == 'Filter':
@@ -468,17 +555,13 @@ def evalQuery(graph, query, initBindings, base=None):
 
         ctx = ctx.clone()  # or push/pop?
 
-        firstDefault = False
+        # the default graph is the union of the graphs given by FROM resp. default-graph-uri, it
+        # is a view on these graphs instead of a copy in the dataset, thus only these graphs are
+        # loaded and the dataset is not modified
+        defaults = []
         for d in main.datasetClause:
             if d.default:
-
-                if firstDefault:
-                    # replace current default graph
-                    dg = ctx.dataset.get_context(BNode())
-                    ctx = ctx.pushGraph(dg)
-                    firstDefault = True
-
-                ctx.load(d.default, default=True)
+                defaults.append(ctx.dataset.get_context(d.default))
 
             # TODO re-enable original behaviour if FROM NAMED works with named graphs
             # https://github.com/AKSW/QuitStore/issues/144
@@ -487,4 +570,7 @@ def evalQuery(graph, query, initBindings, base=None):
             #     g = d.named
             #     ctx.load(g, default=False)
 
+        if defaults:
+            ctx.graph = ReadOnlyGraphAggregate(defaults)
+
     return evalPart(ctx, main)
@@ -2,13 +2,18 @@ from __future__ import with_statement
 from flask import Response
 import os
 import contextlib
+import logging
 import signal
 import sys
+import time
 from datetime import tzinfo, timedelta, datetime
 from quit.graphs import InMemoryAggregatedGraph
 from collections import OrderedDict
+from itertools import chain
+from rdflib import Graph
 from urllib.parse import quote_plus, urlparse
 
+logger = logging.getLogger('quit.utils')
 
 ZERO = timedelta(0)
 HOUR = timedelta(hours=1)
@@ -50,11 +55,86 @@ def iri_to_name(iri):
     return quote_plus("_".join(nameParts))
 
 
-def graphdiff(first, second):
+def linediff(first, second):
+    """Compare two sorted iterables of lines with a linear merge.
+
+    Returns:
+        A tuple (removals, additions) of the lists of lines only in first resp. only in second
+    """
+    removals = []
+    additions = []
+    first = iter(first)
+    second = iter(second)
+    a = next(first, None)
+    b = next(second, None)
+
+    while a is not None and b is not None:
+        if a == b:
+            a = next(first, None)
+            b = next(second, None)
+        elif a < b:
+            removals.append(a)
+            a = next(first, None)
+        else:
+            additions.append(b)
+            b = next(second, None)
+
+    if a is not None:
+        removals.append(a)
+        removals.extend(first)
+    if b is not None:
+        additions.append(b)
+        additions.extend(second)
+    return removals, additions
+
+
+def _parselines(lines):
+    graph = Graph()
+    graph.parse(data='\n'.join(lines), format='nt')
+    return graph
+
+
+def _isomorphicdiff(g1, g2):
+    from rdflib.compare import to_isomorphic, graph_diff
+    in_both, in_first, in_second = graph_diff(to_isomorphic(g1), to_isomorphic(g2))
+    return in_first, in_second
+
+
+def _sorteddiff(g1, g2, lines1, lines2):
+    removals, additions = linediff(lines1, lines2)
+    removals = _parselines(removals)
+    additions = _parselines(additions)
+    # the lines have to represent the graphs, else the caller falls back to isomorphism
+    if any(t not in g1 for t in removals) or any(t not in g2 for t in additions):
+        return None
+    # lines may differ in the serialization only, thus only keep triples missing on the other side
+    in_first = [t for t in removals if t not in g2]
+    in_second = [t for t in additions if t not in g1]
+    return in_first, in_second
+
+
+def _hasblanknodes(*lines):
+    return any('_:' in line for line in chain(*lines))
+
+
+def graphdiff(first, second, first_lines=None, second_lines=None):
     """
     Diff between graph instances, should be replaced/included in quit diff
+
+    If the sorted N-Triples lines of a graph are given for both sides, e.g. a FileReference, the
+    graphs are compared by a linear merge of the lines. Graphs containing blank nodes or without
+    lines are compared by isomorphism.
+
+    Args:
+        first: the InMemoryAggregatedGraph of the old state or None
+        second: the InMemoryAggregatedGraph of the new state or None
+        first_lines: a dict of graph identifiers to sorted lines of the old state
+        second_lines: a dict of graph identifiers to sorted lines of the new state
+    Returns:
+        An OrderedDict of graph identifiers to lists of ('additions'|'removals', triples)
     """
-    from rdflib.compare import to_isomorphic, graph_diff
+    first_lines = first_lines or {}
+    second_lines = second_lines or {}
 
     diffs = OrderedDict()
     iris = set()
@@ -76,7 +156,27 @@ def graphdiff(first, second):
         ):
             g1 = first.get_context(iri)
             g2 = second.get_context(iri)
-            in_both, in_first, in_second = graph_diff(to_isomorphic(g1), to_isomorphic(g2))
+            lines1 = first_lines.get(iri, None)
+            lines2 = second_lines.get(iri, None)
+            start = time.perf_counter()
+
+            result = None
+            if lines1 is not None and lines1 is lines2:
+                method = 'same'
+                result = [], []
+            elif (
+                lines1 is not None and lines2 is not None and
+                not _hasblanknodes(lines1, lines2)
+            ):
+                method = 'sorted'
+                result = _sorteddiff(g1, g2, lines1, lines2)
+            if result is None:
+                method = 'isomorphic'
+                result = _isomorphicdiff(g1, g2)
+            in_first, in_second = result
+
+            logger.debug("Diff of {} ({}) took {:.6f}s".format(
+                iri, method, time.perf_counter() - start))
 
             if len(in_second) > 0:
                 changes.append(('additions', ((s, p, o) for s, p, o in in_second)))
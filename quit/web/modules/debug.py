@@ -1,3 +1,4 @@
+import json
 import sys
 import traceback
 
@@ -56,3 +57,13 @@ def blame(branch_or_ref):
         current_app.logger.error(e)
         current_app.logger.error(traceback.format_exc())
         return "<pre>" + traceback.format_exc() + "</pre>", 400
+
+
+@debug.route("/cache", methods=['GET'])
+def cache():
+    """Get the statistics of the internal caches, e.g. the hit rate of the query results."""
+    quit = current_app.config['quit']
+
+    response = make_response(json.dumps(quit.cacheStatistics()), 200)
+    response.headers['Content-Type'] = 'application/json'
+    return response
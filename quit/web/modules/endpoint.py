@@ -69,7 +69,7 @@ def sparql(branch_or_ref):
 
         try:
             queryType, parsedQuery = parse_type(
-                query, quit.config.namespace, default_graph, named_graph)
+                query, quit.config.namespace, default_graph, named_graph, cache=quit.queries)
         except UnSupportedQuery:
             return make_response('Unsupported Query', 400)
         except NonAbsoluteBaseError:
@@ -116,8 +116,7 @@ def sparql(branch_or_ref):
                         quit.repository.merge(target=branch_or_ref, branch=target_ref)
                         oid = quit.repository.revision(branch_or_ref).id
                         # delete temporary branch
-                        tmp_branch = quit.repository._repository.branches.get(target_branch)
-                        tmp_branch.delete()
+                        quit.repository.delete_branch(target_branch)
                         response = make_response('success', 200)
                         target_branch = branch_or_ref
                     except QuitMergeConflict as e:
@@ -157,7 +156,7 @@ def sparql(branch_or_ref):
             return make_response('No branch or reference given.', 400)
 
         try:
-            res = graph.query(parsedQuery)
+            res, hit = graph.cachedQuery(parsedQuery)
         except FromNamedError:
             return make_response('FROM NAMED not supported, yet', 400)
         except UnSupportedQuery:
@@ -169,6 +168,7 @@ def sparql(branch_or_ref):
             return make_response("Mimetype: {} not acceptable".format(mimetype), 406)
 
         response = create_result_response(res, mimetype)
+        response.headers["X-Cache"] = 'HIT' if hit else 'MISS'
         if branch_or_ref:
             response.headers["X-CurrentBranch"] = branch_or_ref
         if commitid:
@@ -199,7 +199,7 @@ def provenance():
         if len(named_graph) > 0:
             return make_response('Unsupported Query, "FROM NAMED not supported, yet"', 400)
         try:
-            queryType, parsedQuery = parse_query_type(query)
+            queryType, parsedQuery = parse_query_type(query, cache=quit.queries)
         except UnSupportedQuery:
             return make_response('Unsupported Query', 400)
         except NonAbsoluteBaseError:
@@ -300,7 +300,8 @@ def edit_store(quit, branch_or_ref, ref, method, args, body, graph):
             remove_where(graph, args)
             response = (200, dict(), None)
 
-            quit.commit(graph, 'New Commit from QuitStore', branch_or_ref, ref)
+            quit.commit(graph, [{'type': method, 'delta': graph.store.changes()}],
+                        'New Commit from QuitStore', branch_or_ref, ref)
 
         elif method in ['POST', 'PUT']:
 
@@ -316,7 +317,8 @@ def edit_store(quit, branch_or_ref, ref, method, args, body, graph):
                 copy_where(graph, data, args)
                 response = (200, dict(), None)
 
-            quit.commit(graph, 'New Commit from QuitStore', branch_or_ref, ref)
+            quit.commit(graph, [{'type': method, 'delta': graph.store.changes()}],
+                        'New Commit from QuitStore', branch_or_ref, ref)
 
         else:
             response = (405, {"Allow": "GET, HEAD, POST, PUT, DELETE"},
@@ -337,7 +339,7 @@ def edit_store(quit, branch_or_ref, ref, method, args, body, graph):
 def statements(branch_or_ref):
 
     quit = current_app.config['quit']
-    default_branch = quit.config.getDefaultBranch()
+    default_branch = quit.getDefaultBranch()
 
     if not branch_or_ref and not quit.repository.is_empty:
         branch_or_ref = default_branch
@@ -349,7 +351,8 @@ def statements(branch_or_ref):
     args = request.args
     body = request.data.decode('utf-8')
 
-    graph, commitid = quit.instance(branch_or_ref)
+    # only GET requests may use the shared read-only snapshot, all others edit the graphs
+    graph, commitid = quit.instance(branch_or_ref, method != 'GET')
 
     result = edit_store(
         quit=quit,
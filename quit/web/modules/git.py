@@ -341,9 +341,7 @@ def del_branch(refspec):
 
         refspec = re.sub("^refs/heads/", "", refspec)
 
-        branch = quit.repository._repository.branches.get(refspec)
-        if branch:
-            branch.delete()
+        if quit.repository.delete_branch(refspec):
             message = "{} deleted".format(refspec)
             status = 200
         else:
@@ -218,6 +218,31 @@ class SparqlProtocolTests(unittest.TestCase):
             response = app.post('/sparql', query_string=payload, data=self.query, headers=headers)
             self.assertEqual(response.status_code, 400)
 
+    def testUpdateKeepsBlankNodeLabels(self):
+        graphContent = '_:b1 <urn:p> "x" .\n<urn:x> <urn:p> _:b2 .\n'
+        with TemporaryRepositoryFactory().withGraph("http://example.org/", graphContent) as repo:
+            args = quitApp.getDefaults()
+            args['targetdir'] = repo.workdir
+            app = create_app(args).test_client()
+            headers = {'Content-Type': 'application/sparql-update'}
+
+            update = 'INSERT DATA {{ GRAPH <http://example.org/> {{ <urn:{0}> <urn:p> "{0}" }} }}'
+            for name in ('a', 'b'):
+                response = app.post('/sparql', data=update.format(name), headers=headers)
+                self.assertEqual(response.status_code, 200)
+                lines = repo.revparse_single('HEAD').tree['graph.nt'].data.decode().splitlines()
+                self.assertIn('_:b1 <urn:p> "x" .', lines)
+                self.assertIn('<urn:x> <urn:p> _:b2 .', lines)
+
+            # added triples of a known blank node get its label
+            update = 'INSERT { GRAPH <http://example.org/> { ?s <urn:q> "y" } } ' \
+                     'WHERE { GRAPH <http://example.org/> { ?s <urn:p> "x" } }'
+            response = app.post('/sparql', data=update, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            lines = repo.revparse_single('HEAD').tree['graph.nt'].data.decode().splitlines()
+            self.assertIn('_:b1 <urn:p> "x" .', lines)
+            self.assertIn('_:b1 <urn:q> "y" .', lines)
+
     def testUpdateUsingGraphUri(self):
         select = "SELECT * WHERE {graph <urn:graph> {?s ?p ?o .}} ORDER BY ?s ?p ?o"
 
@@ -483,6 +508,17 @@ class SparqlProtocolTests(unittest.TestCase):
                 "p": {'type': 'uri', 'value': 'urn:y'},
                 "o": {'type': 'uri', 'value': 'urn:z'}})
 
+            # FROM does not modify the dataset of later queries
+            select = "SELECT ?s ?p ?o WHERE {?s ?p ?o . } ORDER BY ?s ?p ?o"
+            resp = app.post(
+                '/sparql',
+                data=dict(query=select),
+                headers=dict(accept="application/sparql-results+json")
+            )
+
+            obj = json.loads(resp.data.decode("utf-8"))
+            self.assertEqual(len(obj["results"]["bindings"]), 0)
+
     @unittest.skip("Skipped until rdflib properly handles FROM NAMED and USING NAMED")
     def testSelectFromNamed(self):
         select = "SELECT ?s ?p ?o FROM NAMED <http://example.org/graph1/> "
@@ -1064,6 +1100,35 @@ class QuitAppTestCase(unittest.TestCase):
             self.assertFalse(app.config['quit'].config.hasFeature(Feature.Persistence))
             self.assertTrue(app.config['quit'].config.hasFeature(Feature.GarbageCollection))
 
+    def testCreateAppArgsCacheBudget(self):
+        """Test create_app with cache budgets as command line arguments"""
+        with TemporaryRepository() as repo:
+            defaults = quitApp.getDefaults()
+            cliArgs = quitApp.parseArgs(['-t', repo.workdir, '--cache-budget', 'blobs=2',
+                                         '--cache-policy', 'size'])
+            app = create_app({**defaults, **cliArgs})
+            quit = app.config['quit']
+            self.assertEqual(quit.config.cachebudgets, {'blobs': 2 * 1024 * 1024})
+            self.assertEqual(quit._blobs.budget, 2 * 1024 * 1024)
+            self.assertIsNone(quit._blobs.capacity)
+            self.assertEqual(quit._commits.capacity, 50)
+            self.assertEqual(quit.cacheStatistics()['blobs']['bytes'], quit._blobs.total)
+
+            with self.assertRaises(SystemExit):
+                quitApp.parseArgs(['-t', repo.workdir, '--cache-budget', 'unknown=2'])
+
+            cliArgs = quitApp.parseArgs(['-t', repo.workdir, '--cache-budget', 'queries=3'])
+            quit = create_app({**defaults, **cliArgs}).config['quit']
+            self.assertEqual(quit.queries.budget, 3 * 1024 * 1024)
+            self.assertIsNone(quit.queries.capacity)
+
+            try:
+                os.environ['QUIT_CACHE_BUDGET'] = 'queries=3,results=1'
+                self.assertEqual(quitApp.parseEnv()['cache_budget'], {
+                    'queries': 3, 'results': 1})
+            finally:
+                del os.environ['QUIT_CACHE_BUDGET']
+
     def testCreateAppArgsOnlyProv(self):
         """Test create_app with command line arguments"""
         with TemporaryRepository() as repo:
@@ -1097,6 +1162,37 @@ class QuitAppTestCase(unittest.TestCase):
                     num_lines = sum(1 for line in logfilepointer)
                     self.assertTrue(num_lines > 1)
 
+    def testParseEnvCachePolicy(self):
+        """Test that the cache policy of the environment is validated"""
+        try:
+            os.environ['QUIT_CACHE_POLICY'] = 'lfu'
+            self.assertEqual(quitApp.parseEnv()['cache_policy'], 'lfu')
+
+            os.environ['QUIT_CACHE_POLICY'] = 'fifo'
+            with self.assertRaises(ValueError) as context:
+                quitApp.parseEnv()
+            self.assertIn("invalid cache policy: 'fifo'", str(context.exception))
+        finally:
+            del os.environ['QUIT_CACHE_POLICY']
+
+    def testParseEnvNumbers(self):
+        """Test that the numbers of the environment are validated"""
+        for variable, key, name in [
+            ('QUIT_SYNC_WORKERS', 'sync_workers', 'number of sync workers'),
+            ('QUIT_BLOBCACHE_SIZE', 'blobcache_size', 'blob cache size')
+        ]:
+            try:
+                os.environ[variable] = '4'
+                self.assertEqual(quitApp.parseEnv()[key], 4)
+
+                for value in ('four', '0', '-1', ''):
+                    os.environ[variable] = value
+                    with self.assertRaises(ValueError) as context:
+                        quitApp.parseEnv()
+                    self.assertIn("invalid {}: {!r}".format(name, value), str(context.exception))
+            finally:
+                del os.environ[variable]
+
     def testCreateAppFail(self):
         """Test create_app without targert directory, which should fail"""
         with TemporaryRepository() as repo:
@@ -1530,7 +1626,7 @@ class QuitAppTestCase(unittest.TestCase):
             with open(path.join(repo.workdir, 'graph_0.nt'), 'r') as f:
                 self.assertEqual('\n', f.read())
             with open(path.join(repo.workdir, 'graph_1.nt'), 'r') as f:
-                self.assertEqual('<urn:x> <urn:y> <urn:z> .\n', f.read())
+                self.assertEqual('<urn:x> <urn:y> <urn:z> .', f.read())
 
     def testDeleteWhere(self):
         """Test DELETE WHERE with two non empty graphs.
@@ -1647,7 +1743,7 @@ class QuitAppTestCase(unittest.TestCase):
             with open(path.join(repo.workdir, 'graph_0.nt'), 'r') as f:
                 self.assertEqual('\n', f.read())
             with open(path.join(repo.workdir, 'graph_1.nt'), 'r') as f:
-                self.assertEqual('<urn:x> <urn:y> <urn:z> .\n', f.read())
+                self.assertEqual('<urn:x> <urn:y> <urn:z> .', f.read())
 
     def testFeatureProvenance(self):
         """Test if feature is active or not."""
@@ -2181,7 +2277,7 @@ class QuitAppTestCase(unittest.TestCase):
             with open(path.join(repo.workdir, 'graph_0.nt'), 'r') as f:
                 self.assertEqual('<urn:x> <urn:1> "new" .\n', f.read())
             with open(path.join(repo.workdir, 'graph_1.nt'), 'r') as f:
-                self.assertEqual('<urn:x> <urn:y> <urn:z> .\n', f.read())
+                self.assertEqual('<urn:x> <urn:y> <urn:z> .', f.read())
 
     def testInsertWhereVariables(self):
         """Test INSERT WHERE with an empty and a non empty graph.
@@ -2254,7 +2350,7 @@ class QuitAppTestCase(unittest.TestCase):
                 self.assertEqual('<urn:x> <urn:1> "new" .\n', f.read())
             with open(path.join(repo.workdir, 'graph_1.nt'), 'r') as f:
                 self.assertEqual(
-                    '<urn:x> <urn:y> <urn:z1> .\n<urn:x> <urn:y> <urn:z2> .\n', f.read())
+                    '<urn:x> <urn:y> <urn:z1> .\n<urn:x> <urn:y> <urn:z2> .', f.read())
 
     def testTwoInsertWhereVariables(self):
         """Test two INSERT WHERE (; concatenated) with an empty and a non empty graph.
@@ -2328,7 +2424,7 @@ class QuitAppTestCase(unittest.TestCase):
                 self.assertEqual('<urn:x> <urn:1> "new" .\n', f.read())
             with open(path.join(repo.workdir, 'graph_1.nt'), 'r') as f:
                 self.assertEqual(
-                    '<urn:x> <urn:y> <urn:z1> .\n<urn:x> <urn:y> <urn:z2> .\n', f.read())
+                    '<urn:x> <urn:y> <urn:z1> .\n<urn:x> <urn:y> <urn:z2> .', f.read())
 
     def testInsertUsingWhere(self):
         """Test INSERT USING WHERE with an empty and a non empty graph.
@@ -2389,7 +2485,7 @@ class QuitAppTestCase(unittest.TestCase):
             with open(path.join(repo.workdir, 'graph_0.nt'), 'r') as f:
                 self.assertEqual('<urn:x> <urn:1> "new" .\n', f.read())
             with open(path.join(repo.workdir, 'graph_1.nt'), 'r') as f:
-                self.assertEqual('<urn:x> <urn:y> <urn:z> .\n', f.read())
+                self.assertEqual('<urn:x> <urn:y> <urn:z> .', f.read())
 
     def testLoadIntoGraph(self):
         """Test LOAD <resource> INTO GRAPH <http://example.org/> ."""
@@ -3653,6 +3749,79 @@ class QuitAppTestCase(unittest.TestCase):
             with open(path.join(repo.workdir, 'graph_1.nt'), 'r') as f:
                 self.assertEqual('\n', f.read())
 
+    def testResultCache(self):
+        """Test that query results are reused by commits which do not change the queried graph.
+
+        1. Prepare a git repository with two graphs
+        2. Start Quit
+        3. execute a SELECT query twice
+        4. change the other graph and execute the query
+        5. change the queried graph and execute the query
+        """
+        # Prepate a git Repository
+        content = '<urn:x> <urn:y> <urn:z> .'
+        repoContent = {'http://example.org/': content, 'http://aksw.org/': content}
+        with TemporaryRepositoryFactory().withGraphs(repoContent) as repo:
+
+            # Start Quit
+            args = quitApp.getDefaults()
+            args['targetdir'] = repo.workdir
+            app = create_app(args).test_client()
+
+            select = 'SELECT * WHERE { GRAPH <http://example.org/> { ?s ?p ?o } }'
+            headers = dict(accept="application/sparql-results+json")
+
+            def query():
+                response = app.post('/sparql', data=dict(query=select), headers=headers)
+                return response.headers['X-Cache'], len(json.loads(
+                    response.data.decode("utf-8"))['results']['bindings'])
+
+            self.assertEqual(query(), ('MISS', 1))
+            self.assertEqual(query(), ('HIT', 1))
+
+            app.post('/sparql', content_type="application/sparql-update",
+                     data='INSERT DATA { GRAPH <http://aksw.org/> { <urn:a> <urn:b> <urn:c> } }')
+            self.assertEqual(query(), ('HIT', 1))
+
+            app.post('/sparql', content_type="application/sparql-update",
+                     data='INSERT DATA { GRAPH <http://example.org/> { <urn:a> <urn:b> <urn:c> } }')
+            self.assertEqual(query(), ('MISS', 2))
+
+            statistics = json.loads(app.get('/cache').data.decode("utf-8"))
+            self.assertEqual(statistics['results']['hits'], 2)
+            self.assertEqual(statistics['results']['misses'], 2)
+            self.assertEqual(statistics['results']['hitrate'], 0.5)
+
+    def testStatementsPost(self):
+        """Test adding statements with the statements endpoint.
+
+        1. Prepare a git repository with two graphs
+        2. Start Quit
+        3. POST statements to one graph
+        4. compare file contents
+        """
+        # Prepate a git Repository
+        content = '<urn:x> <urn:y> <urn:z> .'
+        repoContent = {'http://example.org/': content, 'http://aksw.org/': content}
+        with TemporaryRepositoryFactory().withGraphs(repoContent) as repo:
+
+            # Start Quit
+            args = quitApp.getDefaults()
+            args['targetdir'] = repo.workdir
+            app = create_app(args).test_client()
+
+            response = app.post(
+                '/statements', data='<urn:x> <urn:y> <urn:new> <http://example.org/> .\n')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(list(repo.walk(repo.head.target))), 2)
+
+            # only the changed graph file is written
+            with open(path.join(repo.workdir, 'graph_1.nt'), 'r') as f:
+                self.assertEqual('<urn:x> <urn:y> <urn:new> .\n<urn:x> <urn:y> <urn:z> .\n',
+                                 f.read())
+            with open(path.join(repo.workdir, 'graph_0.nt'), 'r') as f:
+                self.assertEqual(content, f.read())
+
 
 class FileHandlingTests(unittest.TestCase):
     def testNewNamedGraph(self):
@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 
+import threading
 import unittest
 from context import quit
-from quit.cache import Cache, FileReference
+from quit.cache import BlobCache, Cache, FileReference, estimateSize
+from quit.namespace import XSD
+from rdflib import BNode, Graph, Literal, URIRef
 from os import path, environ
 from pygit2 import init_repository, Repository, clone_repository
 from pygit2 import GIT_SORT_TOPOLOGICAL, GIT_SORT_REVERSE, Signature
@@ -47,6 +50,184 @@ class CacheTests(unittest.TestCase):
         self.assertEqual(cache.get("key"), "value2")
         self.assertEqual(cache.size, 1)
 
+    def testCacheBudget(self):
+        cache = Cache(capacity=None, budget=100, sizeof=len)
+        cache.set("key1", "a" * 40)
+        cache.set("key2", "b" * 40)
+        cache.set("key3", "c" * 40)
+
+        self.assertNotIn("key1", cache)
+        self.assertEqual(cache.total, 80)
+        self.assertEqual(cache.evictions, 1)
+
+        # an entry larger than the budget is not cached and keeps the others
+        cache.set("key4", "d" * 200)
+        self.assertEqual(list(cache), ["key2", "key3"])
+        self.assertEqual(cache.total, 80)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.load("key4", lambda: "d" * 200), "d" * 200)
+        self.assertNotIn("key4", cache)
+
+        # the former value of its key is removed
+        cache.set("key2", "e" * 200)
+        self.assertEqual(list(cache), ["key3"])
+
+    def testCacheStatistics(self):
+        cache = Cache(capacity=2)
+        cache.set("key1", "value1")
+        cache.get("key1")
+        with self.assertRaises(KeyError):
+            cache.get("key2")
+        self.assertFalse("key2" in cache)
+
+        statistics = cache.statistics
+        self.assertEqual(statistics['hits'], 1)
+        self.assertEqual(statistics['misses'], 2)
+        self.assertAlmostEqual(statistics['hitrate'], 1 / 3)
+        self.assertEqual(statistics['evictions'], 0)
+        self.assertEqual(statistics['entries'], 1)
+
+    def testEvictedCallback(self):
+        evicted = []
+        cache = Cache(capacity=2, evicted=lambda key, value: evicted.append((key, value)))
+        cache.set("key1", "value1")
+        cache.set("key2", "value2")
+        cache.set("key3", "value3")
+        self.assertEqual(evicted, [("key1", "value1")])
+
+        cache.clear()
+        self.assertEqual(list(cache), [])
+        self.assertEqual(len(evicted), 1)
+
+    def testLFUPolicy(self):
+        cache = Cache(capacity=2, policy='lfu')
+        cache.set("key1", "value1")
+        cache.set("key2", "value2")
+        cache.get("key1")
+        cache.get("key1")
+        cache.get("key2")
+        cache.set("key3", "value3")
+
+        self.assertIn("key1", cache)
+        self.assertNotIn("key2", cache)
+
+    def testSizePolicy(self):
+        cache = Cache(capacity=None, budget=100, policy='size', sizeof=len)
+        cache.set("small", "a" * 10)
+        cache.set("large", "b" * 60)
+        cache.get("small")
+        cache.get("large")
+        cache.set("other", "c" * 40)
+
+        self.assertIn("small", cache)
+        self.assertNotIn("large", cache)
+
+    def testSingleFlightLoad(self):
+        cache = Cache()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def loader():
+            calls.append(threading.current_thread())
+            started.set()
+            release.wait(5)
+            return "value"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.load("key", loader)))
+                   for i in range(4)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["value"] * 4)
+        self.assertEqual(cache.load("key", lambda: self.fail("value was loaded again")), "value")
+
+    def testLoadError(self):
+        cache = Cache()
+
+        def loader():
+            raise KeyError("missing")
+
+        with self.assertRaises(KeyError):
+            cache.load("key", loader)
+        self.assertNotIn("key", cache)
+        self.assertEqual(cache.load("key", lambda: "value"), "value")
+
+    def testEstimateSize(self):
+        graph = Graph()
+        graph.add((URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')))
+        fileReference = FileReference('graph.nt', '<urn:x> <urn:y> <urn:z> .')
+
+        self.assertGreater(estimateSize(graph), estimateSize(Graph()))
+        self.assertGreater(estimateSize((fileReference, graph)), estimateSize(graph))
+
+
+class BlobCacheTests(unittest.TestCase):
+    triples = [
+        (URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')),
+        (URIRef('urn:x'), URIRef('urn:y'), Literal('z', lang='en')),
+        (BNode('b1'), URIRef('urn:y'), Literal('1', datatype=XSD.integer))
+    ]
+
+    def testSetAndGetEntry(self):
+        with TemporaryDirectory() as directory:
+            cache = BlobCache(directory)
+            lines = [
+                '<urn:x> <urn:y> <urn:z> .', '<urn:x> <urn:y> "z"@en .',
+                '_:b1 <urn:y> "1"^^<http://www.w3.org/2001/XMLSchema#integer> .'
+            ]
+            cache.set('0123456789abcdef', self.triples, lines)
+            self.assertIn('0123456789abcdef', cache)
+
+            triples, cachedLines = BlobCache(directory).get('0123456789abcdef')
+            self.assertEqual(triples, self.triples)
+            self.assertEqual(cachedLines, lines)
+
+    def testInvalidEntry(self):
+        with TemporaryDirectory() as directory:
+            cache = BlobCache(directory)
+            cache.set('0123456789abcdef', self.triples, ['<urn:x> <urn:y> <urn:z> .'])
+            with self.assertRaises(KeyError):
+                cache.get('0123456789abcdef')
+            self.assertNotIn('0123456789abcdef', cache)
+
+    def testDefaultCapacity(self):
+        with TemporaryDirectory() as directory:
+            cache = BlobCache(directory, None)
+            self.assertEqual(cache.capacity, quit.cache.BLOB_CACHE_CAPACITY)
+            cache.set('aa00', self.triples, ['', '', ''])
+            self.assertIn('aa00', cache)
+
+    def testMissingEntry(self):
+        with TemporaryDirectory() as directory:
+            cache = BlobCache(directory)
+            with self.assertRaises(KeyError):
+                cache.get('0123456789abcdef')
+
+    def testCapacity(self):
+        with TemporaryDirectory() as directory:
+            lines = ['', '', '']
+            cache = BlobCache(directory)
+            cache.set('aa00', self.triples, lines)
+            size = cache.total
+
+            cache = BlobCache(directory, capacity=2 * size)
+            cache.set('bb00', self.triples, lines)
+            cache.get('aa00')
+            cache.set('cc00', self.triples, lines)
+
+            self.assertEqual(cache.size, 2)
+            self.assertIn('aa00', cache)
+            self.assertNotIn('bb00', cache)
+            self.assertFalse(path.exists(path.join(directory, 'bb', '00')))
+
 
 class FileReferenceTests(unittest.TestCase):
     def setUp(self):
@@ -55,6 +236,45 @@ class FileReferenceTests(unittest.TestCase):
     def tearDown(self):
         pass
 
+    def testContent(self):
+        content = '<urn:x> <urn:y> <urn:z> .\n<urn:a> <urn:b> "c"@en .\n\n'
+        fileReference = FileReference('graph.nt', content, URIRef('urn:graph'))
+
+        self.assertEqual(fileReference.path, 'graph.nt')
+        self.assertEqual(fileReference.graph.identifier, URIRef('urn:graph'))
+        self.assertEqual(len(fileReference), 2)
+        self.assertEqual(
+            list(fileReference), ['<urn:a> <urn:b> "c"@en .', '<urn:x> <urn:y> <urn:z> .'])
+        self.assertEqual(
+            fileReference.content, '<urn:a> <urn:b> "c"@en .\n<urn:x> <urn:y> <urn:z> .\n')
+
+    def testModify(self):
+        fileReference = FileReference('graph.nt', '<urn:x> <urn:y> <urn:z> .')
+        fileReference.extend([
+            (URIRef('urn:a'), URIRef('urn:y'), URIRef('urn:z')),
+            (URIRef('urn:x'), URIRef('urn:y'), Literal('1', datatype=XSD.integer))
+        ])
+        fileReference.remove((URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')))
+
+        # the graph of the file reference and its lines are modified together
+        fileReference.graph.add((URIRef('urn:b'), URIRef('urn:y'), URIRef('urn:z')))
+        self.assertEqual(list(fileReference), [
+            '<urn:a> <urn:y> <urn:z> .',
+            '<urn:b> <urn:y> <urn:z> .',
+            '<urn:x> <urn:y> "1"^^<http://www.w3.org/2001/XMLSchema#integer> .'
+        ])
+
+        graph = fileReference.graph
+        self.assertEqual(
+            set(graph.subjects(URIRef('urn:y'), URIRef('urn:z'))),
+            {URIRef('urn:a'), URIRef('urn:b')})
+        self.assertEqual(len(list(graph.triples((URIRef('urn:x'), None, None)))), 1)
+        self.assertNotIn((URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')), graph)
+
+        graph.remove((None, URIRef('urn:y'), URIRef('urn:z')))
+        self.assertEqual(len(fileReference), 1)
+        self.assertEqual(len(list(fileReference)), 1)
+
 
 def main():
     unittest.main()
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import unittest
+from copy import copy
 from context import quit
 from glob import glob
 from os import remove
@@ -11,9 +12,10 @@ from quit.conf import QuitStoreConfiguration, QuitGraphConfiguration
 from quit.exceptions import MissingConfigurationError, InvalidConfigurationError
 from quit.exceptions import MissingFileError
 from distutils.dir_util import copy_tree, remove_tree
-from helpers import TemporaryRepository, TemporaryRepositoryFactory
+from helpers import TemporaryRepository, TemporaryRepositoryFactory, createCommit
 from tempfile import TemporaryDirectory, NamedTemporaryFile
 import rdflib
+import rdflib.compare
 
 try:
     DEFAULT_BRANCH = pygit2.Config.get_global_config()['init.defaultBranch']
@@ -194,6 +196,76 @@ class TestConfiguration(unittest.TestCase):
             self.assertEqual(conf.getgraphuriforfile('new_file.nt').n3(), '<http://aksw.org/>')
             self.assertEqual(conf.getserializationoffile('new_file.nt'), 'nt')
 
+    def testGraphConfigurationCopy(self):
+        content1 = '<urn:x> <urn:y> <urn:z> .'
+        repoContent = {'http://example.org/': content1}
+        with TemporaryRepositoryFactory().withGraphs(repoContent, 'configfile') as repo:
+            current_head = repo.head.shorthand
+            conf = QuitGraphConfiguration(repository=repo)
+            conf.initgraphconfig(current_head)
+
+            other = copy(conf)
+            self.assertIs(other.graphconf, conf.graphconf)
+            other.addgraph('http://aksw.org/', 'new_file.nt', 'nt')
+            self.assertIsNot(other.graphconf, conf.graphconf)
+
+            self.assertEqual(other.mode, 'configuration')
+            self.assertEqual(conf.getgraphurifilemap(), {
+                    rdflib.term.URIRef('http://example.org/'): 'graph_0.nt'})
+            self.assertEqual(other.getgraphurifilemap(), {
+                    rdflib.term.URIRef('http://aksw.org/'): 'new_file.nt',
+                    rdflib.term.URIRef('http://example.org/'): 'graph_0.nt'})
+            self.assertEqual(len(other.graphconf), len(conf.graphconf) + 4)
+            self.assertEqual(other.getgraphuriforfile('new_file.nt').n3(), '<http://aksw.org/>')
+            self.assertIsNone(conf.getgraphuriforfile('new_file.nt'))
+
+            # the original copies its data on modification as well
+            third = copy(conf)
+            conf.removegraph('http://example.org/')
+            self.assertEqual(conf.getgraphurifilemap(), {})
+            self.assertEqual(third.getfileforgraphuri('http://example.org/'), 'graph_0.nt')
+
+    def testGraphConfigurationSerializeAdditions(self):
+        content1 = '<urn:x> <urn:y> <urn:z> .'
+        repoContent = {'http://example.org/': content1}
+        with TemporaryRepositoryFactory().withGraphs(repoContent, 'configfile') as repo:
+            conf = QuitGraphConfiguration(repository=repo)
+            conf.initgraphconfig(repo.head.shorthand)
+            with open(join(repo.workdir, 'config.ttl'), 'r') as f:
+                configfile = f.read()
+            self.assertEqual(conf.serialize(), configfile)
+
+            other = copy(conf)
+            other.addgraph('http://aksw.org/', 'aksw.nt', 'nt')
+            other.addgraph('urn:graph', 'urn.nt', 'nt')
+            content = other.serialize()
+            self.assertTrue(content.startswith(configfile))
+
+            parsed = rdflib.Graph()
+            parsed.parse(data=content, format='turtle')
+            self.assertEqual(len(parsed), len(conf.graphconf) + 8)
+            self.assertTrue(rdflib.compare.isomorphic(parsed, other.graphconf))
+
+    def testGraphConfigurationSignature(self):
+        content1 = '<urn:x> <urn:y> <urn:z> .'
+        repoContent = {'http://example.org/': content1}
+        with TemporaryRepositoryFactory().withGraphs(repoContent) as repo:
+            conf = QuitGraphConfiguration(repository=repo)
+            first = conf.signature(conf.get_blobs_from_repository(repo.head.shorthand))
+
+            # changed content of a graph file does not change the signature
+            with open(join(repo.workdir, 'graph_0.nt'), 'w') as graphFile:
+                graphFile.write('<urn:x> <urn:y> <urn:z2> .')
+            createCommit(repo)
+            second = conf.signature(conf.get_blobs_from_repository(repo.head.shorthand))
+            self.assertEqual(first, second)
+
+            with open(join(repo.workdir, 'graph_0.nt.graph'), 'w') as graphFile:
+                graphFile.write('http://aksw.org/')
+            createCommit(repo)
+            third = conf.signature(conf.get_blobs_from_repository(repo.head.shorthand))
+            self.assertNotEqual(first, third)
+
     def testGraphConfigurationFailing(self):
         with TemporaryRepositoryFactory().withBothConfigurations() as repo:
             current_head = repo.head.shorthand
@@ -9,13 +9,17 @@ from context import quit
 import quit.core
 import quit.git
 import quit.conf
+import quit.checkpoint
+import quit.codec
+import quit.namespace
+from quit.cache import FileReference
 from quit.graphs import InMemoryAggregatedGraph
 from os import path, environ
 from pygit2 import init_repository, Repository, clone_repository
 from pygit2 import GIT_SORT_TOPOLOGICAL, GIT_SORT_REVERSE, Signature
-from rdflib import Graph, URIRef
+from rdflib import BNode, Graph, Literal, URIRef
 from tempfile import TemporaryDirectory, NamedTemporaryFile
-from helpers import TemporaryRepositoryFactory
+from helpers import TemporaryRepositoryFactory, createCommit
 
 
 class QueryableTests(unittest.TestCase):
@@ -117,6 +121,427 @@ class QuitTests(unittest.TestCase):
             quitInstance = quit.core.Quit(conf, quit.git.Repository(repo.path), None)
             self.assertTrue(quitInstance.getDefaultBranch() in ["main", "master"])
 
+    def testSyncWithCheckpoint(self):
+        content1 = '<urn:x> <urn:y> <urn:z> .\n<urn:x> <urn:y> "z"@en .'
+        repoContent = {'http://example.org/': content1}
+        with TemporaryRepositoryFactory().withGraphs(repoContent) as repo:
+            features = quit.conf.Feature.Provenance | quit.conf.Feature.Persistence
+            conf = quit.conf.QuitStoreConfiguration(
+                targetdir=repo.workdir, features=features, namespace='http://quit.instance/')
+            repository = quit.git.Repository(repo.workdir)
+
+            quitInstance = quit.core.Quit(conf, repository, quit.core.MemoryStore())
+            quitInstance.syncAll()
+            quads = set(quitInstance.store.store.quads((None, None, None)))
+            self.assertIn(quit.checkpoint.Checkpoint.reference, repo.listall_references())
+
+            restarted = quit.core.Quit(conf, repository, quit.core.MemoryStore())
+            restarted.changeset = lambda commit: self.fail("commit was replayed")
+            restarted.syncAll()
+            self.assertEqual(len(restarted.store.store), len(quitInstance.store.store))
+            self.assertEqual(
+                set((s, p, o, c.identifier) for s, p, o, c in quads if not isinstance(s, BNode)),
+                set((s, p, o, c.identifier) for s, p, o, c
+                    in restarted.store.store.quads((None, None, None))
+                    if not isinstance(s, BNode)))
+
+            del restarted.changeset
+            restarted.rebuild()
+            self.assertEqual(len(restarted.store.store), len(quitInstance.store.store))
+
+    def testInstanceWithBlobCache(self):
+        content1 = '<urn:x> <urn:y> <urn:z> .\n<urn:x> <urn:y> "z"@en .'
+        repoContent = {'http://example.org/': content1}
+        with TemporaryRepositoryFactory().withGraphs(repoContent) as repo:
+            with TemporaryDirectory() as directory:
+                conf = quit.conf.QuitStoreConfiguration(
+                    targetdir=repo.workdir, namespace='http://quit.instance/', features=0,
+                    blobcache=directory, blobcachesize=1024 * 1024)
+                repository = quit.git.Repository(repo.workdir)
+
+                quitInstance = quit.core.Quit(conf, repository, quit.core.MemoryStore())
+                graph, commitid = quitInstance.instance('HEAD')
+                self.assertEqual(quitInstance._blobcache.size, 0)
+                self.assertEqual(len(graph.store), 2)
+                self.assertEqual(quitInstance._blobcache.size, 1)
+
+                restarted = quit.core.Quit(conf, repository, quit.core.MemoryStore())
+                restarted._blobcache.set = lambda *args: self.fail("blob was parsed again")
+                cached, commitid = restarted.instance('HEAD')
+                self.assertEqual(
+                    set(graph.store.quads((None, None, None))),
+                    set(cached.store.quads((None, None, None))))
+                f, context = next(iter(restarted._blobs.stack.values()))
+                self.assertEqual(f.content, FileReference('graph_0.nt', content1).content)
+
+    def testInstanceWithBlobCacheWithoutSize(self):
+        repoContent = {'http://example.org/': '<urn:x> <urn:y> <urn:z> .'}
+        with TemporaryRepositoryFactory().withGraphs(repoContent) as repo:
+            with TemporaryDirectory() as directory:
+                conf = quit.conf.QuitStoreConfiguration(
+                    targetdir=repo.workdir, namespace='http://quit.instance/', features=0,
+                    blobcache=directory)
+                repository = quit.git.Repository(repo.workdir)
+
+                quitInstance = quit.core.Quit(conf, repository, quit.core.MemoryStore())
+                graph, commitid = quitInstance.instance('HEAD')
+                self.assertEqual(len(graph.store), 1)
+                self.assertEqual(quitInstance._blobcache.size, 1)
+                self.assertEqual(quitInstance._blobcache.capacity, quit.cache.BLOB_CACHE_CAPACITY)
+
+    def testCheckpointIgnoredForOtherFeatures(self):
+        content1 = '<urn:x> <urn:y> <urn:z> .'
+        repoContent = {'http://example.org/': content1}
+        with TemporaryRepositoryFactory().withGraphs(repoContent) as repo:
+            repository = quit.git.Repository(repo.workdir)
+            checkpoint = quit.checkpoint.Checkpoint(repository)
+            checkpoint.save(quit.conf.Feature.Provenance, [str(repo.head.target)], [])
+
+            self.assertIsNone(checkpoint.load(quit.conf.Feature.Persistence))
+            commits, quads, contexts = checkpoint.load(quit.conf.Feature.Provenance)
+            self.assertEqual(commits, set([str(repo.head.target)]))
+            self.assertEqual(list(quads), [])
+            self.assertEqual(list(contexts), [])
+
+            # each record is decoded once
+            decoded = []
+            loads = quit.codec.loads
+
+            def spy(buffer):
+                decoded.append(buffer)
+                return loads(buffer)
+
+            quit.codec.loads = spy
+            try:
+                commits, quads, contexts = checkpoint.load(quit.conf.Feature.Provenance)
+                list(quads), list(contexts)
+            finally:
+                quit.codec.loads = loads
+            self.assertEqual(len(decoded), 2)
+
+    def testInstanceWithPersistence(self):
+        content1 = '<urn:x> <urn:y> <urn:z> .\n<urn:x> <urn:y> "z"@en .'
+        repoContent = {'http://example.org/': content1}
+        with TemporaryRepositoryFactory().withGraphs(repoContent) as repo:
+            conf = quit.conf.QuitStoreConfiguration(
+                targetdir=repo.workdir, features=quit.conf.Feature.Persistence,
+                namespace='http://quit.instance/')
+            repository = quit.git.Repository(repo.workdir)
+
+            quitInstance = quit.core.Quit(conf, repository, quit.core.MemoryStore())
+            quitInstance.syncAll()
+
+            oid = next(iter(repo.revparse_single('HEAD').tree)).id
+            private_uri = quit.namespace.QUIT['graph-{}'.format(oid)]
+            store = quitInstance.store.store.store
+            self.assertEqual(store.virtualContexts(), [(private_uri, str(oid))])
+            self.assertEqual(store.__len__(private_uri), 2)
+            self.assertNotIn(private_uri, set(
+                c.identifier for triple, contexts
+                in store.triples((None, None, None), virtual=False) for c in contexts))
+            self.assertEqual(len(quitInstance.store.store.get_context(private_uri)), 2)
+            self.assertIn(private_uri, [c.identifier for c in quitInstance.store.store.contexts()])
+
+            graph, commitid = quitInstance.instance('HEAD')
+            expected, commitid = quitInstance.instance('HEAD', force=True)
+            self.assertEqual(
+                set(graph.store.quads((None, None, None))),
+                set(expected.store.quads((None, None, None))))
+            self.assertEqual(len(graph.store), 2)
+
+    def testProvenanceOfChangedGraphs(self):
+        repoContent = {'http://example.org/1/': '<urn:x> <urn:y> <urn:z> .',
+                       'http://example.org/2/': '<urn:x> <urn:y> <urn:z> .'}
+        with TemporaryRepositoryFactory().withGraphs(repoContent) as repo:
+            first = repo.revparse_single('HEAD')
+            with open(os.path.join(repo.workdir, 'graph_1.nt'), 'w') as graphFile:
+                graphFile.write('<urn:x> <urn:y> "z" .\n')
+            createCommit(repo)
+            second = repo.revparse_single('HEAD')
+
+            conf = quit.conf.QuitStoreConfiguration(
+                targetdir=repo.workdir, features=quit.conf.Feature.Provenance,
+                namespace='http://quit.instance/')
+            quitInstance = quit.core.Quit(
+                conf, quit.git.Repository(repo.workdir), quit.core.MemoryStore())
+            quitInstance.syncAll()
+
+            QUIT = quit.namespace.QUIT
+            PROV = quit.namespace.PROV
+            g = quitInstance.store.store
+            unchanged = QUIT['graph-{}'.format(second.tree['graph_0.nt'].id)]
+            changed = QUIT['graph-{}'.format(second.tree['graph_1.nt'].id)]
+            previous = QUIT['graph-{}'.format(first.tree['graph_1.nt'].id)]
+
+            self.assertEqual(
+                list(g.objects(unchanged, PROV['wasGeneratedBy'])),
+                [QUIT['commit-{}'.format(first.id)]])
+            self.assertEqual(
+                list(g.objects(changed, PROV['wasGeneratedBy'])),
+                [QUIT['commit-{}'.format(second.id)]])
+            self.assertEqual(list(g.objects(changed, PROV['wasDerivedFrom'])), [previous])
+            self.assertIn(previous, list(g.subjects(PROV['specializationOf'],
+                                                    URIRef('http://example.org/2/'))))
+
+    def testParallelSync(self):
+        repoContent = {'http://example.org/1/': '<urn:x> <urn:y> <urn:z> .',
+                       'http://example.org/2/': '<urn:x> <urn:y> <urn:z> .'}
+        with TemporaryRepositoryFactory().withGraphs(repoContent) as repo:
+            for i in range(4):
+                with open(os.path.join(repo.workdir, 'graph_{}.nt'.format(i % 2)), 'a') as f:
+                    f.write('\n<urn:x> <urn:y> "{}" .'.format(i))
+                createCommit(repo)
+
+            stores = []
+            for workers in (1, 2):
+                conf = quit.conf.QuitStoreConfiguration(
+                    targetdir=repo.workdir, features=quit.conf.Feature.Provenance,
+                    namespace='http://quit.instance/', syncworkers=workers)
+                quitInstance = quit.core.Quit(
+                    conf, quit.git.Repository(repo.workdir), quit.core.MemoryStore())
+                quitInstance.syncAll()
+                self.assertEqual(len(quitInstance._synced), 5)
+                stores.append(set(
+                    (s, p, o, c.identifier) for s, p, o, c
+                    in quitInstance.store.store.quads((None, None, None))
+                    if not isinstance(s, BNode) and not isinstance(o, BNode)))
+
+            self.assertEqual(stores[0], stores[1])
+            additions = [q for q in stores[1] if q[2] == Literal('3')]
+            self.assertEqual(len(additions), 1)
+
+    def testInstanceWithVersionIndex(self):
+        content1 = '<urn:x> <urn:y> <urn:z> .\n<urn:x> <urn:y> "z"@en .'
+        content2 = '<urn:x> <urn:y> <urn:z> .\n<urn:x> <urn:y> "z2"@en .'
+        repoContent = {'http://example.org/': content1}
+        with TemporaryRepositoryFactory().withGraphs(repoContent) as repo:
+            first = str(repo.head.target)
+            with open(os.path.join(repo.workdir, 'graph_0.nt'), 'w') as graphFile:
+                graphFile.write(content2)
+            createCommit(repo)
+
+            conf = quit.conf.QuitStoreConfiguration(
+                targetdir=repo.workdir, features=quit.conf.Feature.VersionIndex,
+                namespace='http://quit.instance/')
+            quitInstance = quit.core.Quit(
+                conf, quit.git.Repository(repo.workdir), quit.core.MemoryStore())
+            quitInstance.syncAll()
+            self.assertEqual(quitInstance.index.size, (3, 3))
+
+            for reference in (first, 'HEAD'):
+                graph, commitid = quitInstance.instance(reference)
+                expected, commitid = quitInstance.instance(reference, force=True)
+                self.assertEqual(
+                    set(graph.store.quads((None, None, None))),
+                    set(expected.store.quads((None, None, None))))
+                self.assertEqual(len(graph.store), 2)
+
+    def testInstanceSnapshot(self):
+        content1 = '<urn:x> <urn:y> <urn:z> .'
+        content2 = '<urn:x> <urn:y> <urn:z2> .'
+        repoContent = {'http://example.org/': content1}
+        with TemporaryRepositoryFactory().withGraphs(repoContent) as repo:
+            conf = quit.conf.QuitStoreConfiguration(
+                targetdir=repo.workdir, features=quit.conf.Feature.Unknown,
+                namespace='http://quit.instance/')
+            quitInstance = quit.core.Quit(
+                conf, quit.git.Repository(repo.workdir), quit.core.MemoryStore())
+
+            graph, commitid = quitInstance.instance('HEAD')
+            same, sameid = quitInstance.instance(commitid)
+            self.assertIs(graph, same)
+            self.assertEqual(len(graph.store), 1)
+            forced, forcedid = quitInstance.instance('HEAD', force=True)
+            self.assertIsNot(graph, forced)
+
+            # a new commit is a new snapshot
+            with open(os.path.join(repo.workdir, 'graph_0.nt'), 'w') as graphFile:
+                graphFile.write(content2)
+            createCommit(repo)
+            other, otherid = quitInstance.instance('HEAD')
+            self.assertNotEqual(commitid, otherid)
+            self.assertIsNot(graph, other)
+            self.assertEqual(
+                list(other.store.quads((None, None, None)))[0][2], URIRef('urn:z2'))
+
+            # evicting a blob does not use the other snapshots
+            same, sameid = quitInstance.instance(commitid)
+            snapshots = quitInstance._snapshots
+            order = list(snapshots.policy._order)
+            statistics = snapshots.statistics
+            self.assertEqual(order, [otherid, commitid])
+            quitInstance._dropSnapshots(('missing.nt', None), None)
+            self.assertEqual(list(snapshots.policy._order), order)
+            self.assertEqual(snapshots.statistics, statistics)
+
+            # snapshots are dropped with the blobs they use
+            for blob in list(quitInstance._blobs):
+                quitInstance._dropSnapshots(blob, None)
+            self.assertEqual(len(list(quitInstance._snapshots)), 0)
+
+    def testGraphConfigReuse(self):
+        repoContent = {'http://example.org/': '<urn:x> <urn:y> <urn:z> .'}
+        with TemporaryRepositoryFactory().withGraphs(repoContent, 'configfile') as repo:
+            first = str(repo.head.target)
+            with open(os.path.join(repo.workdir, 'graph_0.nt'), 'w') as graphFile:
+                graphFile.write('<urn:x> <urn:y> <urn:z2> .')
+            createCommit(repo)
+
+            conf = quit.conf.QuitStoreConfiguration(
+                targetdir=repo.workdir, features=quit.conf.Feature.Unknown,
+                namespace='http://quit.instance/')
+            quitInstance = quit.core.Quit(
+                conf, quit.git.Repository(repo.workdir), quit.core.MemoryStore())
+
+            head = quitInstance.repository.revision('HEAD').id
+            self.assertIs(quitInstance.getGraphConfig(first), quitInstance.getGraphConfig(head))
+
+    def testMaterializeBlob(self):
+        lines = ['<urn:x{}> <urn:y> "{}" .'.format(i, i) for i in range(30)]
+        repoContent = {'http://example.org/': '\n'.join(lines) + '\n'}
+        with TemporaryRepositoryFactory().withGraphs(repoContent, 'configfile') as repo:
+            first = str(repo.head.target)
+            changed = sorted(lines[1:] + ['<urn:x> <urn:y> <urn:z> .'])
+            with open(os.path.join(repo.workdir, 'graph_0.nt'), 'w') as graphFile:
+                graphFile.write('\n'.join(changed) + '\n')
+            createCommit(repo)
+
+            conf = quit.conf.QuitStoreConfiguration(
+                targetdir=repo.workdir, features=quit.conf.Feature.Unknown,
+                namespace='http://quit.instance/')
+            quitInstance = quit.core.Quit(
+                conf, quit.git.Repository(repo.workdir), quit.core.MemoryStore())
+
+            materialized = []
+            materializeBlob = quitInstance._materializeBlob
+
+            def spy(*args):
+                result = materializeBlob(*args)
+                materialized.append(result is not None)
+                return result
+
+            quitInstance._materializeBlob = spy
+            graph, commitid = quitInstance.instance('HEAD')
+            self.assertEqual(len(graph.store), 30)
+            self.assertEqual(materialized, [False])
+
+            graph, commitid = quitInstance.instance(first)
+            self.assertEqual(len(graph.store), 30)
+            self.assertEqual(materialized, [False, True])
+
+            commit = quitInstance.repository.revision(first)
+            blob = next(iter(quitInstance.getFilesForCommit(commit)))
+            f, context = quitInstance.getFileReferenceAndContext(blob, commit)
+            self.assertEqual(f.content, '\n'.join(sorted(lines)) + '\n')
+            self.assertEqual(context.identifier, URIRef('http://example.org/'))
+            self.assertEqual(len(graph.store), 30)
+            self.assertIn(
+                (URIRef('urn:x0'), URIRef('urn:y'), Literal('0')), graph.store)
+
+            # a blob is only decoded if there is a version of similar size to start from
+            invalid = memoryview(b'\xff' * 10)
+            self.assertIsNone(materializeBlob('other.nt', None, 'urn:g', invalid))
+            self.assertIsNone(materializeBlob(blob[0], None, 'urn:g', invalid))
+            self.assertEqual(quit.core._estimateLines(f, len(f.content)), 30)
+
+    def testDeltaOfChangedFilesOnly(self):
+        repoContent = {
+            'http://example.org/{}/'.format(i): '<urn:x> <urn:y> "{}" .'.format(i)
+            for i in range(4)
+        }
+        with TemporaryRepositoryFactory().withGraphs(repoContent) as repo:
+            conf = quit.conf.QuitStoreConfiguration(
+                targetdir=repo.workdir, features=quit.conf.Feature.Unknown,
+                namespace='http://quit.instance/')
+            repository = quit.git.Repository(repo.workdir)
+            quitInstance = quit.core.Quit(conf, repository, quit.core.MemoryStore())
+            changed, deleted = 'graph_1.nt', 'graph_2.nt'
+
+            with open(os.path.join(repo.workdir, changed), 'w') as f:
+                f.write('<urn:x> <urn:y> "changed" .\n')
+            repo.index.read()
+            for name in (deleted, deleted + '.graph'):
+                os.remove(os.path.join(repo.workdir, name))
+                repo.index.remove(name)
+            repo.index.write()
+            createCommit(repo)
+
+            loaded = []
+            getFileReferenceAndContext = quitInstance.getFileReferenceAndContext
+
+            def spy(blob, commit):
+                loaded.append(blob[0])
+                return getFileReferenceAndContext(blob, commit)
+
+            quitInstance.getFileReferenceAndContext = spy
+            delta = quitInstance.delta(repository.revision('HEAD'))
+            self.assertEqual(sorted(loaded), sorted([changed, changed, deleted]))
+            self.assertEqual(dict((iri, [(op, set(triples)) for op, triples in changesets])
+                                  for iri, changesets in delta.items()), {
+                URIRef('http://example.org/1/'): [
+                    ('additions', {(URIRef('urn:x'), URIRef('urn:y'), Literal('changed'))}),
+                    ('removals', {(URIRef('urn:x'), URIRef('urn:y'), Literal('1'))})
+                ],
+                URIRef('http://example.org/2/'): [
+                    ('removals', {(URIRef('urn:x'), URIRef('urn:y'), Literal('2'))})
+                ]
+            })
+
+    def testUpdateChangedGraphsOnly(self):
+        repoContent = {
+            'http://example.org/': '<urn:x> <urn:y> <urn:z> .',
+            'http://example.org/other/': '<urn:a> <urn:b> <urn:c> .'
+        }
+        with TemporaryRepositoryFactory().withGraphs(repoContent, 'configfile') as repo:
+            conf = quit.conf.QuitStoreConfiguration(
+                configfile=os.path.join(repo.workdir, 'config.ttl'),
+                features=quit.conf.Feature.Unknown, namespace='http://quit.instance/')
+            quitInstance = quit.core.Quit(
+                conf, quit.git.Repository(repo.workdir), quit.core.MemoryStore())
+            branch = 'refs/heads/{}'.format(quitInstance.getDefaultBranch())
+
+            graph, commitid = quitInstance.instance('HEAD', force=True)
+            graph.update('INSERT DATA { GRAPH <http://example.org/> { <urn:1> <urn:2> <urn:3> } }')
+            self.assertEqual(len(graph.store), 3)
+
+            # the cached graphs are not modified by the update
+            snapshot, commitid = quitInstance.instance('HEAD')
+            self.assertEqual(len(snapshot.store), 2)
+
+            loaded = []
+            getFileReferenceAndContext = quitInstance.getFileReferenceAndContext
+
+            def spy(blob, commit):
+                loaded.append(blob[0])
+                return getFileReferenceAndContext(blob, commit)
+
+            quitInstance.getFileReferenceAndContext = spy
+            graph.store.remove((URIRef('urn:x'), None, None, None))
+            quitInstance.commit(
+                graph, [{'type': 'INSERT', 'delta': graph.store.changes()}], 'Update', 'HEAD',
+                branch)
+            self.assertEqual(loaded, ['graph_0.nt'])
+
+            # the commit does not modify the graphs of the parent commit either
+            self.assertEqual(len(snapshot.store), 2)
+            parent, parentid = quitInstance.instance(commitid)
+            self.assertIs(parent, snapshot)
+            self.assertIn(
+                (URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')),
+                parent.store.get_context(URIRef('http://example.org/')))
+
+            quitInstance.getFileReferenceAndContext = getFileReferenceAndContext
+            graph, newid = quitInstance.instance('HEAD')
+            self.assertNotEqual(newid, commitid)
+            self.assertEqual(
+                set(graph.store.quads((None, None, None))),
+                set([(URIRef('urn:a'), URIRef('urn:b'), URIRef('urn:c'),
+                      graph.store.get_context(URIRef('http://example.org/other/'))),
+                     (URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3'),
+                      graph.store.get_context(URIRef('http://example.org/')))]))
+            self.assertEqual(
+                len(quitInstance.getFilesForCommit(quitInstance.repository.revision('HEAD'))), 2)
+
 
 class SeveralOldTest(unittest.TestCase):
     """Sort these test according to their corresponding classes."""
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import os
 import unittest
 from context import quit
 import quit.git
@@ -26,6 +27,72 @@ class GitRevisionTests(unittest.TestCase):
     def tearDown(self):
         pass
 
+    def testChanges(self):
+        graphs = {'http://example.org/1/': '<urn:x> <urn:y> <urn:z> .',
+                  'http://example.org/2/': '<urn:x> <urn:y> <urn:z> .'}
+        with TemporaryRepositoryFactory().withGraphs(graphs) as repo:
+            repository = quit.git.Repository(repo.workdir)
+            first = repository.revision('HEAD')
+            self.assertEqual(
+                sorted(path for path, oid, parent in first.changes()),
+                ['graph_0.nt', 'graph_0.nt.graph', 'graph_1.nt', 'graph_1.nt.graph'])
+            self.assertTrue(all(parent is None for path, oid, parent in first.changes()))
+
+            with open(path.join(repo.workdir, 'graph_1.nt'), 'w') as graphFile:
+                graphFile.write('<urn:x> <urn:y> "z" .\n')
+            createCommit(repo)
+
+            second = repository.revision('HEAD')
+            self.assertEqual(second.changes(), [(
+                'graph_1.nt', second._commit.tree['graph_1.nt'].id,
+                first._commit.tree['graph_1.nt'].id)])
+
+    def testFiles(self):
+        graphs = {'http://example.org/1/': '<urn:x> <urn:y> <urn:z> .'}
+        with TemporaryRepositoryFactory().withGraphs(graphs) as repo:
+            os.makedirs(path.join(repo.workdir, 'sub', 'dir'))
+            with open(path.join(repo.workdir, 'sub', 'dir', 'graph.nt'), 'w') as graphFile:
+                graphFile.write('<urn:x> <urn:y> "z" .\n')
+            index = repo.index
+            index.read()
+            index.add('sub/dir/graph.nt')
+            index.write()
+            author = Signature('QuitStoreTest', 'quit@quit.aksw.org')
+            repo.create_commit(
+                'HEAD', author, author, 'Add sub directory', index.write_tree(),
+                [repo.head.target])
+
+            repository = quit.git.Repository(repo.workdir)
+            commit = repository.revision('HEAD')
+            files = {path: (oid, mode) for path, oid, mode in commit.files()}
+            self.assertEqual(
+                sorted(files), ['graph_0.nt', 'graph_0.nt.graph', 'sub/dir/graph.nt'])
+            self.assertEqual(
+                files['sub/dir/graph.nt'],
+                (commit._commit.tree['sub/dir/graph.nt'].id, pygit2.GIT_FILEMODE_BLOB))
+
+            # the records of unchanged trees are memoized
+            subtree = commit._commit.tree['sub']
+            self.assertIn(subtree.id, repository.trees._entries)
+            self.assertIs(commit.files(), repository.revision('HEAD').files())
+
+
+    def testTreesBudget(self):
+        graphs = {'http://example.org/1/': '<urn:x> <urn:y> <urn:z> .'}
+        with TemporaryRepositoryFactory().withGraphs(graphs) as repo:
+            trees = quit.git.Trees(repo, budget=5)
+            for i in range(4):
+                with open(path.join(repo.workdir, 'graph_0.nt'), 'w') as graphFile:
+                    graphFile.write('<urn:x> <urn:y> "{}" .\n'.format(i))
+                createCommit(repo)
+
+                # every commit has a new root tree with two records
+                records = trees.entries(repo.revparse_single('HEAD').tree)
+                self.assertEqual(
+                    sorted(path for path, oid, mode in records), ['graph_0.nt', 'graph_0.nt.graph'])
+                self.assertLessEqual(trees._entries.total, 5)
+            self.assertEqual(trees._entries.size, 2)
+
 
 class GitIndexTests(unittest.TestCase):
 
@@ -758,6 +825,29 @@ class GitRepositoryTests(unittest.TestCase):
         repo = quit.git.Repository(self.dir.name)
         self.assertFalse(repo.is_empty)
 
+    def testReferences(self):
+        self.createcommit()
+        repo = quit.git.Repository(self.dir.name)
+        head = repo.revision('HEAD').id
+        self.assertEqual(repo.branches, [DEFAULT_BRANCH])
+        self.assertEqual(repo.current_head, DEFAULT_BRANCH)
+
+        repo.branch(DEFAULT_BRANCH, 'develop')
+        self.assertEqual(repo.branches, ['develop', DEFAULT_BRANCH])
+        self.assertEqual(str(repo.lookup('develop')), head)
+
+        # references changed by another process are found
+        other = Repository(self.dir.name)
+        other.create_reference('refs/tags/v1', other.head.target)
+        self.assertEqual(repo.tags, ['v1'])
+        self.assertEqual(repo.revision('v1').id, head)
+
+        self.assertTrue(repo.delete_branch('develop'))
+        self.assertFalse(repo.delete_branch('develop'))
+        self.assertEqual(repo.branches, [DEFAULT_BRANCH])
+        with self.assertRaises(RevisionNotFound):
+            repo.revision('develop')
+
     def testRepositoryIsBare(self):
         """Test if is_bare is currently done in init/clone tests."""
         pass
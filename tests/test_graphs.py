@@ -1,13 +1,17 @@
 #!/usr/bin/env python3
 
+import threading
+import time
 import unittest
 from context import quit
-from quit.graphs import RewriteGraph, CopyOnEditGraph
+from quit.graphs import RewriteGraph, OverlayGraph
 from quit.graphs import InMemoryAggregatedGraph, InMemoryCopyOnEditAggregatedGraph
+from quit.graphs import NTriplesStore, VirtualContextStore
 from os import path, environ
 from pygit2 import init_repository, Repository, clone_repository
 from pygit2 import GIT_SORT_TOPOLOGICAL, GIT_SORT_REVERSE, Signature
-from rdflib import Graph, URIRef
+from rdflib import ConjunctiveGraph, Graph, URIRef
+from rdflib.graph import ModificationException
 from tempfile import TemporaryDirectory, NamedTemporaryFile
 
 
@@ -19,13 +23,133 @@ class RewriteGraphTests(unittest.TestCase):
         pass
 
 
-class CopyOnEditGraphTests(unittest.TestCase):
+class OverlayGraphTests(unittest.TestCase):
     def setUp(self):
+        self.base = Graph(identifier=URIRef('urn:graph'))
+        self.base.add((URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')))
+        self.base.add((URIRef('urn:a'), URIRef('urn:b'), URIRef('urn:c')))
+        self.graph = OverlayGraph(self.base)
+
+    def tearDown(self):
         pass
 
+    def testRead(self):
+        self.assertEqual(self.graph.identifier, URIRef('urn:graph'))
+        self.assertEqual(len(self.graph), 2)
+        self.assertEqual(set(self.graph), set(self.base))
+        self.assertEqual(self.graph.changes(), [])
+
+    def testModify(self):
+        added = (URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3'))
+        self.graph.add(added)
+        self.graph.add((URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')))
+        self.graph.remove((URIRef('urn:a'), None, None))
+
+        self.assertEqual(len(self.graph), 2)
+        self.assertIn(added, self.graph)
+        self.assertNotIn((URIRef('urn:a'), URIRef('urn:b'), URIRef('urn:c')), self.graph)
+        self.assertEqual(set(self.graph.triples((None, URIRef('urn:2'), None))), set([added]))
+        self.assertEqual(self.graph.changes(), [
+            ('removals', [(URIRef('urn:a'), URIRef('urn:b'), URIRef('urn:c'))]),
+            ('additions', [added])
+        ])
+
+        # the base graph is not modified
+        self.assertEqual(len(self.base), 2)
+        self.assertNotIn(added, self.base)
+
+    def testRevert(self):
+        added = (URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3'))
+        self.graph.add(added)
+        self.graph.remove(added)
+        self.graph.remove((URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')))
+        self.graph.add((URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')))
+
+        self.assertEqual(set(self.graph), set(self.base))
+        self.assertEqual(self.graph.changes(), [])
+
+
+class VirtualContextStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.blob = Graph()
+        self.blob.add((URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')))
+        self.blob.add((URIRef('urn:a'), URIRef('urn:b'), URIRef('urn:c')))
+        self.resolved = []
+        self.store = VirtualContextStore(resolver=self.resolve)
+        self.graph = ConjunctiveGraph(store=self.store)
+        self.graph.add((URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z'), URIRef('urn:real')))
+        self.store.addVirtualContext(URIRef('urn:virtual'), 'blob')
+
     def tearDown(self):
         pass
 
+    def resolve(self, key):
+        self.resolved.append(key)
+        return self.blob
+
+    def testReadVirtualContext(self):
+        context = self.graph.get_context(URIRef('urn:virtual'))
+        self.assertEqual(len(context), 2)
+        self.assertEqual(set(context), set(self.blob))
+        self.assertEqual(
+            set(c.identifier for c in self.graph.contexts()),
+            set([URIRef('urn:real'), URIRef('urn:virtual')]))
+
+    def testUnion(self):
+        self.assertEqual(len(self.graph), 2)
+        contexts = self.graph.contexts((URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')))
+        self.assertEqual(
+            set(c.identifier for c in contexts), set([URIRef('urn:real'), URIRef('urn:virtual')]))
+        real = list(self.store.triples((None, None, None), virtual=False))
+        self.assertEqual(len(real), 1)
+
+    def testUnionLikeStoredContexts(self):
+        # the union of virtual contexts is the same as if their triples were in the store
+        queried = []
+
+        class Spy(NTriplesStore):
+            def triples(self, triple_pattern, context=None):
+                queried.append(triple_pattern)
+                return super().triples(triple_pattern, context)
+
+        self.blob = Graph(store=Spy())
+        self.blob.add((URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')))
+        self.blob.add((URIRef('urn:a'), URIRef('urn:b'), URIRef('urn:c')))
+        self.graph.add((URIRef('urn:1'), URIRef('urn:y'), URIRef('urn:z'), URIRef('urn:real')))
+        stored = ConjunctiveGraph()
+        stored.addN((s, p, o, URIRef('urn:real')) for s, p, o in [
+            (URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')),
+            (URIRef('urn:1'), URIRef('urn:y'), URIRef('urn:z'))])
+        stored.addN((s, p, o, URIRef('urn:virtual')) for s, p, o in self.blob)
+        stored.default_union = self.graph.default_union = True
+
+        for query in [
+            'SELECT ?s ?p ?o WHERE { ?s ?p ?o }',
+            'SELECT ?s WHERE { ?s <urn:y> <urn:z> }',
+            'SELECT ?s WHERE { ?s <urn:b> ?o }',
+            'SELECT ?g ?s WHERE { GRAPH ?g { ?s ?p ?o } }',
+            'SELECT (COUNT(*) AS ?c) WHERE { ?s ?p ?o }'
+        ]:
+            self.assertEqual(
+                sorted(self.graph.query(query)), sorted(stored.query(query)), query)
+        self.assertEqual(len(self.graph), len(stored))
+
+        # the blob can't contain urn:q, thus its triples are not read
+        del queried[:]
+        self.assertEqual(list(self.graph.triples((None, URIRef('urn:q'), None))), [])
+        self.assertEqual(queried, [])
+
+    def testModifyVirtualContext(self):
+        context = self.graph.get_context(URIRef('urn:virtual'))
+        with self.assertRaises(ModificationException):
+            context.add((URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3')))
+        with self.assertRaises(ModificationException):
+            context.remove((URIRef('urn:x'), None, None))
+
+        self.graph.remove_context(context)
+        self.assertEqual(self.store.virtualContexts(), [])
+        self.assertEqual(len(self.graph), 1)
+
 
 class InMemoryAggregatedGraphTests(unittest.TestCase):
     def setUp(self):
@@ -73,14 +197,183 @@ class InMemoryAggregatedGraphTests(unittest.TestCase):
         self.assertEqual(len(g), 0)
         self.assertEqual(str(g.identifier), 'urn:graph')
 
+    def testLoadGraphsOnAccess(self):
+        loaded = []
+
+        def loader(identifier):
+            def load():
+                loaded.append(identifier)
+                g = Graph(identifier=URIRef(identifier))
+                g.add((URIRef('urn:1'), URIRef('urn:2'), URIRef(identifier)))
+                return g
+            return load
+
+        iGraph = InMemoryAggregatedGraph(loaders=[
+            (URIRef('urn:graph1'), loader('urn:graph1')),
+            (URIRef('urn:graph2'), loader('urn:graph2')),
+            (URIRef('urn:missing'), lambda: None)
+        ])
+        self.assertEqual(loaded, [])
+
+        g = iGraph.get_context(URIRef('urn:graph2'))
+        self.assertEqual(len(g), 1)
+        self.assertIs(iGraph.get_context('urn:graph2'), g)
+        self.assertEqual(loaded, ['urn:graph2'])
+
+        self.assertEqual(len(iGraph), 2)
+        self.assertEqual(loaded, ['urn:graph2', 'urn:graph1'])
+        self.assertEqual(len(iGraph.contexts()), 2)
+
+    def testLoadGraphsConcurrently(self):
+        loaded = []
+
+        def loader(identifier):
+            def load():
+                loaded.append(identifier)
+                time.sleep(0.001)
+                return Graph(identifier=identifier)
+            return load
+
+        identifiers = [URIRef('urn:graph{}'.format(i)) for i in range(20)]
+        iGraph = InMemoryAggregatedGraph(loaders=[(i, loader(i)) for i in identifiers])
+        errors = []
+
+        def contexts():
+            try:
+                self.assertEqual(len(iGraph.contexts()), 20)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=contexts) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        # concurrent loads of a graph may both run its loader, one of the graphs is kept
+        self.assertEqual(set(loaded), set(identifiers))
+        self.assertEqual(sorted(g.identifier for g in iGraph.contexts()), sorted(identifiers))
+
+
+    def testLoadGraphsWithoutBlocking(self):
+        # a slow graph does not block loading another graph of the dataset
+        loadingSlow = threading.Event()
+        loadedOther = threading.Event()
+        waited = []
+
+        def loadSlow():
+            loadingSlow.set()
+            waited.append(loadedOther.wait(5))
+            return Graph(identifier=URIRef('urn:slow'))
+
+        def loadOther():
+            loadedOther.set()
+            return Graph(identifier=URIRef('urn:other'))
+
+        iGraph = InMemoryAggregatedGraph(loaders=[
+            (URIRef('urn:slow'), loadSlow), (URIRef('urn:other'), loadOther)])
+        thread = threading.Thread(target=iGraph.get_context, args=(URIRef('urn:slow'),))
+        thread.start()
+        loadingSlow.wait(5)
+        self.assertEqual(iGraph.get_context(URIRef('urn:other')).identifier, URIRef('urn:other'))
+        thread.join()
+        self.assertEqual(waited, [True])
+        self.assertEqual(len(iGraph.contexts()), 2)
+
+    def testSendPatternsToMatchingGraphs(self):
+        queried = []
+
+        class Spy(NTriplesStore):
+            def triples(self, triple_pattern, context=None):
+                queried.append(self)
+                return super().triples(triple_pattern, context)
+
+        graphs = []
+        for i in range(3):
+            g = Graph(store=Spy(), identifier=URIRef('urn:graph{}'.format(i)))
+            g.add((URIRef('urn:s{}'.format(i)), URIRef('urn:p'), URIRef('urn:o')))
+            graphs.append(g)
+        iGraph = InMemoryAggregatedGraph(graphs=graphs)
+
+        self.assertEqual(
+            list(iGraph.triples((URIRef('urn:s1'), None, None))),
+            [(URIRef('urn:s1'), URIRef('urn:p'), URIRef('urn:o'))])
+        self.assertEqual(queried, [graphs[1].store])
+        self.assertEqual(
+            [c.identifier for c in iGraph.contexts((URIRef('urn:s2'), URIRef('urn:p'), None))],
+            [URIRef('urn:graph2')])
+        self.assertNotIn((URIRef('urn:s3'), URIRef('urn:p'), URIRef('urn:o')), iGraph)
+
+        # terms added later are found
+        graphs[0].add((URIRef('urn:s3'), URIRef('urn:p'), URIRef('urn:o')))
+        self.assertIn((URIRef('urn:s3'), URIRef('urn:p'), URIRef('urn:o')), iGraph)
+        self.assertEqual(len(list(iGraph.triples((None, URIRef('urn:p'), None)))), 4)
+        self.assertIs(iGraph.get_context('urn:graph2'), graphs[2])
 
 class InMemoryCopyOnEditAggregatedGraphTests(unittest.TestCase):
     def setUp(self):
-        pass
+        self.base = Graph(identifier=URIRef('urn:graph'))
+        self.base.add((URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z')))
 
     def tearDown(self):
         pass
 
+    def testChanges(self):
+        iGraph = InMemoryCopyOnEditAggregatedGraph(
+            loaders=[(URIRef('urn:graph'), lambda: self.base)])
+        iGraph.addN([
+            (URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3'), URIRef('urn:graph')),
+            (URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3'), URIRef('urn:new'))
+        ])
+        iGraph.remove((URIRef('urn:x'), None, None, None))
+
+        self.assertEqual(len(iGraph), 2)
+        self.assertEqual(len(self.base), 1)
+        self.assertEqual(dict(iGraph.changes()), {
+            URIRef('urn:graph'): [
+                ('removals', [(URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z'))]),
+                ('additions', [(URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3'))])
+            ],
+            URIRef('urn:new'): [
+                ('additions', [(URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3'))])
+            ]
+        })
+
+    def testChangesOfLoadedGraphs(self):
+        loaded = []
+
+        def loader(identifier):
+            def load():
+                loaded.append(identifier)
+                return Graph(identifier=identifier)
+            return load
+
+        iGraph = InMemoryCopyOnEditAggregatedGraph(loaders=[
+            (URIRef('urn:graph'), lambda: self.base),
+            (URIRef('urn:other'), loader(URIRef('urn:other')))
+        ])
+        iGraph.update('INSERT DATA { GRAPH <urn:graph> { <urn:1> <urn:2> <urn:3> } }')
+
+        self.assertEqual(dict(iGraph.changes()), {
+            URIRef('urn:graph'): [
+                ('additions', [(URIRef('urn:1'), URIRef('urn:2'), URIRef('urn:3'))])
+            ]
+        })
+        self.assertEqual(loaded, [])
+
+    def testUpdate(self):
+        iGraph = InMemoryCopyOnEditAggregatedGraph(graphs=[self.base])
+        iGraph.update('INSERT DATA { GRAPH <urn:graph> { <urn:1> <urn:2> <urn:3> } }')
+        iGraph.remove_context(URIRef('urn:graph'))
+
+        self.assertEqual(len(iGraph.get_context(URIRef('urn:graph'))), 0)
+        self.assertEqual(len(self.base), 1)
+        self.assertEqual(dict(iGraph.changes()), {
+            URIRef('urn:graph'): [
+                ('removals', [(URIRef('urn:x'), URIRef('urn:y'), URIRef('urn:z'))])
+            ]
+        })
+
 
 def main():
     unittest.main()
@@ -4,7 +4,9 @@ import unittest
 from context import quit
 from itertools import chain
 from quit.helpers import configure_query_dataset, configure_update_dataset
-from quit.helpers import parse_query_type, parse_update_type
+from quit.helpers import parse_query_type, parse_update_type, normalize_query
+from quit.helpers import is_deterministic_query, query_graphs
+from quit.cache import Cache
 from quit.exceptions import SparqlProtocolError, NonAbsoluteBaseError, UnSupportedQuery
 from rdflib import URIRef
 from rdflib.plugins.sparql.parser import parseQuery, parseUpdate
@@ -184,6 +186,88 @@ class QueryTypeTests(unittest.TestCase):
             self.assertEqual(queryType, expected, update)
 
 
+
+class TranslationCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = Cache()
+
+    def tearDown(self):
+        pass
+
+    def testNormalizeQuery(self):
+        self.assertEqual(
+            normalize_query('SELECT  * # all <urn:x>\n WHERE {\n ?s <urn:a#b> "a  b" }\n'),
+            'SELECT * WHERE { ?s <urn:a#b> "a  b" }')
+
+    def testCachedQuery(self):
+        select = 'SELECT * WHERE { ?s ?p ?o FILTER (?o > 1) }'
+        queryType, first = parse_query_type(select, cache=self.cache)
+        queryType, second = parse_query_type('  SELECT *\nWHERE { ?s ?p ?o FILTER (?o > 1) }',
+                                             cache=self.cache)
+        self.assertEqual(queryType, 'SelectQuery')
+        self.assertEqual(self.cache.statistics['misses'], 1)
+        self.assertEqual(self.cache.statistics['hits'], 1)
+
+        # every caller gets its own copy of the algebra
+        self.assertEqual(first.algebra, second.algebra)
+        self.assertIsNot(first.algebra, second.algebra)
+        self.assertIsNot(first.algebra.p, second.algebra.p)
+        first.algebra.p['modified'] = True
+        queryType, third = parse_query_type(select, cache=self.cache)
+        self.assertNotIn('modified', third.algebra.p)
+
+        # the dataset is part of the key
+        queryType, other = parse_query_type(select, None, ['urn:default'], [], cache=self.cache)
+        self.assertEqual(self.cache.statistics['misses'], 2)
+        self.assertTrue(other.algebra.datasetClause)
+
+    def testCachedUpdate(self):
+        update = 'INSERT DATA { <urn:x> <urn:y> <urn:z> }'
+        updateType, first = parse_update_type(update, 'http://argument/', cache=self.cache)
+        updateType, second = parse_update_type(update, 'http://argument/', cache=self.cache)
+        self.assertEqual(updateType, 'InsertData')
+        self.assertEqual(first, second)
+        self.assertIsNot(first[0], second[0])
+        self.assertIs(first[0].prologue, second[0].prologue)
+
+    def testErrorsAreNotCached(self):
+        self.assertRaises(UnSupportedQuery, parse_query_type, 'foo bar', cache=self.cache)
+        self.assertRaises(UnSupportedQuery, parse_query_type, 'foo bar', cache=self.cache)
+        self.assertEqual(self.cache.statistics['entries'], 0)
+
+class QueryGraphsTests(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def assertGraphs(self, query, expected, union=False):
+        queryType, parsedQuery = parse_query_type(query)
+        self.assertEqual(query_graphs(parsedQuery, union), set(URIRef(g) for g in expected))
+
+    def testQueryGraphs(self):
+        self.assertGraphs('SELECT * WHERE { GRAPH <urn:a> { ?s ?p ?o } }', ['urn:a'])
+        self.assertGraphs('SELECT * FROM <urn:b> WHERE { ?s ?p ?o }', ['urn:b'])
+        self.assertGraphs(
+            'ASK { GRAPH <urn:a> { ?s ?p ?o FILTER EXISTS { GRAPH <urn:c> { ?s ?p 1 } } } }',
+            ['urn:a', 'urn:c'])
+
+        # the default graph is empty, unless it is the union of all graphs
+        self.assertGraphs('SELECT * WHERE { ?s ?p ?o }', [])
+        self.assertEqual(query_graphs(parse_query_type('SELECT * WHERE { ?s ?p ?o }')[1], True),
+                         None)
+        self.assertEqual(query_graphs(parse_query_type(
+            'SELECT * WHERE { GRAPH ?g { ?s ?p ?o } }')[1]), None)
+
+    def testDeterministicQuery(self):
+        self.assertTrue(is_deterministic_query(parse_query_type(
+            'SELECT * WHERE { ?s ?p ?o BIND (STR(?o) AS ?x) }')[1]))
+        self.assertFalse(is_deterministic_query(parse_query_type(
+            'SELECT * WHERE { ?s ?p ?o BIND (RAND() AS ?x) }')[1]))
+        self.assertFalse(is_deterministic_query(parse_query_type(
+            'SELECT * WHERE { ?s ?p ?o FILTER (?o < NOW()) }')[1]))
+
 class QueryRewritingTests(unittest.TestCase):
     """Test datasets will be selected according to SPARQL 1.1. Protocol for queries and updates."""
 
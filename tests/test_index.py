@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import unittest
+from context import quit
+from quit.graphs import RewriteGraph
+from quit.index import VersionedIndex
+from rdflib import Graph, URIRef
+from rdflib.graph import ModificationException
+
+
+class VersionedIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.a = (URIRef('urn:a'), URIRef('urn:p'), URIRef('urn:1'))
+        self.b = (URIRef('urn:b'), URIRef('urn:p'), URIRef('urn:2'))
+        self.c = (URIRef('urn:c'), URIRef('urn:q'), URIRef('urn:3'))
+
+        self.index = VersionedIndex()
+        self.index.addVersion(URIRef('urn:v1'), URIRef('urn:graph'), [self.a, self.b])
+        self.index.addVersion(URIRef('urn:v2'), URIRef('urn:graph'), [self.a, self.c])
+        self.index.addVersion(URIRef('urn:v3'), URIRef('urn:graph'), [self.a, self.b, self.c])
+
+    def tearDown(self):
+        pass
+
+    def testTriplesOfVersion(self):
+        for version, expected in (('urn:v1', [self.a, self.b]),
+                                  ('urn:v2', [self.a, self.c]),
+                                  ('urn:v3', [self.a, self.b, self.c])):
+            graph = Graph(store=self.index, identifier=URIRef(version))
+            self.assertEqual(set(graph), set(expected))
+            self.assertEqual(len(graph), len(expected))
+
+        graph = Graph(store=self.index, identifier=URIRef('urn:v2'))
+        self.assertEqual(list(graph.triples((None, URIRef('urn:p'), None))), [self.a])
+        self.assertIn(self.c, graph)
+        self.assertNotIn(self.b, graph)
+
+    def testSize(self):
+        self.assertEqual(len(self.index), 3)
+        # a is valid in one interval, b and c in two and one interval
+        self.assertEqual(self.index.size, (3, 4))
+
+    def testContexts(self):
+        contexts = set(c.identifier for c in self.index.contexts(self.b))
+        self.assertEqual(contexts, set([URIRef('urn:v1'), URIRef('urn:v3')]))
+
+        triples = dict(
+            (triple, set(c.identifier for c in contexts))
+            for triple, contexts in self.index.triples((None, None, None)))
+        self.assertEqual(triples[self.c], set([URIRef('urn:v2'), URIRef('urn:v3')]))
+
+    def testRewriteGraph(self):
+        graph = RewriteGraph(self.index, URIRef('urn:v1'), URIRef('urn:graph'))
+        self.assertEqual(graph.identifier, URIRef('urn:graph'))
+        self.assertEqual(set(graph), set([self.a, self.b]))
+
+        with self.assertRaises(ModificationException):
+            self.index.add(self.c, Graph(store=self.index, identifier=URIRef('urn:v1')))
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
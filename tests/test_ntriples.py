@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import unittest
+from context import quit
+from quit.ntriples import labels, parse, serialize_triple
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.compare import isomorphic
+from rdflib.plugins.parsers.ntriples import ParseError
+from rdflib.plugins.serializers.nt import _nt_row
+
+
+class ParseTests(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def assertParsedLikeRdflib(self, data):
+        rows = list(parse(data))
+        expected = Graph()
+        expected.parse(data=data, format='nt')
+
+        actual = Graph()
+        for triple, line in rows:
+            actual.add(triple)
+            if not any(isinstance(term, BNode) for term in triple):
+                self.assertEqual(line, _nt_row(triple)[:-1])
+        self.assertTrue(isomorphic(actual, expected))
+        return rows
+
+    def testCanonicalLines(self):
+        data = (
+            '<urn:x> <urn:y> "a \\"b\\" \\\\ c\\nd" .\n'
+            '<urn:x> <urn:y> "z"@en-US .\n'
+            '<urn:x> <urn:y> "1"^^<http://www.w3.org/2001/XMLSchema#integer> .\n'
+            '<urn:x> <urn:y> <urn:z> .\n'
+        )
+        rows = self.assertParsedLikeRdflib(data)
+        self.assertEqual([line for triple, line in rows], data.splitlines())
+
+    def testBytes(self):
+        rows = list(parse(memoryview('<urn:x> <urn:y> "ä" .\r\n'.encode('utf-8'))))
+        self.assertEqual(rows, [
+            ((URIRef('urn:x'), URIRef('urn:y'), Literal('ä')), '<urn:x> <urn:y> "ä" .')
+        ])
+
+    def testNonCanonicalLines(self):
+        self.assertParsedLikeRdflib(
+            '# a comment\n'
+            '\n'
+            '<urn:x>  <urn:y>\t<urn:z> .\n'
+            '<urn:x> <urn:y> "\\u00e4" .\n'
+            '<urn:x> <urn:y> "01"^^<http://www.w3.org/2001/XMLSchema#integer> .\n'
+            '<urn:x> <urn:y> <urn:z> . # a comment\n'
+        )
+
+    def testBlankNodes(self):
+        data = '_:a <urn:y> _:b .\n_:b <urn:y> "z" .\n'
+        rows = self.assertParsedLikeRdflib(data)
+        (first, _), (second, _) = rows
+        self.assertIsInstance(first[0], BNode)
+        self.assertEqual(first[2], second[0])
+
+        # the lines keep the labels of the document
+        self.assertEqual([line for _, line in rows], data.splitlines())
+        rows = list(parse('_:a   <urn:y> _:b.\n'))
+        self.assertEqual(rows[0][1], '_:a <urn:y> _:b .')
+        self.assertEqual(labels(*rows[0]), [(rows[0][0][0], '_:a'), (rows[0][0][2], '_:b')])
+        self.assertEqual(serialize_triple(rows[0][0], {rows[0][0][0]: '_:c'}),
+                         '_:c <urn:y> {} .'.format(rows[0][0][2].n3()))
+
+        # each document gets its own blank nodes, unless they share the labels
+        other = list(parse(data))
+        self.assertNotEqual(other[0][0][0], first[0])
+        bnodes = {}
+        self.assertEqual(list(parse(data, bnodes)), list(parse(data, bnodes)))
+
+    def testInvalidLine(self):
+        with self.assertRaises(ParseError):
+            list(parse('<urn:x> <urn:y> .\n'))
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+import unittest
+from context import quit
+from quit.graphs import InMemoryAggregatedGraph, NTriplesStore, graphStatistics
+from quit.statistics import BOUND, GraphStatistics, planPatterns
+from quit.tools.algebra import translateQuery
+from quit.tools.evaluate import evalQuery
+from rdflib import Graph, Literal, URIRef, Variable
+from rdflib.namespace import RDF
+from rdflib.plugins.sparql.parser import parseQuery
+
+EX = 'urn:ex:'
+
+
+def skewedGraph(identifier, size=300):
+    graph = Graph(store=NTriplesStore(), identifier=URIRef(EX + identifier))
+    for i in range(size):
+        s = URIRef('{}{}/s{}'.format(EX, identifier, i))
+        graph.add((s, RDF.type, URIRef(EX + ('Person' if i % 3 else 'Place'))))
+        graph.add((s, URIRef(EX + 'name'), Literal('name {}'.format(i))))
+        if i % 100 == 0:
+            graph.add((s, URIRef(EX + 'rare'), Literal(i)))
+    return graph
+
+
+class GraphStatisticsTests(unittest.TestCase):
+    def setUp(self):
+        self.statistics = GraphStatistics(skewedGraph('g'))
+
+    def tearDown(self):
+        pass
+
+    def testCounts(self):
+        self.assertEqual(self.statistics.triples, 603)
+        self.assertEqual(self.statistics.subjects, 300)
+        self.assertEqual(self.statistics.objects, 305)
+        self.assertEqual(self.statistics.predicates[RDF.type], (300, 300, 2))
+        self.assertEqual(self.statistics.predicates[URIRef(EX + 'rare')], (3, 3, 3))
+        self.assertEqual(
+            self.statistics.classes, {URIRef(EX + 'Person'): 200, URIRef(EX + 'Place'): 100})
+
+    def testEstimate(self):
+        estimate = self.statistics.estimate
+        self.assertEqual(estimate(None, None, None), 603)
+        self.assertEqual(estimate(None, RDF.type, None), 300)
+        self.assertEqual(estimate(None, RDF.type, URIRef(EX + 'Place')), 100)
+        self.assertEqual(estimate(None, RDF.type, URIRef(EX + 'Unknown')), 0)
+        self.assertEqual(estimate(None, URIRef(EX + 'unknown'), None), 0)
+        self.assertEqual(estimate(BOUND, URIRef(EX + 'name'), None), 1)
+        self.assertEqual(estimate(None, RDF.type, BOUND), 150)
+
+    def testEmpty(self):
+        self.assertEqual(GraphStatistics().estimate(None, None, None), 0)
+
+    def testPlanPatterns(self):
+        s, t, n, x = Variable('s'), Variable('t'), Variable('n'), Variable('x')
+        patterns = [
+            (s, RDF.type, t),
+            (s, URIRef(EX + 'name'), n),
+            (s, URIRef(EX + 'rare'), x),
+        ]
+        plan, size = planPatterns(patterns, [self.statistics])
+        self.assertEqual(plan, [patterns[2], patterns[0], patterns[1]])
+        self.assertEqual(size, 3)
+
+        # patterns sharing a bound variable are preferred to cartesian products
+        other = (Variable('o'), URIRef(EX + 'rare'), x)
+        plan, size = planPatterns([patterns[0], other, patterns[1]], [self.statistics], {s})
+        self.assertEqual(plan, [patterns[0], patterns[1], other])
+
+    def testStoreStatistics(self):
+        graph = skewedGraph('g', 3)
+        statistics = graph.store.statistics
+        self.assertIs(graph.store.statistics, statistics)
+        self.assertEqual(statistics.triples, 7)
+
+        graph.add((URIRef(EX + 'x'), RDF.type, URIRef(EX + 'Person')))
+        self.assertEqual(graph.store.statistics.triples, 8)
+        graph.remove((URIRef(EX + 'x'), None, None))
+        self.assertEqual(graph.store.statistics.triples, 7)
+
+    def testGraphStatistics(self):
+        dataset = InMemoryAggregatedGraph(graphs=[skewedGraph('a', 3), skewedGraph('b', 3)])
+        self.assertEqual([s.triples for s in graphStatistics(dataset)], [7, 7])
+        self.assertEqual(len(graphStatistics(dataset.get_context(URIRef(EX + 'a')))), 1)
+        self.assertIsNone(graphStatistics(Graph()))
+
+
+class PlannedEvaluationTests(unittest.TestCase):
+    def setUp(self):
+        self.dataset = InMemoryAggregatedGraph(graphs=[skewedGraph('a'), skewedGraph('b')])
+
+    def tearDown(self):
+        pass
+
+    def evaluate(self, query):
+        result = evalQuery(self.dataset, translateQuery(parseQuery(query)), {})
+        return set(tuple(row.get(v) for v in result['vars_']) for row in result['bindings'])
+
+    def testBGP(self):
+        query = '''SELECT ?s ?t ?n WHERE {
+            GRAPH ?g { ?s a ?t . ?s <urn:ex:name> ?n . ?s <urn:ex:rare> ?x }
+        }'''
+        expected = set()
+        for g in self.dataset.contexts():
+            for i in (0, 100, 200):
+                s = URIRef('{}s{}'.format(g.identifier + '/', i))
+                expected.add((s, URIRef(EX + ('Person' if i % 3 else 'Place')),
+                              Literal('name {}'.format(i))))
+        self.assertEqual(self.evaluate(query), expected)
+
+    def testJoin(self):
+        # the first group has 100 solutions, the second group 3, thus they are joined by a hash join
+        query = '''SELECT ?s ?n WHERE {
+            GRAPH <urn:ex:a> { ?s a <urn:ex:Place> }
+            GRAPH <urn:ex:a> { ?s <urn:ex:rare> ?x . ?s <urn:ex:name> ?n }
+        }'''
+        self.assertEqual(self.evaluate(query), set([(URIRef(EX + 'a/s0'), Literal('name 0'))]))
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
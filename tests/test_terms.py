@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import unittest
+from context import quit
+from quit.cache import FileReference
+from quit.namespace import XSD
+from quit.terms import TermDictionary, TERMS
+from rdflib import BNode, Literal, URIRef
+
+
+class TermDictionaryTests(unittest.TestCase):
+    def setUp(self):
+        self.terms = TermDictionary()
+
+    def tearDown(self):
+        pass
+
+    def testIntern(self):
+        first = URIRef('urn:x')
+        second = URIRef('urn:x')
+        self.assertIs(self.terms.intern(first), first)
+        self.assertIs(self.terms.intern(second), first)
+        self.assertEqual(self.terms.id(second), self.terms.id(first))
+        self.assertIs(self.terms.term(self.terms.id(first)), first)
+
+        # equal lexical forms of different kinds are different terms
+        self.assertIsNot(self.terms.intern(Literal('urn:x')), first)
+        self.assertEqual(len(self.terms), 2)
+
+    def testNTriples(self):
+        self.assertEqual(self.terms.ntriples(URIRef('urn:x')), '<urn:x>')
+        self.assertEqual(self.terms.ntriples(BNode('b1')), '_:b1')
+        self.assertEqual(self.terms.ntriples(Literal('a "b"', lang='en')), '"a \\"b\\""@en')
+        self.assertEqual(
+            self.terms.line((URIRef('urn:x'), URIRef('urn:y'), Literal('1', datatype=XSD.integer))),
+            '<urn:x> <urn:y> "1"^^<http://www.w3.org/2001/XMLSchema#integer> .')
+
+    def testCollect(self):
+        kept = self.terms.intern(URIRef('urn:kept'))
+        self.terms.intern(URIRef('urn:dropped'))
+        dropped = self.terms.id(URIRef('urn:dropped'))
+
+        self.assertEqual(self.terms.collect(), 1)
+        self.assertIn(kept, self.terms)
+        self.assertNotIn(URIRef('urn:dropped'), self.terms)
+        with self.assertRaises(KeyError):
+            self.terms.term(dropped)
+
+        # ids are not reused
+        self.assertNotEqual(self.terms.id(URIRef('urn:dropped')), dropped)
+
+    def testAutomaticCollect(self):
+        terms = TermDictionary(threshold=10)
+        for i in range(100):
+            terms.intern(URIRef('urn:{}'.format(i)))
+        self.assertLess(len(terms), 20)
+
+    def testSharedByFileReferences(self):
+        content = '<urn:x> <urn:y> "z" .\n'
+        first = FileReference('graph.nt', content)
+        second = FileReference('graph.nt', content)
+
+        (s1, p1, o1), = first.graph
+        (s2, p2, o2), = second.graph
+        self.assertIs(s1, s2)
+        self.assertIs(o1, o2)
+        self.assertIs(TERMS.intern(URIRef('urn:x')), s1)
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
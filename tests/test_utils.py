@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import unittest
+from context import quit
+from quit.cache import FileReference
+from quit.graphs import InMemoryAggregatedGraph
+from quit.utils import graphdiff, linediff
+from rdflib import BNode, Graph, Literal, URIRef
+
+
+class GraphDiffTests(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def _dataset(self, content):
+        graph = Graph(identifier=URIRef('urn:graph'))
+        graph.parse(data=content, format='nt')
+        files = {graph.identifier: FileReference('graph.nt', content)}
+        return InMemoryAggregatedGraph(graphs=[graph]), files
+
+    def _changes(self, diff):
+        return dict((op, set(triples)) for op, triples in diff.get(URIRef('urn:graph'), []))
+
+    def testLineDiff(self):
+        removals, additions = linediff(['a', 'b', 'd'], ['b', 'c', 'd', 'e'])
+        self.assertEqual(removals, ['a'])
+        self.assertEqual(additions, ['c', 'e'])
+        self.assertEqual(linediff([], ['a']), ([], ['a']))
+        self.assertEqual(linediff(['a'], []), (['a'], []))
+
+    def testSortedDiff(self):
+        first, first_lines = self._dataset(
+            '<urn:a> <urn:p> <urn:1> .\n<urn:b> <urn:p> "x" .\n')
+        second, second_lines = self._dataset(
+            '<urn:a> <urn:p> <urn:1> .\n<urn:c> <urn:p> "y"@en .\n'
+            '<urn:b> <urn:p> "x"^^<http://www.w3.org/2001/XMLSchema#string> .\n')
+
+        changes = self._changes(graphdiff(first, second, first_lines, second_lines))
+        expected = self._changes(graphdiff(first, second))
+        self.assertEqual(changes, expected)
+        self.assertEqual(changes['additions'], set([
+            (URIRef('urn:c'), URIRef('urn:p'), Literal('y', lang='en')),
+            (URIRef('urn:b'), URIRef('urn:p'), Literal(
+                'x', datatype=URIRef('http://www.w3.org/2001/XMLSchema#string')))]))
+
+    def testBlankNodeDiff(self):
+        first, first_lines = self._dataset('_:a <urn:p> <urn:1> .\n')
+        second, second_lines = self._dataset('_:b <urn:p> <urn:1> .\n<urn:a> <urn:p> "z" .\n')
+
+        changes = self._changes(graphdiff(first, second, first_lines, second_lines))
+        self.assertEqual(changes, {
+            'additions': set([(URIRef('urn:a'), URIRef('urn:p'), Literal('z'))])})
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()